@@ -170,24 +170,33 @@ def consulta(query):
     except Exception as e:
         print(f"Erro ao executar consulta: {e}")
 
-def carregar_agentes_do_banco(conn_str, max_workers=10):
+QUERY_ROTAS_GTI = """
+    SELECT TELEFONE, SENHA
+    FROM [NEWWORK].[dbo].[ROTA]
+    WHERE SERVICO='MATURACAO' 
+      AND (TELEFONE LIKE 'GTI%' OR TELEFONE LIKE 'WB%' OR TELEFONE LIKE 'WD%')
+"""
+
+def listar_rotas_gti(conn_str):
+    """Retorna [(telefone, senha)] das instâncias GTI cadastradas na ROTA (levanta em caso de erro)"""
+    with pyodbc.connect(conn_str) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY_ROTAS_GTI)
+            return [(telefone, senha) for telefone, senha in cursor]
+
+def carregar_agentes_do_banco(conn_str, max_workers=10, atualizar=True):
     """
     Carrega agentes do banco e cria objetos AgenteGTI em paralelo.
+    Com atualizar=False os agentes são criados sem consultar o status (sem HTTP),
+    para o chamador fazer uma única rodada em lote depois.
     """
     from integration.api_GTI import AgenteGTI
 
-    query = """
-        SELECT TELEFONE, SENHA
-        FROM [NEWWORK].[dbo].[ROTA]
-        WHERE SERVICO='MATURACAO' 
-          AND (TELEFONE LIKE 'GTI%' OR TELEFONE LIKE 'WB%' OR TELEFONE LIKE 'WD%')
-    """
-
     try:
-        with pyodbc.connect(conn_str) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query)
-                registros = list(cursor)  # Pegamos todos, mas ainda rápido
+        registros = listar_rotas_gti(conn_str)
+
+        if not atualizar:
+            return [AgenteGTI(nome=telefone, token=senha, atualizar=False) for telefone, senha in registros]
 
         agentes = []
 
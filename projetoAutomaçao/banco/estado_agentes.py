@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+
+ESTADO_AGENTES_DB = os.getenv("ESTADO_AGENTES_DB", "estado_agentes.db")
+
+
+class EstadoAgentes:
+    """
+    Tabela compartilhada com o estado de conexão das instâncias GTI.
+
+    O webhook de conexão grava cada evento aqui; o monitor e a reconciliação só
+    consultam a instância quando não há estado recente, e gravam o resultado. Roteamento, maturação e monitoramento leem
+    desta tabela (SQLite/WAL, então vale entre processos) em vez de consultar
+    /instance/status de cada instância.
+    """
+
+    def __init__(self, caminho=ESTADO_AGENTES_DB):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._conexao().execute("""
+            CREATE TABLE IF NOT EXISTS estado_agentes (
+                token TEXT PRIMARY KEY,
+                nome TEXT,
+                numero TEXT,
+                conectado INTEGER NOT NULL DEFAULT 0,
+                visto_em REAL NOT NULL,
+                origem TEXT
+            )
+        """)
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def registrar(self, token, conectado, nome=None, numero=None, origem="webhook"):
+        """Atualiza (ou cria) o estado de uma instância"""
+        if not token:
+            return
+        self._conexao().execute("""
+            INSERT INTO estado_agentes (token, nome, numero, conectado, visto_em, origem)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(token) DO UPDATE SET
+                nome = COALESCE(excluded.nome, nome),
+                numero = COALESCE(excluded.numero, numero),
+                conectado = excluded.conectado,
+                visto_em = excluded.visto_em,
+                origem = excluded.origem
+        """, (token, nome, str(numero) if numero else None, int(bool(conectado)), time.time(), origem))
+
+    def registrar_agentes(self, agentes, origem="reconciliacao"):
+        """Grava o estado atual de uma lista de agentes em uma única transação"""
+        conn = self._conexao()
+        agora = time.time()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("""
+                INSERT INTO estado_agentes (token, nome, numero, conectado, visto_em, origem)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(token) DO UPDATE SET
+                    nome = excluded.nome,
+                    numero = COALESCE(excluded.numero, numero),
+                    conectado = excluded.conectado,
+                    visto_em = excluded.visto_em,
+                    origem = excluded.origem
+            """, [
+                (ag.token, ag.nome, str(ag.numero) if ag.numero else None, int(bool(ag.conectado)), agora, origem)
+                for ag in agentes if ag.token
+            ])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def obter(self, token):
+        linha = self._conexao().execute("SELECT * FROM estado_agentes WHERE token = ?", (token,)).fetchone()
+        return dict(linha) if linha else None
+
+    def todos(self):
+        return [dict(l) for l in self._conexao().execute("SELECT * FROM estado_agentes ORDER BY nome")]
+
+    def conectados(self):
+        return [dict(l) for l in self._conexao().execute(
+            "SELECT * FROM estado_agentes WHERE conectado = 1 ORDER BY nome"
+        )]
+
+    def aplicar(self, agentes, validade=None):
+        """
+        Copia o estado da tabela para os objetos agente (conectado/numero).
+
+        Retorna os agentes que não têm estado na tabela, ou cujo estado é mais
+        antigo que `validade` segundos, para que só eles sejam consultados via HTTP.
+        """
+        estados = {e["token"]: e for e in self.todos()}
+        limite = time.time() - validade if validade else None
+        sem_estado = []
+        for ag in agentes:
+            estado = estados.get(ag.token)
+            if estado is None or (limite and estado["visto_em"] < limite):
+                sem_estado.append(ag)
+                continue
+            ag.conectado = bool(estado["conectado"])
+            ag.numero = estado["numero"] or ag.numero
+        return sem_estado
@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+HISTORICO_BACKEND = os.getenv("HISTORICO_BACKEND", "sqlite")
+HISTORICO_DIR = os.getenv("HISTORICO_DIR", "historicos")
+HISTORICO_DB = os.getenv("HISTORICO_DB", os.path.join(HISTORICO_DIR, "historicos.db"))
+
+log = logging.getLogger(__name__)
+
+
+class HistoricoBase:
+    """Interface comum dos backends de histórico de conversas"""
+
+    def __init__(self):
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._compactador = None
+        self._parar = threading.Event()
+
+    def _lock_do_chat(self, chat_id):
+        with self._locks_lock:
+            lock = self._locks.get(chat_id)
+            if lock is None:
+                lock = self._locks[chat_id] = threading.RLock()
+            return lock
+
+    @contextmanager
+    def trava(self, chat_id):
+        """Trava o chat para sequências de leitura e escrita que precisam ser atômicas"""
+        with self._lock_do_chat(chat_id):
+            yield
+
+    def anexar(self, chat_id, mensagem):
+        raise NotImplementedError
+
+    def anexar_lote(self, chat_id, mensagens):
+        with self.trava(chat_id):
+            for mensagem in mensagens:
+                self.anexar(chat_id, mensagem)
+
+    def ultimos(self, chat_id, limite=None):
+        raise NotImplementedError
+
+    def chats(self):
+        raise NotImplementedError
+
+    def obter_resumo(self, chat_id):
+        """Resumo incremental das mensagens que já saíram da janela da IA"""
+        return ""
+
+    def salvar_resumo(self, chat_id, resumo):
+        raise NotImplementedError
+
+    def compactar(self):
+        pass
+
+    def iniciar_compactacao(self, intervalo=3600):
+        """Roda compactar() periodicamente em uma thread daemon"""
+        if self._compactador:
+            return
+
+        def loop():
+            while not self._parar.wait(intervalo):
+                try:
+                    self.compactar()
+                except Exception:
+                    log.exception("⚠️ Erro ao compactar histórico")
+
+        self._compactador = threading.Thread(target=loop, name="historico-compactacao", daemon=True)
+        self._compactador.start()
+
+    def fechar(self):
+        self._parar.set()
+        if self._compactador and self._compactador is not threading.current_thread():
+            self._compactador.join(10)
+
+
+# -------------------- BACKEND JSON (LEGADO) --------------------
+
+class HistoricoJSON(HistoricoBase):
+    """Um arquivo JSON por chat, reescrito a cada mensagem (formato antigo de historicos/)"""
+
+    def __init__(self, diretorio=HISTORICO_DIR):
+        super().__init__()
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, chat_id):
+        return os.path.join(self.diretorio, f"{chat_id}.json")
+
+    def _ler(self, chat_id):
+        caminho = self._caminho(chat_id)
+        if os.path.exists(caminho):
+            try:
+                with open(caminho, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                log.warning("⚠️ Erro ao ler histórico de %s: %s", chat_id, e)
+        return []
+
+    def anexar(self, chat_id, mensagem):
+        with self.trava(chat_id):
+            historico = self._ler(chat_id)
+            historico.append(mensagem)
+            try:
+                with open(self._caminho(chat_id), "w", encoding="utf-8") as f:
+                    json.dump(historico, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                log.warning("⚠️ Erro ao salvar histórico de %s: %s", chat_id, e)
+
+    def ultimos(self, chat_id, limite=None):
+        historico = self._ler(chat_id)
+        return historico[-limite:] if limite else historico
+
+    def chats(self):
+        return [nome[:-5] for nome in os.listdir(self.diretorio) if nome.endswith(".json")]
+
+    def obter_resumo(self, chat_id):
+        caminho = os.path.join(self.diretorio, f"{chat_id}.resumo.txt")
+        if os.path.exists(caminho):
+            with open(caminho, "r", encoding="utf-8") as f:
+                return f.read()
+        return ""
+
+    def salvar_resumo(self, chat_id, resumo):
+        with open(os.path.join(self.diretorio, f"{chat_id}.resumo.txt"), "w", encoding="utf-8") as f:
+            f.write(resumo)
+
+
+# -------------------- BACKEND SQLITE (WAL) --------------------
+
+class HistoricoSQLite(HistoricoBase):
+    """
+    Log append-only de mensagens em SQLite com WAL.
+
+    Cada mensagem é uma linha nova (inserção O(1) amortizado) e a leitura das
+    últimas N mensagens usa o índice (chat_id, id), sem carregar a conversa inteira.
+    """
+
+    def __init__(self, caminho=HISTORICO_DB, manter=None):
+        super().__init__()
+        self.caminho = caminho
+        self.manter = manter  # None = guarda tudo; N = compactação mantém as N últimas por chat
+        self._local = threading.local()
+        self._conexoes = []  # de todas as threads, para fechar() não deixar nenhuma aberta
+        self._conexoes_lock = threading.Lock()
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        conn = self._conexao()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS mensagens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                dados TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_mensagens_chat ON mensagens (chat_id, id)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS resumos (
+                chat_id TEXT PRIMARY KEY,
+                resumo TEXT NOT NULL
+            )
+        """)
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Cada conexão só é usada pela sua thread; check_same_thread=False deixa fechar() encerrá-las
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conexoes_lock:
+                self._conexoes.append(conn)
+        return conn
+
+    def anexar(self, chat_id, mensagem):
+        self.anexar_lote(chat_id, [mensagem])
+
+    def anexar_lote(self, chat_id, mensagens):
+        if not mensagens:
+            return
+        linhas = [(str(chat_id), json.dumps(m, ensure_ascii=False)) for m in mensagens]
+        with self.trava(chat_id):
+            conn = self._conexao()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("INSERT INTO mensagens (chat_id, dados) VALUES (?, ?)", linhas)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def ultimos(self, chat_id, limite=None):
+        conn = self._conexao()
+        if limite:
+            linhas = conn.execute(
+                "SELECT dados FROM mensagens WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+                (str(chat_id), int(limite))
+            ).fetchall()
+            linhas.reverse()
+        else:
+            linhas = conn.execute(
+                "SELECT dados FROM mensagens WHERE chat_id = ? ORDER BY id", (str(chat_id),)
+            ).fetchall()
+        return [json.loads(dados) for (dados,) in linhas]
+
+    def chats(self):
+        return [c for (c,) in self._conexao().execute("SELECT DISTINCT chat_id FROM mensagens")]
+
+    def obter_resumo(self, chat_id):
+        linha = self._conexao().execute(
+            "SELECT resumo FROM resumos WHERE chat_id = ?", (str(chat_id),)
+        ).fetchone()
+        return linha[0] if linha else ""
+
+    def salvar_resumo(self, chat_id, resumo):
+        self._conexao().execute(
+            "INSERT INTO resumos (chat_id, resumo) VALUES (?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET resumo = excluded.resumo",
+            (str(chat_id), resumo)
+        )
+
+    def compactar(self):
+        """Remove mensagens além do limite de retenção e faz checkpoint do WAL"""
+        conn = self._conexao()
+        if self.manter:
+            for chat_id in self.chats():
+                with self.trava(chat_id):
+                    conn.execute("""
+                        DELETE FROM mensagens
+                        WHERE chat_id = ? AND id < (
+                            SELECT id FROM mensagens WHERE chat_id = ?
+                            ORDER BY id DESC LIMIT 1 OFFSET ?
+                        )
+                    """, (chat_id, chat_id, self.manter - 1))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def fechar(self):
+        """Para a compactação e fecha as conexões de todas as threads (flush, compactação, workers)"""
+        super().fechar()
+        with self._conexoes_lock:
+            conexoes, self._conexoes = self._conexoes, []
+        for conn in conexoes:
+            conn.close()
+        self._local = threading.local()
+
+
+# -------------------- FÁBRICA / MIGRAÇÃO --------------------
+
+def criar_historico(backend=None):
+    """Cria o backend configurado em HISTORICO_BACKEND (sqlite ou json)"""
+    backend = (backend or HISTORICO_BACKEND).lower()
+    if backend == "json":
+        return HistoricoJSON(HISTORICO_DIR)
+    manter = os.getenv("HISTORICO_MANTER")
+    return HistoricoSQLite(HISTORICO_DB, manter=int(manter) if manter else None)
+
+
+def migrar_json(diretorio, destino):
+    """
+    Copia os históricos historicos/{chat_id}.json para outro backend. O resumo das
+    falas fora da janela da IA é montado aqui, senão as conversas migradas chegariam
+    à IA só com a janela e sem nada do contexto anterior. Chats que já existem no
+    destino são pulados, então rodar de novo não duplica mensagens.
+    """
+    from integration.resumo import resumo_do_historico
+
+    origem = HistoricoJSON(diretorio)
+    existentes = set(destino.chats())
+    total_chats, total_mensagens, pulados = 0, 0, 0
+    inicio = time.time()
+    for chat_id in origem.chats():
+        if chat_id in existentes:
+            pulados += 1
+            continue
+        mensagens = origem.ultimos(chat_id)
+        destino.anexar_lote(chat_id, mensagens)
+        resumo = resumo_do_historico(mensagens, resumo=origem.obter_resumo(chat_id))
+        if resumo:
+            destino.salvar_resumo(chat_id, resumo)
+        total_chats += 1
+        total_mensagens += len(mensagens)
+    log.info("✅ Migrados %d mensagens de %d chats em %.1fs (%d já existiam no destino)",
+             total_mensagens, total_chats, time.time() - inicio, pulados)
+    return total_chats, total_mensagens
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Uso: python -m banco.historico [pasta_json] [arquivo_sqlite]
+    pasta = sys.argv[1] if len(sys.argv) > 1 else HISTORICO_DIR
+    banco = sys.argv[2] if len(sys.argv) > 2 else HISTORICO_DB
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    migrar_json(pasta, HistoricoSQLite(banco))
@@ -0,0 +1,219 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict, deque
+
+from until.metricas import Histograma
+
+
+class HistoricoCache:
+    """
+    Cache LRU das conversas mais ativas na frente de um backend de histórico.
+
+    Guarda por chat só a janela de mensagens que a IA usa. As mensagens novas entram
+    no cache na hora e são gravadas no backend em lote (write-behind) por uma thread
+    de flush periódica e no encerramento do processo.
+
+    Leitura no backend (cache miss) e gravação das pendências de um chat acontecem
+    sob a trava do chat (a mesma de trava()), então uma leitura nunca vê a pendência
+    no meio do caminho entre a memória e o disco. O flush pega a trava de um chat
+    por vez e nunca segura o _flush_lock enquanto alguém espera por ele com a trava.
+    """
+
+    def __init__(self, backend, janela=20, capacidade=1000, intervalo=2.0):
+        self.backend = backend
+        self.janela = janela
+        self.capacidade = capacidade
+        self.intervalo = intervalo
+
+        self._entradas = OrderedDict()  # chat_id -> deque(maxlen=janela)
+        self._pendentes = {}            # chat_id -> [mensagens ainda não gravadas]
+        self._resumos = {}              # chat_id -> resumo (só dos chats em cache)
+        self._resumos_pendentes = {}    # chat_id -> resumo ainda não gravado
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._parar = threading.Event()
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.mensagens_gravadas = 0
+        self.flush_ultimo_ms = 0.0
+        self.flush_max_ms = 0.0
+        self.flush_total_ms = 0.0
+        self.latencia_leitura = Histograma()  # leituras no backend (cache miss)
+        self.latencia_flush = Histograma()
+
+        self._thread = threading.Thread(target=self._loop_flush, name="historico-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    # -------------------- LEITURA / ESCRITA --------------------
+
+    def trava(self, chat_id):
+        return self.backend.trava(chat_id)
+
+    def ultimos(self, chat_id, limite=None):
+        if not limite or limite > self.janela:
+            # Leitura fora da janela: backend + o que ainda está pendente do chat
+            with self.backend.trava(chat_id):
+                base = self.backend.ultimos(chat_id, limite)
+                with self._lock:
+                    pendentes = list(self._pendentes.get(chat_id, []))
+            mensagens = base + pendentes
+            return mensagens[-limite:] if limite else mensagens
+
+        with self._lock:
+            entrada = self._entradas.get(chat_id)
+            if entrada is not None:
+                self._entradas.move_to_end(chat_id)
+                self.hits += 1
+                return list(entrada)[-limite:]
+            self.misses += 1
+
+        # Lê fora do lock principal; a trava do chat evita ler no meio do flush dele
+        with self.backend.trava(chat_id):
+            inicio = time.perf_counter()
+            base = self.backend.ultimos(chat_id, self.janela)
+            self.latencia_leitura.observar(time.perf_counter() - inicio)
+            with self._lock:
+                entrada = deque(base, maxlen=self.janela)
+                entrada.extend(self._pendentes.get(chat_id, []))
+                self._guardar(chat_id, entrada)
+                return list(entrada)[-limite:]
+
+    def anexar(self, chat_id, mensagem):
+        with self._lock:
+            entrada = self._entradas.get(chat_id)
+            if entrada is not None:
+                entrada.append(mensagem)
+                self._entradas.move_to_end(chat_id)
+            self._pendentes.setdefault(chat_id, []).append(mensagem)
+
+    def anexar_lote(self, chat_id, mensagens):
+        for mensagem in mensagens:
+            self.anexar(chat_id, mensagem)
+
+    def _guardar(self, chat_id, entrada):
+        self._entradas[chat_id] = entrada
+        self._entradas.move_to_end(chat_id)
+        while len(self._entradas) > self.capacidade:
+            # Pendências do chat removido continuam em _pendentes até o próximo flush
+            removido, _ = self._entradas.popitem(last=False)
+            self._resumos.pop(removido, None)
+            self.evictions += 1
+
+    def obter_resumo(self, chat_id):
+        with self._lock:
+            if chat_id in self._resumos:
+                return self._resumos[chat_id]
+            if chat_id in self._resumos_pendentes:
+                return self._resumos_pendentes[chat_id]
+
+        with self.backend.trava(chat_id):
+            with self._lock:
+                if chat_id in self._resumos_pendentes:  # salvo enquanto esperava a trava
+                    return self._resumos_pendentes[chat_id]
+            resumo = self.backend.obter_resumo(chat_id)
+            with self._lock:
+                if chat_id in self._entradas:
+                    self._resumos[chat_id] = resumo
+            return resumo
+
+    def salvar_resumo(self, chat_id, resumo):
+        with self._lock:
+            if chat_id in self._entradas:
+                self._resumos[chat_id] = resumo
+            self._resumos_pendentes[chat_id] = resumo
+
+    def chats(self):
+        self.flush()
+        return self.backend.chats()
+
+    def compactar(self):
+        self.flush()
+        self.backend.compactar()
+
+    def iniciar_compactacao(self, intervalo=3600):
+        self.backend.iniciar_compactacao(intervalo)
+
+    # -------------------- FLUSH --------------------
+
+    def flush(self):
+        """Grava no backend, em lote por chat, todas as mensagens pendentes"""
+        with self._flush_lock:
+            with self._lock:
+                chats = set(self._pendentes) | set(self._resumos_pendentes)
+            if not chats:
+                return 0
+
+            inicio = time.perf_counter()
+            gravadas = 0
+            for chat_id in chats:
+                # Retira e grava sob a trava do chat: quem lê o chat espera o fim da gravação
+                with self.backend.trava(chat_id):
+                    with self._lock:
+                        mensagens = self._pendentes.pop(chat_id, None)
+                        resumo = self._resumos_pendentes.pop(chat_id, None)
+                    if resumo is not None:
+                        try:
+                            self.backend.salvar_resumo(chat_id, resumo)
+                        except Exception as e:
+                            print(f"⚠️ Erro ao gravar resumo de {chat_id}: {e}")
+                            with self._lock:
+                                self._resumos_pendentes.setdefault(chat_id, resumo)
+                    if mensagens:
+                        try:
+                            self.backend.anexar_lote(chat_id, mensagens)
+                            gravadas += len(mensagens)
+                        except Exception as e:
+                            print(f"⚠️ Erro ao gravar histórico de {chat_id}: {e}")
+                            with self._lock:
+                                self._pendentes[chat_id] = mensagens + self._pendentes.get(chat_id, [])
+            self.latencia_flush.observar(time.perf_counter() - inicio)
+            duracao = (time.perf_counter() - inicio) * 1000
+
+            with self._lock:
+                self.flushes += 1
+                self.mensagens_gravadas += gravadas
+                self.flush_ultimo_ms = duracao
+                self.flush_total_ms += duracao
+                self.flush_max_ms = max(self.flush_max_ms, duracao)
+            return gravadas
+
+    def _loop_flush(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Erro no flush do histórico: {e}")
+
+    def fechar(self):
+        if self._parar.is_set():
+            return
+        self._parar.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(10)  # o flush em andamento termina antes de a conexão dele fechar
+        self.flush()
+        self.backend.fechar()
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "chats_em_cache": len(self._entradas),
+                "capacidade": self.capacidade,
+                "janela": self.janela,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0,
+                "evictions": self.evictions,
+                "pendentes": sum(len(m) for m in self._pendentes.values()),
+                "flushes": self.flushes,
+                "mensagens_gravadas": self.mensagens_gravadas,
+                "flush_ultimo_ms": round(self.flush_ultimo_ms, 2),
+                "flush_max_ms": round(self.flush_max_ms, 2),
+                "flush_medio_ms": round(self.flush_total_ms / self.flushes, 2) if self.flushes else 0.0,
+            }
@@ -0,0 +1,199 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SERIE_STATUS_DB = os.getenv("SERIE_STATUS_DB", "serie_status.db")
+# Sem amostra por mais que isso, o próximo status abre um período novo (buraco = não observado)
+SERIE_STATUS_LACUNA_SEG = float(os.getenv("SERIE_STATUS_LACUNA_SEG", "300"))
+
+_UNIDADES = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def janela_em_segundos(texto, padrao=86400):
+    """'90', '30m', '24h', '7d' -> segundos"""
+    if not texto:
+        return padrao
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", str(texto))
+    if not match:
+        raise ValueError(f"janela inválida: {texto}")
+    return float(match.group(1)) * _UNIDADES.get(match.group(2) or "s")
+
+
+class SerieStatus:
+    """
+    Histórico de status das instâncias em segmentos (run-length) no SQLite.
+
+    Cada linha é um período contínuo com o mesmo status (inicio, fim = última amostra).
+    Amostras iguais só estendem o `fim` do período aberto, em memória, e vão para o
+    disco em lote; uma linha nova só é gravada quando o status muda ou depois de uma
+    lacuna. Meses de amostras de 5s viram poucas linhas por instância, e as consultas
+    de janela leem só os períodos que a cruzam (índice por fim).
+    """
+
+    def __init__(self, caminho=SERIE_STATUS_DB, lacuna=SERIE_STATUS_LACUNA_SEG, intervalo_flush=30):
+        self.caminho = caminho
+        self.lacuna = lacuna
+        self.intervalo_flush = intervalo_flush
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._abertos = {}   # instancia -> [id, inicio, fim, conectado]
+        self._sujos = set()  # instâncias com fim ainda não gravado
+        self._parar = threading.Event()
+
+        conn = self._conexao()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS status_segmentos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                instancia TEXT NOT NULL,
+                inicio REAL NOT NULL,
+                fim REAL NOT NULL,
+                conectado INTEGER NOT NULL,
+                transicao INTEGER NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_segmentos_instancia_fim ON status_segmentos (instancia, fim)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_segmentos_fim ON status_segmentos (fim)")
+
+        self._thread = threading.Thread(target=self._loop_flush, name="serie-status", daemon=True)
+        self._thread.start()
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # -------------------- ESCRITA --------------------
+
+    def _aberto(self, instancia):
+        segmento = self._abertos.get(instancia)
+        if segmento is None:
+            linha = self._conexao().execute(
+                "SELECT id, inicio, fim, conectado FROM status_segmentos WHERE instancia = ? ORDER BY fim DESC LIMIT 1",
+                (instancia,)
+            ).fetchone()
+            if linha:
+                segmento = self._abertos[instancia] = [linha["id"], linha["inicio"], linha["fim"], bool(linha["conectado"])]
+        return segmento
+
+    def registrar(self, instancia, conectado, momento=None):
+        """Acrescenta uma amostra de status da instância"""
+        momento = momento or time.time()
+        conectado = bool(conectado)
+        with self._lock:
+            segmento = self._aberto(instancia)
+            if segmento and segmento[3] == conectado and momento - segmento[2] <= self.lacuna:
+                segmento[2] = momento
+                self._sujos.add(instancia)
+                return
+
+            conn = self._conexao()
+            conn.execute("BEGIN")
+            try:
+                if segmento and instancia in self._sujos:
+                    conn.execute("UPDATE status_segmentos SET fim = ? WHERE id = ?", (segmento[2], segmento[0]))
+                # Transição só se o período anterior chega até aqui (sem lacuna)
+                transicao = bool(segmento) and momento - segmento[2] <= self.lacuna
+                # Numa transição o período novo começa onde o anterior parou (sem buraco)
+                inicio = segmento[2] if transicao else momento
+                cursor = conn.execute(
+                    "INSERT INTO status_segmentos (instancia, inicio, fim, conectado, transicao) VALUES (?, ?, ?, ?, ?)",
+                    (instancia, inicio, momento, int(conectado), int(transicao))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._abertos[instancia] = [cursor.lastrowid, inicio, momento, conectado]
+            self._sujos.discard(instancia)
+
+    def flush(self):
+        """Grava o fim dos períodos abertos que foram estendidos"""
+        with self._lock:
+            if not self._sujos:
+                return 0
+            dados = [(self._abertos[i][2], self._abertos[i][0]) for i in self._sujos]
+            conn = self._conexao()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany("UPDATE status_segmentos SET fim = ? WHERE id = ?", dados)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._sujos.clear()
+            return len(dados)
+
+    def _loop_flush(self):
+        while not self._parar.wait(self.intervalo_flush):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar série de status: {e}")
+
+    def fechar(self):
+        self._parar.set()
+        self.flush()
+
+    # -------------------- CONSULTA --------------------
+
+    def resumo(self, janela=86400, instancia=None, agora=None):
+        """
+        Uptime, quedas e duração das desconexões por instância na janela (segundos).
+
+        uptime_pct é sobre o tempo observado (lacunas sem amostra não contam).
+        """
+        self.flush()
+        fim = agora or time.time()
+        inicio = fim - janela
+        filtro, parametros = "", {"t0": inicio, "t1": fim}
+        if instancia:
+            filtro, parametros["instancia"] = "AND instancia = :instancia", instancia
+
+        linhas = self._conexao().execute(f"""
+            SELECT instancia,
+                   SUM(MIN(fim, :t1) - MAX(inicio, :t0)) AS observado,
+                   SUM(CASE WHEN conectado THEN MIN(fim, :t1) - MAX(inicio, :t0) ELSE 0 END) AS conectado_seg,
+                   SUM(CASE WHEN transicao AND inicio >= :t0 THEN 1 ELSE 0 END) AS mudancas,
+                   SUM(CASE WHEN NOT conectado AND transicao AND inicio >= :t0 THEN 1 ELSE 0 END) AS quedas,
+                   SUM(CASE WHEN NOT conectado THEN MIN(fim, :t1) - MAX(inicio, :t0) ELSE 0 END) AS desconectado_seg,
+                   MAX(CASE WHEN NOT conectado THEN fim - inicio END) AS maior_desconexao,
+                   AVG(CASE WHEN NOT conectado THEN fim - inicio END) AS media_desconexao,
+                   MAX(fim) AS ultima_amostra
+            FROM status_segmentos
+            WHERE fim >= :t0 AND inicio <= :t1 {filtro}
+            GROUP BY instancia
+            ORDER BY instancia
+        """, parametros)
+
+        resultado = {}
+        for l in linhas:
+            observado = l["observado"] or 0.0
+            resultado[l["instancia"]] = {
+                "uptime_pct": round(100 * l["conectado_seg"] / observado, 3) if observado else None,
+                "observado_seg": round(observado, 1),
+                "mudancas": l["mudancas"],
+                "quedas": l["quedas"],
+                "desconectado_seg": round(l["desconectado_seg"], 1),
+                "maior_desconexao_seg": round(l["maior_desconexao"] or 0.0, 1),
+                "media_desconexao_seg": round(l["media_desconexao"] or 0.0, 1),
+                "ultima_amostra": l["ultima_amostra"],
+            }
+        return resultado
+
+    def desconexoes(self, instancia, janela=86400, limite=100, agora=None):
+        """Períodos desconectados da instância que cruzam a janela (mais recentes primeiro)"""
+        self.flush()
+        fim = agora or time.time()
+        linhas = self._conexao().execute("""
+            SELECT inicio, fim FROM status_segmentos
+            WHERE instancia = ? AND fim >= ? AND inicio <= ? AND conectado = 0
+            ORDER BY fim DESC LIMIT ?
+        """, (instancia, fim - janela, fim, limite))
+        return [{"inicio": l["inicio"], "fim": l["fim"], "duracao_seg": round(l["fim"] - l["inicio"], 1)} for l in linhas]
@@ -2,6 +2,7 @@ import datetime
 import os
 import random
 import asyncio
+import time
 from concurrent.futures import ThreadPoolExecutor
 import keyboard
 from click import prompt
@@ -9,6 +10,10 @@ from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 import ollama
+from integration.cache_respostas import CacheRespostas, normalizar
+from integration.inferencia import ServicoInferencia, chave_prompt
+from integration.resumo import JANELA_IA, resumir_incremental, resumo_do_historico
+from until.metricas import Histograma
 
 # ==========================
 # Configuração inicial
@@ -18,6 +23,49 @@ GENI_API_KEY = os.getenv("GEMINI_API_KEY")
 client = genai.Client(api_key=GENI_API_KEY)
 executor = ThreadPoolExecutor(max_workers=20)
 
+OLLAMA_MODELO = os.getenv("OLLAMA_MODELO", "llama3.2:1b")
+GEMINI_MODELO = os.getenv("GEMINI_MODELO", "gemini-1.5-flash")
+
+# Todas as chamadas aos modelos passam por aqui: limite de concorrência + coalescência
+inferencia_ollama = ServicoInferencia("ollama", int(os.getenv("OLLAMA_CONCORRENCIA", "2")))
+inferencia_gemini = ServicoInferencia("gemini", int(os.getenv("GEMINI_CONCORRENCIA", "8")))
+
+# Cache de respostas por contexto normalizado (modelo + prompts + janela do histórico)
+cache_respostas = CacheRespostas(
+    ttl=int(os.getenv("IA_CACHE_TTL", "600")),
+    capacidade=int(os.getenv("IA_CACHE_MAX", "2000")),
+    variantes=int(os.getenv("IA_CACHE_VARIANTES", "1"))
+)
+# Maturação: os agentes conversam entre si e repetir a mesma fala é justamente o padrão
+# de robô a evitar, então cada chave junta várias respostas e sorteia entre elas
+cache_maturacao = CacheRespostas(
+    ttl=int(os.getenv("IA_CACHE_TTL", "600")),
+    capacidade=int(os.getenv("IA_CACHE_MAX", "2000")),
+    variantes=int(os.getenv("IA_CACHE_VARIANTES_MATURACAO", "5"))
+)
+
+def chave_cache(modelo, mensagens, modo="completa"):
+    """Chave do cache/coalescência; `modo` separa respostas completas das cortadas no streaming"""
+    return chave_prompt(modelo, modo, [(m["role"], normalizar(m["content"])) for m in mensagens])
+
+# Tempo até o primeiro token e latência total das gerações em streaming, por backend
+latencias_stream = {
+    backend: {"ttft": Histograma(), "total": Histograma()}
+    for backend in ("ollama", "gemini")
+}
+
+def estatisticas_inferencia():
+    return {
+        "ollama": inferencia_ollama.estatisticas(),
+        "gemini": inferencia_gemini.estatisticas(),
+        "cache": cache_respostas.estatisticas(),
+        "cache_maturacao": cache_maturacao.estatisticas(),
+        "stream": {
+            backend: {nome: h.estatisticas() for nome, h in hists.items()}
+            for backend, hists in latencias_stream.items()
+        },
+    }
+
 # ==========================
 # Função delay assíncrono
 # ==========================
@@ -40,51 +88,35 @@ async def enviar_mensagem_async(agente, numero, mensagem):
         return False, resultado
 
 # ==========================
-# Função para gerar resposta do Gemini
+# Resumo incremental da conversa (regra única em integration/resumo.py)
 # ==========================
-def get_ia_response_gemini(user_message, historico=None, prompt_extra=""):
-    if not user_message:
-        return "🤔 Não entendi sua mensagem."
-
+def janela_com_resumo(historico, resumo=None):
+    """
+    Últimas JANELA_IA falas precedidas do resumo. Sem resumo guardado, monta um com
+    a mesma regra do resumo incremental (resumo_do_historico), para o modelo ver o
+    mesmo contexto com ou sem resumo salvo.
+    """
     historico = historico or []
+    janela = list(historico[-JANELA_IA:])
+    if not resumo and len(historico) > JANELA_IA:
+        resumo = resumo_do_historico(historico)
+    if resumo:
+        janela.insert(0, {"role": "system", "content": f"Resumo: {resumo}..."})
+    return janela
 
+# ==========================
+# Montagem dos prompts
+# ==========================
+def montar_prompt_gemini(user_message, historico=None, prompt_extra="", resumo=None):
     # Resumo do histórico
-    if len(historico) > 3:
-        resumo = " ".join([m["content"] for m in historico[:-3]])
-        historico = historico[-3:]
-        historico.insert(0, {"role": "system", "content": f"Resumo: {resumo[:150]}..."})
+    historico = janela_com_resumo(historico, resumo)
 
     contexto = f"\n".join([f"{m['role']}: {m['content']}" for m in historico])
     prompt = 'Você é um amigo virtual que conversa no WhatsApp.\n Responda curto, casual, com gírias e emojis.\n Máx 60 caracteres.\n Considere o contexto e evite repetir.'
-    prompt = prompt + f"{prompt_extra}\n{contexto}\nuser: {user_message}"
-
+    return prompt + f"{prompt_extra}\n{contexto}\nuser: {user_message}"
 
-
-    try:
-        response = client.models.generate_content(
-            model="gemini-1.5-flash",  # ou "gemini-2.5-flash"
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=0)
-            ),
-        )
-        return response.text.strip()
-    except Exception as e:
-        print(f"⚠️ Erro IA Gemini: {e}")
-        return "⚠️ Deu ruim aqui 😅"
-
-def get_ia_response_ollama(user_message, historico=None, prompt_extra=""):
-    if not user_message:
-        return "🤔 Não entendi sua mensagem."
-
-    historico = historico or []
-    if len(historico) > 3:
-        resumo = " ".join([m["content"] for m in historico[:-3]])
-        historico = historico[-3:]
-        historico.insert(0, {
-            "role": "system",
-            "content": f"Resumo: {resumo[:150]}..."
-        })
+def montar_mensagens_ollama(user_message, historico=None, prompt_extra="", resumo=None):
+    historico = janela_com_resumo(historico, resumo)
 
     mensagens = [{
         "role": "system",
@@ -108,26 +140,185 @@ def get_ia_response_ollama(user_message, historico=None, prompt_extra=""):
 
     # Adiciona última fala do usuário
     mensagens.append({"role": "user", "content": user_message})
+    return mensagens
+
+# ==========================
+# Função para gerar resposta do Gemini
+# ==========================
+def get_ia_response_gemini(user_message, historico=None, prompt_extra="", resumo=None, cache=None):
+    if not user_message:
+        return "🤔 Não entendi sua mensagem."
+
+    prompt = montar_prompt_gemini(user_message, historico, prompt_extra, resumo)
+
+    chave = chave_cache(GEMINI_MODELO, [{"role": "user", "content": prompt}])
+    cache = cache or cache_respostas
+    em_cache = cache.obter(chave)
+    if em_cache:
+        return em_cache
 
     try:
-        response = ollama.chat(model="llama3.2:1b", messages=mensagens)
-        return (
-            response.get("message", {}).get("content", "").strip()
-            or "😅 Não consegui pensar em nada agora."
+        response = inferencia_gemini.executar(
+            chave,
+            client.models.generate_content,
+            model=GEMINI_MODELO,  # ou "gemini-2.5-flash"
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                thinking_config=types.ThinkingConfig(thinking_budget=0)
+            ),
         )
+        resposta = response.text.strip()
+        cache.guardar(chave, resposta)
+        return resposta
+    except Exception as e:
+        print(f"⚠️ Erro IA Gemini: {e}")
+        return "⚠️ Deu ruim aqui 😅"
+
+def get_ia_response_ollama(user_message, historico=None, prompt_extra="", resumo=None, cache=None):
+    if not user_message:
+        return "🤔 Não entendi sua mensagem."
+
+    mensagens = montar_mensagens_ollama(user_message, historico, prompt_extra, resumo)
+
+    chave = chave_cache(OLLAMA_MODELO, mensagens)
+    cache = cache or cache_respostas
+    em_cache = cache.obter(chave)
+    if em_cache:
+        return em_cache
+
+    try:
+        response = inferencia_ollama.executar(
+            chave,
+            ollama.chat, model=OLLAMA_MODELO, messages=mensagens
+        )
+        resposta = response.get("message", {}).get("content", "").strip()
+        if not resposta:
+            return "😅 Não consegui pensar em nada agora."
+        cache.guardar(chave, resposta)
+        return resposta
+    except Exception as e:
+        print(f"⚠️ Erro IA: {e}")
+        return "⚠️ Deu ruim aqui 😅"
+
+# ==========================
+# Geração em streaming (envio antecipado)
+# ==========================
+FIM_DE_FRASE = ".!?…\n"
+
+def ponto_de_corte(texto, limite=120, minimo=20):
+    """
+    Posição onde a resposta já pode ser enviada: fim de frase depois de `minimo`
+    caracteres ou o limite de tamanho (recuando para o último espaço). None = continuar.
+    """
+    if len(texto) >= minimo:
+        for i in range(minimo - 1, min(len(texto), limite)):
+            if texto[i] in FIM_DE_FRASE:
+                return i + 1
+    if len(texto) >= limite:
+        espaco = texto.rfind(" ", 0, limite)
+        return espaco if espaco > minimo else limite
+    return None
+
+def consumir_stream(stream, texto_da_parte, backend, limite=120):
+    """
+    Lê as partes do stream (texto_da_parte extrai o texto de cada uma) até a resposta
+    ficar utilizável e registra TTFT/latência total. O stream é fechado ao sair.
+    Retorna (texto, completo); completo=False quando a resposta foi cortada.
+    """
+    inicio = time.perf_counter()
+    primeiro = True
+    texto = ""
+    completo = True
+    try:
+        for parte in stream:
+            pedaco = texto_da_parte(parte)
+            if not pedaco:
+                continue
+            if primeiro:
+                latencias_stream[backend]["ttft"].observar(time.perf_counter() - inicio)
+                primeiro = False
+            texto += pedaco
+            corte = ponto_de_corte(texto, limite)
+            if corte:
+                texto = texto[:corte]
+                completo = False
+                break
+    finally:
+        if hasattr(stream, "close"):
+            stream.close()  # fecha a resposta HTTP do stream: o servidor para de gerar
+        latencias_stream[backend]["total"].observar(time.perf_counter() - inicio)
+    return texto.strip(), completo
+
+def get_ia_response_ollama_stream(user_message, historico=None, prompt_extra="", limite=120, resumo=None, cache=None):
+    if not user_message:
+        return "🤔 Não entendi sua mensagem."
+
+    mensagens = montar_mensagens_ollama(user_message, historico, prompt_extra, resumo)
+
+    chave = chave_cache(OLLAMA_MODELO, mensagens, f"stream:{limite}")
+    cache = cache or cache_respostas
+    em_cache = cache.obter(chave)
+    if em_cache:
+        return em_cache
+
+    def gerar():
+        stream = ollama.chat(model=OLLAMA_MODELO, messages=mensagens, stream=True)
+        return consumir_stream(stream, lambda parte: parte.get("message", {}).get("content", ""), "ollama", limite)
+
+    try:
+        resposta, completa = inferencia_ollama.executar(chave, gerar)
+        if not resposta:
+            return "😅 Não consegui pensar em nada agora."
+        if completa:  # resposta cortada no meio não vale como resposta do prompt
+            cache.guardar(chave, resposta)
+        return resposta
     except Exception as e:
         print(f"⚠️ Erro IA: {e}")
         return "⚠️ Deu ruim aqui 😅"
 
+def get_ia_response_gemini_stream(user_message, historico=None, prompt_extra="", limite=120, resumo=None, cache=None):
+    if not user_message:
+        return "🤔 Não entendi sua mensagem."
+
+    prompt = montar_prompt_gemini(user_message, historico, prompt_extra, resumo)
+
+    chave = chave_cache(GEMINI_MODELO, [{"role": "user", "content": prompt}], f"stream:{limite}")
+    cache = cache or cache_respostas
+    em_cache = cache.obter(chave)
+    if em_cache:
+        return em_cache
+
+    def gerar():
+        stream = client.models.generate_content_stream(
+            model=GEMINI_MODELO,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                thinking_config=types.ThinkingConfig(thinking_budget=0)
+            ),
+        )
+        return consumir_stream(stream, lambda parte: parte.text or "", "gemini", limite)
+
+    try:
+        resposta, completa = inferencia_gemini.executar(chave, gerar)
+        if not resposta:
+            return "⚠️ Deu ruim aqui 😅"
+        if completa:
+            cache.guardar(chave, resposta)
+        return resposta
+    except Exception as e:
+        print(f"⚠️ Erro IA Gemini: {e}")
+        return "⚠️ Deu ruim aqui 😅"
+
 # ==========================
 # Loop de conversa assíncrono
 # ========================
 async def conversar_async(agente1, agente2, max_turnos=10, test_mode=False, get_ia_response=get_ia_response_ollama):
-    historico = []
+    historico = []  # só a janela recente; o que sai dela vai para o resumo
+    resumo = ""
     print(f"🤖 Iniciando conversa entre {agente1.nome} e {agente2.nome}")
 
     # Agente 1 inicia
-    msg = await asyncio.to_thread(get_ia_response, " ", historico, "Inicie uma conversa casual")
+    msg = await asyncio.to_thread(get_ia_response, " ", historico, "Inicie uma conversa casual", cache=cache_maturacao)
     count1, count2 = 0, 0
 
     for _ in range(max_turnos):
@@ -138,12 +329,14 @@ async def conversar_async(agente1, agente2, max_turnos=10, test_mode=False, get_
             print(f"{agente2.nome}: {resultado['message']}")
             break
         historico.append({"role": "assistant", "content": msg})
+        if len(historico) > JANELA_IA:
+            resumo = resumir_incremental(resumo, historico.pop(0)["content"])
         print(f"{agente1.nome}: {msg} → {agente2.nome} {datetime.datetime.now().strftime('%H:%M:%S')}")
         count1 += 1
 
         # já dispara a resposta do agente 2 em paralelo
         tarefa_resposta2 = asyncio.create_task(
-            asyncio.to_thread(get_ia_response, msg, historico, "Responda curto e natural (<=80 caracteres)")
+            asyncio.to_thread(get_ia_response, msg, list(historico), "Responda curto e natural (<=80 caracteres)", resumo=resumo, cache=cache_maturacao)
         )
 
         min = random.randint(1, 10)
@@ -158,12 +351,14 @@ async def conversar_async(agente1, agente2, max_turnos=10, test_mode=False, get_
             print(f"{agente2.nome}: {resultado['message']}")
             break
         historico.append({"role": "user", "content": resposta})
+        if len(historico) > JANELA_IA:
+            resumo = resumir_incremental(resumo, historico.pop(0)["content"])
         print(f"{agente2.nome}: {resposta} → {agente1.nome} {datetime.datetime.now().strftime('%H:%M:%S')}")
         count2 += 1
 
         # já dispara a próxima fala do agente1 em paralelo
         tarefa_resposta1 = asyncio.create_task(
-            asyncio.to_thread(get_ia_response, resposta, historico, "Continue a conversa de forma resumida (<=120 caracteres)")
+            asyncio.to_thread(get_ia_response, resposta, list(historico), "Continue a conversa de forma resumida (<=120 caracteres)", resumo=resumo, cache=cache_maturacao)
         )
 
         min = random.randint(1, 10)
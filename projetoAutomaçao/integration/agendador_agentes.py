@@ -0,0 +1,157 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from integration.fila_envio import fila_envio
+
+AGENDADOR_PAUSA_FALHA = float(os.getenv("AGENDADOR_PAUSA_FALHA", "30"))  # segundos após a 1ª falha
+AGENDADOR_PAUSA_MAX = float(os.getenv("AGENDADOR_PAUSA_MAX", "600"))
+
+log = logging.getLogger(__name__)
+
+
+def chave_agente(ag):
+    """Chave da instância no limitador e nos contadores (nomes podem se repetir)"""
+    return getattr(ag, "chave_envio", ag.nome)
+
+
+class _CargaAgente:
+    """Contadores de carga e saúde de um agente"""
+
+    def __init__(self):
+        self.em_voo = 0
+        self.enviados = 0
+        self.falhas = 0
+        self.falhas_seguidas = 0
+        self.pausado_ate = 0.0
+        self.peso_atual = 0.0
+        self.envios_recentes = deque()
+
+    def disponivel(self, agora):
+        return agora >= self.pausado_ate
+
+    def por_minuto(self, agora):
+        while self.envios_recentes and agora - self.envios_recentes[0] > 60:
+            self.envios_recentes.popleft()
+        return len(self.envios_recentes)
+
+
+class AgendadorAgentes:
+    """
+    Escolhe qual agente envia a próxima mensagem.
+
+    Estratégias:
+      - "menos_carga": agente com menos envios em andamento/na fila (least outstanding
+        requests), desempatando pela espera no limitador de envio
+      - "round_robin": round-robin ponderado, com peso maior para quem tem vaga agora
+    O ritmo de cada agente vem do limitador compartilhado da fila de envio; quem falha
+    fica pausado (com backoff). enviar() só agenda na fila de saída e não espera: o
+    resultado chega por callback, que registra a carga e tenta outro agente se falhar.
+    """
+
+    def __init__(self, estrategia="menos_carga", limitador=None):
+        self.estrategia = estrategia
+        self.limitador = limitador or fila_envio.limitador
+        self._cargas = {}
+        self._lock = threading.Lock()
+
+    def _carga(self, ag):
+        chave = chave_agente(ag)
+        carga = self._cargas.get(chave)
+        if carga is None:
+            carga = self._cargas[chave] = _CargaAgente()
+        return carga
+
+    def _espera(self, ag):
+        return self.limitador.espera(chave_agente(ag))
+
+    def escolher(self, agentes):
+        """Reserva e retorna o melhor agente disponível, ou None"""
+        with self._lock:
+            agora = time.monotonic()
+            candidatos = [(ag, self._carga(ag)) for ag in agentes]
+            candidatos = [(ag, c) for ag, c in candidatos if c.disponivel(agora)]
+            if not candidatos:
+                return None
+
+            if self.estrategia == "round_robin":
+                # Smooth weighted round-robin: peso 2 para quem pode enviar já, 1 para quem espera
+                pesos = [2 if self._espera(ag) <= 0 else 1 for ag, _ in candidatos]
+                for (_, c), peso in zip(candidatos, pesos):
+                    c.peso_atual += peso
+                ag, carga = max(candidatos, key=lambda par: par[1].peso_atual)
+                carga.peso_atual -= sum(pesos)
+            else:
+                ag, carga = min(candidatos, key=lambda par: (par[1].em_voo, self._espera(par[0]), random.random()))
+
+            carga.em_voo += 1
+            return ag
+
+    def registrar(self, ag, sucesso):
+        """Registra o resultado de um envio feito por um agente escolhido"""
+        with self._lock:
+            carga = self._carga(ag)
+            agora = time.monotonic()
+            carga.em_voo = max(0, carga.em_voo - 1)
+            if sucesso:
+                carga.enviados += 1
+                carga.falhas_seguidas = 0
+                carga.envios_recentes.append(agora)
+            else:
+                carga.falhas += 1
+                carga.falhas_seguidas += 1
+                pausa = min(AGENDADOR_PAUSA_MAX, AGENDADOR_PAUSA_FALHA * 2 ** (carga.falhas_seguidas - 1))
+                carga.pausado_ate = agora + pausa
+                log.warning("⏸️ [%s] pausado por %.0fs após %d falha(s)", ag.nome, pausa, carga.falhas_seguidas)
+
+    def enviar(self, agentes, numero, mensagem, tentativas=2):
+        """
+        Agenda o envio pela melhor opção e retorna o agente escolhido (None se nenhum
+        disponível) sem esperar o envio. Se falhar, outro agente é tentado, até
+        `tentativas` agentes no total.
+        """
+        ag = self.escolher(agentes)
+        if ag is not None:
+            self._agendar(ag, agentes, numero, mensagem, tentativas)
+        return ag
+
+    def _agendar(self, ag, agentes, numero, mensagem, restantes):
+        try:
+            futuro = ag.agendar_mensagem(numero, mensagem)
+        except Exception:
+            futuro = None
+            log.exception("⚠️ [%s] Erro ao agendar envio para %s", ag.nome, numero)
+        if futuro is None:
+            self._concluir(None, ag, agentes, numero, mensagem, restantes)
+        else:
+            futuro.add_done_callback(lambda f: self._concluir(f, ag, agentes, numero, mensagem, restantes))
+
+    def _concluir(self, futuro, ag, agentes, numero, mensagem, restantes):
+        sucesso = futuro is not None and not futuro.cancelled() and futuro.exception() is None and bool(futuro.result())
+        self.registrar(ag, sucesso)
+        if sucesso:
+            return
+        log.warning("⚠️ [%s] Falha ao enviar para %s", ag.nome, numero)
+        if restantes > 1:
+            outro = self.escolher(agentes)
+            if outro is not None:
+                self._agendar(outro, agentes, numero, mensagem, restantes - 1)
+                return
+        log.warning("⚠️ Mensagem para %s descartada: nenhum agente conseguiu enviar", numero)
+
+    def estatisticas(self):
+        with self._lock:
+            agora = time.monotonic()
+            resultado = {}
+            for chave, c in self._cargas.items():
+                resultado[chave] = {
+                    "em_voo": c.em_voo,
+                    "enviados": c.enviados,
+                    "falhas": c.falhas,
+                    "por_minuto": c.por_minuto(agora),
+                    "pausado_seg": round(max(0.0, c.pausado_ate - agora), 1),
+                }
+            return resultado
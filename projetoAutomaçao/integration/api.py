@@ -1,21 +1,24 @@
 import os
-import time
 import requests
 from dotenv import load_dotenv
+from integration.envio import ErroEnvio, pipeline_envio
+from integration.fila_envio import fila_envio
 
 load_dotenv()
 BASE_URL = "https://api.z-api.io"
 CLIENT_TOKEN = os.getenv('CLIENT_TOKEN')
 
 class Agente:
-    def __init__(self, nome, instance_id, token, numero=None, conectado=False):
+    def __init__(self, nome, instance_id, token, numero=None, conectado=False, atualizar=True):
         self.nome = nome
         self.instance_id = instance_id
         self.token = token
         self.numero = numero
         self.conectado = conectado
-        # Atualiza dados automaticamente
-        self.atualizar_status()
+        self.chave_envio = f"zapi:{instance_id}"  # chave do ritmo de envio e do circuit breaker
+        # Atualiza dados automaticamente (atualizar=False deixa para o monitor/reconciliação)
+        if atualizar:
+            self.atualizar_status()
 
     def atualizar_status(self):
         """Atualiza o status de conexão e número do dispositivo"""
@@ -47,20 +50,29 @@ class Agente:
             return {}
 
     def enviar_mensagem(self, numero, mensagem, tentativas=3):
-        """Envia mensagem de texto via Z-API com retry"""
+        """Envia mensagem de texto via Z-API no ritmo da instância e espera o resultado"""
+        return self.agendar_mensagem(numero, mensagem, tentativas).result()
+
+    def agendar_mensagem(self, numero, mensagem, tentativas=3):
+        """Coloca a mensagem na fila de saída da instância e retorna um Future (não bloqueia)"""
+        return fila_envio.agendar(self.chave_envio, self._enviar_agora, numero, mensagem, tentativas)
+
+    def _enviar_agora(self, numero, mensagem, tentativas=3):
+        """Envia com retry (backoff com jitter e circuit breaker)"""
         url = f"{BASE_URL}/instances/{self.instance_id}/token/{self.token}/send-text"
         payload = {"phone": numero, "message": mensagem}
         headers = {'Client-Token': CLIENT_TOKEN}
 
-        for tentativa in range(1, tentativas + 1):
-            try:
-                resp = requests.post(url, headers=headers, json=payload, timeout=10)
-                resp.raise_for_status()
-                return resp.json()
-            except requests.RequestException as e:
-                print(f"Tentativa {tentativa} falhou ao enviar para {numero}: {e}")
-                time.sleep(2)  # aguarda antes de tentar de novo
-        return None
+        try:
+            resp = pipeline_envio.enviar(
+                self.chave_envio,
+                lambda: requests.post(url, headers=headers, json=payload, timeout=10),
+                tentativas=tentativas
+            )
+            return resp.json()
+        except ErroEnvio as e:
+            print(f"Falha ao enviar para {numero}: {e}")
+            return None
 
     def dados(self):
         """Imprime informações do agente"""
@@ -88,11 +100,15 @@ def carregar_instancias():
                 })
     return instances
 
-# Cria objetos Agente
-agentes_zapi = []
-for ins in carregar_instancias():
-    ag = Agente(f"Zapi Lento {ins['numero']}", ins['id'], ins['token'])
-    agentes_zapi.append(ag)
+def carregar_agentes_zapi(atualizar=True):
+    """Cria um Agente para cada instância Z-API configurada no .env"""
+    return [
+        Agente(f"Zapi Lento {ins['numero']}", ins['id'], ins['token'], atualizar=atualizar)
+        for ins in sorted(carregar_instancias(), key=lambda ins: ins['numero'])
+    ]
+
+# Cria objetos Agente (o status vem depois, do monitor ou da reconciliação)
+agentes_zapi = carregar_agentes_zapi(atualizar=False)
 
 # Teste: imprime todos os agentes
 '''for ag in agentes:
@@ -1,5 +1,6 @@
 import os
 import base64
+import hashlib
 import random
 import time
 from io import BytesIO
@@ -13,13 +14,21 @@ import pyodbc
 from dotenv import load_dotenv
 from requests import session
 from websockets.asyncio.async_timeout import timeout
+from integration.cliente_gti import BASE_URL, cliente_gti, sessao_gti
+from integration.broadcast import motor_broadcast
+from integration.envio import ErroEnvio, pipeline_envio
+from integration.fila_envio import aguardar_vez, fila_envio
 
 load_dotenv()
-BASE_URL = "https://api.gtiapi.workers.dev"
+
+
+def chave_envio_gti(token, nome):
+    """Chave do ritmo de envio e do circuit breaker: por instância (token), com o nome para leitura"""
+    return f"gti:{nome}:{hashlib.sha1(str(token).encode('utf-8')).hexdigest()[:8]}"
 
 
 class AgenteGTI:
-    def __init__(self, token=None, nome=None, timeout=10, debug=False):
+    def __init__(self, token=None, nome=None, timeout=10, debug=False, atualizar=True):
         self.token = token
         self.nome = nome or "Agente GTI"
         self.numero = None
@@ -29,19 +38,19 @@ class AgenteGTI:
         self.timeout = timeout
         self.debug = debug
 
-        # Sessão persistente para reduzir latência
-        self.session = requests.Session()
-        self.session.headers.update({
-            "token": self.token,
-            "Content-Type": "application/json"
-        })
+        # Sessão compartilhada entre todos os agentes; o token vai em cada requisição
+        self.session = sessao_gti
+        self.headers = {"token": self.token}
+        self.chave_envio = chave_envio_gti(self.token, self.nome)
 
-        self.atualizar_status()
+        # atualizar=False adia a consulta de status (feita depois em lote com atualizar_status_parallel)
+        if atualizar:
+            self.atualizar_status()
 
     def atualizar_status(self):
         """Atualiza status da instância usando sessão persistente"""
         try:
-            resp = self.session.get(f"{BASE_URL}/instance/status", timeout=self.timeout)
+            resp = self.session.get(f"{BASE_URL}/instance/status", headers=self.headers, timeout=self.timeout)
             data = resp.json()
             self.numero = data.get("instance", {}).get("owner")
             self.conectado = data.get("status", {}).get("connected", False)
@@ -52,11 +61,18 @@ class AgenteGTI:
             self.conectado = False
 
     def enviar_mensagem(self, numero, mensagem, mentions=""):
-        """Envia mensagem via API GTI"""
+        """Envia mensagem via API GTI no ritmo da instância e espera o resultado"""
+        futuro = self.agendar_mensagem(numero, mensagem, mentions)
+        return futuro.result() if futuro else None
+
+    def agendar_mensagem(self, numero, mensagem, mentions=""):
+        """Coloca a mensagem na fila de saída da instância e retorna um Future (não bloqueia)"""
         if not mensagem:
             print(f"[{self.nome}] Mensagem vazia. Abortando envio.")
             return None
+        return fila_envio.agendar(self.chave_envio, self._enviar_agora, numero, mensagem, mentions)
 
+    def _enviar_agora(self, numero, mensagem, mentions=""):
         payload = {
             "number": str(numero),
             "text": str(mensagem),
@@ -68,17 +84,19 @@ class AgenteGTI:
         }
 
         try:
-            resp = self.session.post(f"{BASE_URL}/send/text", json=payload, timeout=self.timeout)
-            resp.raise_for_status()
+            resp = pipeline_envio.enviar(
+                self.chave_envio,
+                lambda: self.session.post(f"{BASE_URL}/send/text", json=payload, headers=self.headers, timeout=self.timeout)
+            )
             return resp.json()
-        except requests.RequestException as e:
+        except ErroEnvio as e:
             print(f"[{self.nome}] Erro ao enviar mensagem: {e}")
             return False
 
     def gerar_qr(self):
         """Solicita geração de QR code"""
         try:
-            resp = self.session.post(f"{BASE_URL}/instance/connect", timeout=self.timeout)
+            resp = self.session.post(f"{BASE_URL}/instance/connect", headers=self.headers, timeout=self.timeout)
 
             if resp.status_code == 409:
                 print(f"[{self.nome}] Já conectado, atualizando status.")
@@ -131,6 +149,8 @@ import httpx
 
 
 class AgenteGTIAsync:
+    """Handle leve de uma instância GTI sobre o cliente HTTP assíncrono compartilhado"""
+
     def __init__(self, token=None, nome=None, timeout=10):
         self.token = token
         self.nome = nome or "Agente GTI"
@@ -139,10 +159,7 @@ class AgenteGTIAsync:
         self.qrcode = ""
         self.status_data = {}
         self.timeout = timeout
-        self.client = httpx.AsyncClient(timeout=timeout, headers={
-            "token": self.token,
-            "Content-Type": "application/json"
-        })
+        self.chave_envio = chave_envio_gti(self.token, self.nome)
 
     async def async_init(self):
         """Inicializador assíncrono para atualizar status ao criar"""
@@ -151,7 +168,7 @@ class AgenteGTIAsync:
 
     async def atualizar_status(self):
         try:
-            resp = await self.client.get(f"{BASE_URL}/instance/status")
+            resp = await cliente_gti.get(self.token, "/instance/status", timeout=self.timeout)
             data = resp.json()
             self.numero = data.get("instance", {}).get("owner")
             self.conectado = data.get("status", {}).get("connected", False)
@@ -175,19 +192,32 @@ class AgenteGTIAsync:
             "readchat": True,
             "delay": 0
         }
-        resp = None
+
+        async def tentar():
+            # Cada tentativa (inclusive as retentativas do pipeline) respeita o ritmo da instância
+            await aguardar_vez(self.chave_envio)
+            return await cliente_gti.post(self.token, "/send/text", json=payload, timeout=self.timeout)
+
         try:
-            resp = await self.client.post(f"{BASE_URL}/send/text", json=payload)
-            resp.raise_for_status()
+            resp = await pipeline_envio.enviar_async(self.chave_envio, tentar)
             return True, resp.json()
-        except httpx.RequestError as e:
+        except ErroEnvio as e:
             print(f"[{self.nome}] Erro ao enviar mensagem: {e}")
-            return False, resp.json()
+            return False, corpo_do_erro(e)
 
 # ======================
 # Funções auxiliares
 # ======================
 
+def corpo_do_erro(erro):
+    """JSON da resposta de erro; corpo que não é JSON (ex.: página HTML de 502) vira {"message": texto}"""
+    if erro.resposta is None:
+        return {"message": str(erro)}
+    try:
+        return erro.resposta.json()
+    except ValueError:
+        return {"message": erro.resposta.text}
+
 def atualizar_webhook(agente, url):
     headers = {
         "token": agente.token,
@@ -292,16 +322,14 @@ def atualizar_status_parallel(agentes, max_workers=20):  # Aumente max_workers
                 print(f"[{ag.nome}] Erro inesperado ao atualizar: {e}")
 
 
-def enviar_mensagens_parallel(agentes, numero, mensagem, max_workers=20):  # Aumente max_workers
-    """Envia mensagens em paralelo para todos os agentes"""
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_agente = {executor.submit(ag.enviar_mensagem, numero, mensagem): ag for ag in agentes}
-        for future in as_completed(future_to_agente):
-            ag = future_to_agente[future]
-            try:
-                future.result()
-            except Exception as e:
-                print(f"[{ag.nome}] Erro inesperado no envio: {e}")
+def enviar_mensagens_parallel(agentes, numero, mensagem, max_workers=20):
+    """Envia a mensagem por todos os agentes (atalho para o motor de broadcast)"""
+    resumo = motor_broadcast.executar(
+        ((ag, numero, mensagem) for ag in agentes), checkpoint=False, concorrencia=max_workers
+    )
+    for erro, quantidade in resumo["erros"].items():
+        print(f"⚠️ {quantidade} envio(s) falharam: {erro}")
+    return resumo
 
 
 def qr():
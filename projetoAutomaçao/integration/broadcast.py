@@ -0,0 +1,276 @@
+import asyncio
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+
+from until.metricas import BUCKETS_PADRAO, Histograma
+
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "50"))
+BROADCAST_DB = os.getenv("BROADCAST_DB", "broadcast.db")
+BROADCAST_LOTE_CHECKPOINT = int(os.getenv("BROADCAST_LOTE_CHECKPOINT", "100"))
+
+# Envios em massa ficam na fila do limitador por muito mais que 2min
+BUCKETS_BROADCAST = BUCKETS_PADRAO + (300, 900, 1800, 3600)
+
+
+class CheckpointBroadcast:
+    """
+    Progresso de cada execução de broadcast (SQLite/WAL).
+
+    Cada tarefa é identificada pela posição dela no fluxo de entrada; ao retomar
+    uma execução com o mesmo id e o mesmo fluxo, as tarefas já enviadas são puladas
+    e as que falharam são tentadas de novo.
+    """
+
+    def __init__(self, caminho=BROADCAST_DB):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._conexao().execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_envios (
+                execucao TEXT NOT NULL,
+                indice INTEGER NOT NULL,
+                agente TEXT,
+                destino TEXT,
+                ok INTEGER NOT NULL,
+                erro TEXT,
+                feito_em REAL NOT NULL,
+                PRIMARY KEY (execucao, indice)
+            )
+        """)
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def concluidos(self, execucao):
+        """Índices já enviados com sucesso nesta execução"""
+        linhas = self._conexao().execute(
+            "SELECT indice FROM broadcast_envios WHERE execucao = ? AND ok = 1", (execucao,)
+        )
+        return {indice for (indice,) in linhas}
+
+    def registrar_lote(self, execucao, resultados):
+        """Grava [(indice, agente, destino, ok, erro, feito_em)] em uma transação"""
+        if not resultados:
+            return
+        conn = self._conexao()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("""
+                INSERT OR REPLACE INTO broadcast_envios (execucao, indice, agente, destino, ok, erro, feito_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(execucao, *r) for r in resultados])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def limpar(self, execucao):
+        self._conexao().execute("DELETE FROM broadcast_envios WHERE execucao = ?", (execucao,))
+
+
+class _Execucao:
+    """Estado de uma chamada a MotorBroadcast.executar()"""
+
+    def __init__(self, id_execucao, checkpoint, concorrencia=None):
+        self.id = id_execucao
+        self.checkpoint = checkpoint
+        # Limite de envios em voo só desta execução (além do limite global de workers)
+        self.vagas = asyncio.Semaphore(concorrencia) if concorrencia else None
+        # Um lote por vez no SQLite; a gravação final espera as que estão em andamento
+        self.gravacao = asyncio.Lock()
+        self.inicio = time.monotonic()
+        self.pendentes = 0
+        self.alimentacao_terminou = False
+        self.fim = asyncio.Event()
+        self.total = 0
+        self.enviados = 0
+        self.falhas = 0
+        self.pulados = 0
+        self.erros = Counter()
+        self.por_agente = {}
+        self.latencias = Histograma(BUCKETS_BROADCAST)
+        self._lote = []
+
+    def registrar(self, indice, agente, destino, ok, erro, latencia):
+        self.latencias.observar(latencia)
+        contagem = self.por_agente.setdefault(agente, {"enviados": 0, "falhas": 0})
+        if ok:
+            self.enviados += 1
+            contagem["enviados"] += 1
+        else:
+            self.falhas += 1
+            contagem["falhas"] += 1
+            self.erros[erro] += 1
+        self._lote.append((indice, agente, destino, int(ok), erro, time.time()))
+
+    def retirar_lote(self, minimo=BROADCAST_LOTE_CHECKPOINT):
+        if len(self._lote) < minimo:
+            return []
+        lote, self._lote = self._lote, []
+        return lote
+
+    def resumo(self):
+        duracao = time.monotonic() - self.inicio
+        processados = self.enviados + self.falhas
+        return {
+            "execucao": self.id,
+            "total": self.total,
+            "enviados": self.enviados,
+            "falhas": self.falhas,
+            "pulados": self.pulados,
+            "duracao_seg": round(duracao, 2),
+            "por_segundo": round(processados / duracao, 2) if duracao > 0 else 0.0,
+            "latencia": self.latencias.estatisticas(),
+            "erros": dict(self.erros.most_common(10)),
+            "por_agente": self.por_agente,
+        }
+
+
+class MotorBroadcast:
+    """
+    Envio em massa de tarefas (agente, destino, texto) por um pool assíncrono persistente.
+
+    Um event loop próprio roda em uma thread com `workers` corrotinas consumindo uma
+    fila limitada (o fluxo de entrada é lido aos poucos, não vai todo para a memória).
+    Agentes síncronos entram na fila de saída da instância (agendar_mensagem), então o
+    limite de envio de cada instância é respeitado sem ocupar uma thread por envio;
+    agentes assíncronos (AgenteGTIAsync) são aguardados direto no loop.
+    """
+
+    def __init__(self, workers=BROADCAST_WORKERS, checkpoint=None):
+        self.workers = workers
+        self._checkpoint = checkpoint
+        self._loop = None
+        self._fila = None
+        self._lock = threading.Lock()
+
+    @property
+    def checkpoint(self):
+        if self._checkpoint is None:
+            self._checkpoint = CheckpointBroadcast()
+        return self._checkpoint
+
+    def _iniciar(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            pronto = threading.Event()
+
+            def rodar():
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                self._fila = asyncio.Queue(maxsize=self.workers * 4)
+                for _ in range(self.workers):
+                    loop.create_task(self._worker())
+                self._loop = loop
+                pronto.set()
+                loop.run_forever()
+
+            threading.Thread(target=rodar, name="broadcast", daemon=True).start()
+            pronto.wait()
+
+    # -------------------- API --------------------
+
+    def iniciar(self, tarefas, execucao=None, checkpoint=True, concorrencia=None):
+        """Começa um broadcast e retorna um concurrent.futures.Future com o resumo"""
+        self._iniciar()
+        # Único mesmo para execuções no mesmo segundo; volta no resumo ("execucao") para retomar
+        execucao = execucao or f"{time.strftime('broadcast-%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        return asyncio.run_coroutine_threadsafe(
+            self._executar(tarefas, execucao, self.checkpoint if checkpoint else None, concorrencia), self._loop
+        )
+
+    def executar(self, tarefas, execucao=None, checkpoint=True, concorrencia=None):
+        """
+        Envia todas as tarefas e espera o fim. `tarefas` é qualquer iterável de
+        (agente, destino, texto). Passar o id de uma execução interrompida retoma
+        de onde parou. `concorrencia` limita quantos envios desta execução ficam
+        em voo ao mesmo tempo (padrão: todos os workers do motor).
+        """
+        return self.iniciar(tarefas, execucao, checkpoint, concorrencia).result()
+
+    # -------------------- LOOP --------------------
+
+    async def _executar(self, tarefas, execucao, checkpoint, concorrencia=None):
+        estado = _Execucao(execucao, checkpoint, concorrencia)
+        concluidos = await asyncio.to_thread(checkpoint.concluidos, execucao) if checkpoint else set()
+
+        # O iterável pode ler arquivo/banco: cada fatia é lida fora do loop
+        iterador = enumerate(tarefas)
+        while True:
+            fatia = await asyncio.to_thread(lambda: list(itertools.islice(iterador, self.workers)))
+            if not fatia:
+                break
+            for indice, (agente, destino, texto) in fatia:
+                estado.total += 1
+                if indice in concluidos:
+                    estado.pulados += 1
+                    continue
+                if estado.vagas is not None:
+                    await estado.vagas.acquire()
+                estado.pendentes += 1
+                await self._fila.put((estado, indice, agente, destino, texto))
+
+        estado.alimentacao_terminou = True
+        if estado.pendentes == 0:
+            estado.fim.set()
+        await estado.fim.wait()
+        await self._gravar(estado, minimo=1)
+        return estado.resumo()
+
+    async def _worker(self):
+        while True:
+            estado, indice, agente, destino, texto = await self._fila.get()
+            inicio = time.monotonic()
+            try:
+                ok, erro = await self._enviar(agente, destino, texto)
+            except Exception as e:
+                ok, erro = False, type(e).__name__
+            nome = getattr(agente, "nome", str(agente))
+            estado.registrar(indice, nome, str(destino), ok, erro, time.monotonic() - inicio)
+            estado.pendentes -= 1
+            if estado.vagas is not None:
+                estado.vagas.release()
+            try:
+                await self._gravar(estado)
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar checkpoint de {estado.id}: {e}")
+            if estado.pendentes == 0 and estado.alimentacao_terminou:
+                estado.fim.set()
+            self._fila.task_done()
+
+    @staticmethod
+    async def _enviar(agente, destino, texto):
+        """Retorna (ok, erro) para um envio"""
+        if not texto:
+            return False, "mensagem vazia"
+        if hasattr(agente, "agendar_mensagem"):
+            futuro = agente.agendar_mensagem(destino, texto)
+            resultado = await asyncio.wrap_future(futuro) if futuro is not None else None
+        else:
+            resultado = await agente.enviar_mensagem(destino, texto)
+        if isinstance(resultado, tuple):
+            resultado = resultado[1] if resultado[0] else None
+        if resultado is None or resultado is False:
+            return False, "envio recusado"
+        return True, None
+
+    async def _gravar(self, estado, minimo=BROADCAST_LOTE_CHECKPOINT):
+        if estado.checkpoint is None:
+            return
+        async with estado.gravacao:
+            lote = estado.retirar_lote(minimo)
+            if lote:
+                await asyncio.to_thread(estado.checkpoint.registrar_lote, estado.id, lote)
+
+
+motor_broadcast = MotorBroadcast()
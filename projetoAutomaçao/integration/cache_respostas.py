@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalizar(texto):
+    """Minúsculas e espaços colapsados, para prompts quase idênticos caírem na mesma chave"""
+    return " ".join(str(texto).lower().split())
+
+
+class CacheRespostas:
+    """
+    Cache de respostas da IA com TTL e limite de tamanho (LRU).
+
+    Com variantes > 1 cada chave junta N respostas geradas antes de começar a
+    servir do cache, e então sorteia uma delas, para as conversas não ficarem com
+    a mesma frase sempre. Repetidas contam para as N (guardadas uma vez só): um
+    prompt determinístico também passa a ser servido do cache depois de N gerações.
+    """
+
+    def __init__(self, ttl=600, capacidade=2000, variantes=1):
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self.variantes = max(1, variantes)
+        self._entradas = OrderedDict()  # chave -> [expira_em, [respostas distintas], gerações guardadas]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expiradas = 0
+        self.evictions = 0
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                expira_em, respostas, guardadas = entrada
+                if expira_em < time.monotonic():
+                    del self._entradas[chave]
+                    self.expiradas += 1
+                elif guardadas >= self.variantes:
+                    self._entradas.move_to_end(chave)
+                    self.hits += 1
+                    return random.choice(respostas)
+            self.misses += 1
+            return None
+
+    def guardar(self, chave, resposta):
+        if not resposta:
+            return
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                entrada = [time.monotonic() + self.ttl, [], 0]
+                self._entradas[chave] = entrada
+            respostas = entrada[1]
+            if entrada[2] < self.variantes:
+                entrada[2] += 1
+                if resposta not in respostas:
+                    respostas.append(resposta)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "capacidade": self.capacidade,
+                "ttl": self.ttl,
+                "variantes": self.variantes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / consultas, 4) if consultas else 0.0,
+                "expiradas": self.expiradas,
+                "evictions": self.evictions,
+            }
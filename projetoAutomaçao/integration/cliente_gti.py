@@ -0,0 +1,77 @@
+import asyncio
+import os
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = "https://api.gtiapi.workers.dev"
+GTI_POOL_MAX = int(os.getenv("GTI_POOL_MAX", "100"))
+GTI_HTTP2 = os.getenv("GTI_HTTP2", "1") == "1"
+
+
+def _http2_disponivel():
+    try:
+        import h2  # noqa: F401  (dependência opcional do httpx para HTTP/2)
+        return True
+    except ImportError:
+        return False
+
+
+class ClienteGTI:
+    """
+    Cliente HTTP assíncrono único para a API GTI.
+
+    Todas as instâncias compartilham o mesmo pool de conexões (HTTP/2 quando o
+    pacote h2 está instalado, multiplexando as requisições em poucas conexões TLS).
+    O token de cada agente vai como header em cada requisição.
+    """
+
+    def __init__(self, base_url=BASE_URL, limite=GTI_POOL_MAX, timeout=10, http2=GTI_HTTP2):
+        self.base_url = base_url
+        self.limite = limite
+        self.timeout = timeout
+        self.http2 = http2 and _http2_disponivel()
+        # httpx.AsyncClient fica preso ao event loop em que foi criado: um por loop
+        self._clientes = weakref.WeakKeyDictionary()
+
+    def _cliente(self):
+        loop = asyncio.get_running_loop()
+        cliente = self._clientes.get(loop)
+        if cliente is None or cliente.is_closed:
+            cliente = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.limite, max_keepalive_connections=self.limite),
+                headers={"Content-Type": "application/json"}
+            )
+            self._clientes[loop] = cliente
+        return cliente
+
+    async def get(self, token, caminho, **kwargs):
+        return await self._cliente().get(caminho, headers={"token": token}, **kwargs)
+
+    async def post(self, token, caminho, **kwargs):
+        return await self._cliente().post(caminho, headers={"token": token}, **kwargs)
+
+    async def fechar(self):
+        """Fecha o pool do event loop atual"""
+        cliente = self._clientes.pop(asyncio.get_running_loop(), None)
+        if cliente is not None:
+            await cliente.aclose()
+
+
+def criar_sessao_gti(limite=GTI_POOL_MAX):
+    """Sessão requests compartilhada pelos AgenteGTI síncronos (token vai por requisição)"""
+    sessao = requests.Session()
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=limite)
+    sessao.mount("https://", adaptador)
+    sessao.mount("http://", adaptador)
+    sessao.headers.update({"Content-Type": "application/json"})
+    return sessao
+
+
+cliente_gti = ClienteGTI()
+sessao_gti = criar_sessao_gti()
@@ -0,0 +1,288 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+import requests
+
+ENVIO_TENTATIVAS = int(os.getenv("ENVIO_TENTATIVAS", "3"))
+ENVIO_BACKOFF_BASE = float(os.getenv("ENVIO_BACKOFF_BASE", "1"))
+ENVIO_BACKOFF_MAX = float(os.getenv("ENVIO_BACKOFF_MAX", "30"))
+CIRCUITO_LIMITE_FALHAS = int(os.getenv("CIRCUITO_LIMITE_FALHAS", "5"))
+CIRCUITO_REABRIR_SEG = float(os.getenv("CIRCUITO_REABRIR_SEG", "60"))
+
+ERROS_REDE = (requests.RequestException, httpx.TransportError)
+
+
+class ErroEnvio(Exception):
+    """Falha definitiva de envio (tentativas esgotadas, erro 4xx ou circuito aberto)"""
+
+    def __init__(self, mensagem, resposta=None):
+        super().__init__(mensagem)
+        self.resposta = resposta
+
+
+class CircuitoAberto(ErroEnvio):
+    pass
+
+
+class RepetirEnvio(Exception):
+    """
+    Tentativa falhou e vale repetir. Só é levantada dentro da fila de envio, que
+    reagenda o mesmo envio para daqui a `espera` segundos em vez de dormir no worker.
+    """
+
+    def __init__(self, espera):
+        super().__init__(f"Repetir envio em {espera:.1f}s")
+        self.espera = espera
+
+
+# Número da tentativa do envio que a thread da fila de envio está executando (None fora da fila)
+_na_fila = threading.local()
+
+
+def tentativa_na_fila():
+    return getattr(_na_fila, "tentativa", None)
+
+
+def definir_tentativa_na_fila(tentativa):
+    _na_fila.tentativa = tentativa
+
+
+class CircuitBreaker:
+    """
+    Disjuntor por instância: abre depois de `limite_falhas` falhas seguidas e recusa
+    envios por `reabrir_apos` segundos; depois deixa passar um envio de teste
+    (meio-aberto) que fecha o circuito se der certo.
+    """
+
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    MEIO_ABERTO = "meio_aberto"
+
+    def __init__(self, limite_falhas=CIRCUITO_LIMITE_FALHAS, reabrir_apos=CIRCUITO_REABRIR_SEG):
+        self.limite_falhas = limite_falhas
+        self.reabrir_apos = reabrir_apos
+        self.estado = self.FECHADO
+        self.falhas_seguidas = 0
+        self.aberto_em = 0.0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return True
+            if self.estado == self.ABERTO and time.monotonic() - self.aberto_em >= self.reabrir_apos:
+                self.estado = self.MEIO_ABERTO
+                self._teste_em_andamento = False
+            if self.estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return True
+            return False
+
+    def sucesso(self):
+        with self._lock:
+            self.estado = self.FECHADO
+            self.falhas_seguidas = 0
+            self._teste_em_andamento = False
+
+    def neutro(self):
+        """Resposta que não diz nada sobre a saúde da instância: só encerra o envio de teste"""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            self._teste_em_andamento = False
+            if self.estado == self.MEIO_ABERTO or self.falhas_seguidas >= self.limite_falhas:
+                self.estado = self.ABERTO
+                self.aberto_em = time.monotonic()
+
+
+def retry_after(resposta, maximo=ENVIO_BACKOFF_MAX):
+    """Segundos pedidos no header Retry-After (número ou data HTTP), ou None"""
+    valor = resposta.headers.get("Retry-After") if resposta is not None else None
+    if not valor:
+        return None
+    try:
+        segundos = float(valor)
+    except ValueError:
+        try:
+            segundos = parsedate_to_datetime(valor).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, min(maximo, segundos))
+
+
+def backoff(tentativa, base=ENVIO_BACKOFF_BASE, maximo=ENVIO_BACKOFF_MAX):
+    """Espera antes da próxima tentativa: exponencial com equal jitter, entre teto/2 e teto"""
+    teto = min(maximo, base * 2 ** (tentativa - 1))
+    return teto / 2 + random.uniform(0, teto / 2)
+
+
+class PipelineEnvio:
+    """
+    Caminho único de envio para os clientes GTI (sync/async) e Z-API.
+
+    Repete falhas de rede, 429 e 5xx com backoff exponencial + jitter (respeitando
+    Retry-After), não repete outros 4xx e mantém um circuit breaker por instância.
+    Dentro da fila de envio cada chamada faz uma tentativa só e a espera até a
+    próxima vira um reagendamento na fila (RepetirEnvio); fora dela, dorme.
+    """
+
+    def __init__(self, tentativas=ENVIO_TENTATIVAS, base=ENVIO_BACKOFF_BASE, maximo=ENVIO_BACKOFF_MAX):
+        self.tentativas = tentativas
+        self.base = base
+        self.maximo = maximo
+        self._breakers = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, chave):
+        with self._lock:
+            br = self._breakers.get(chave)
+            if br is None:
+                br = self._breakers[chave] = CircuitBreaker()
+                self._contadores[chave] = {"envios": 0, "sucessos": 0, "falhas": 0, "retentativas": 0, "bloqueados": 0}
+            return br
+
+    def _contar(self, chave, campo):
+        with self._lock:
+            self._contadores[chave][campo] += 1
+
+    def _espera(self, tentativa, resposta=None):
+        pedido = retry_after(resposta, self.maximo)
+        if pedido is not None:
+            return pedido
+        return backoff(tentativa, self.base, self.maximo)
+
+    def _avaliar(self, chave, br, resposta):
+        """Retorna a resposta se deu certo, None se vale repetir; erro definitivo levanta ErroEnvio"""
+        status = resposta.status_code
+        if status < 400:
+            br.sucesso()
+            self._contar(chave, "sucessos")
+            return resposta
+        if status == 429 or status >= 500:
+            return None
+        # Outros 4xx: problema do pedido (número inválido, payload) e não repete. Não conta
+        # como sucesso nem como falha da instância: o disjuntor fica como estava.
+        br.neutro()
+        self._contar(chave, "falhas")
+        raise ErroEnvio(f"HTTP {status}", resposta)
+
+    def _inesperado(self, chave, br):
+        # Erro fora de ERROS_REDE (resposta ilegível, SSL/proxy, cancelamento): conta como
+        # falha para o envio de teste do meio-aberto não ficar preso
+        br.falha()
+        self._contar(chave, "falhas")
+
+    def _liberar(self, chave, br):
+        self._contar(chave, "envios")
+        if not br.permitir():
+            self._contar(chave, "bloqueados")
+            raise CircuitoAberto(f"Circuito aberto para {chave}")
+
+    def _desistir(self, chave, br, tentativas, erro, resposta):
+        br.falha()
+        self._contar(chave, "falhas")
+        raise ErroEnvio(f"Falha após {tentativas} tentativas: {erro}", resposta)
+
+    def enviar(self, chave, requisicao, tentativas=None):
+        """Executa requisicao() (que retorna a resposta HTTP) com retry e disjuntor"""
+        tentativas = tentativas or self.tentativas
+        na_fila = tentativa_na_fila()
+        if na_fila is not None:
+            return self._tentar_na_fila(chave, requisicao, tentativas, na_fila)
+
+        br = self.breaker(chave)
+        self._liberar(chave, br)
+        erro, resposta = None, None
+        try:
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    resposta = requisicao()
+                    ok = self._avaliar(chave, br, resposta)
+                    if ok is not None:
+                        return ok
+                    erro = f"HTTP {resposta.status_code}"
+                except ERROS_REDE as e:
+                    erro, resposta = e, None
+                if tentativa < tentativas:
+                    self._contar(chave, "retentativas")
+                    time.sleep(self._espera(tentativa, resposta))
+            self._desistir(chave, br, tentativas, erro, resposta)
+        except ErroEnvio:
+            raise
+        except BaseException:
+            self._inesperado(chave, br)
+            raise
+
+    def _tentar_na_fila(self, chave, requisicao, tentativas, tentativa):
+        """Uma tentativa; se vale repetir, levanta RepetirEnvio para a fila reagendar"""
+        br = self.breaker(chave)
+        if tentativa == 1:
+            self._liberar(chave, br)
+        try:
+            try:
+                resposta = requisicao()
+                ok = self._avaliar(chave, br, resposta)
+                if ok is not None:
+                    return ok
+                erro = f"HTTP {resposta.status_code}"
+            except ERROS_REDE as e:
+                erro, resposta = e, None
+            if tentativa < tentativas:
+                self._contar(chave, "retentativas")
+                raise RepetirEnvio(self._espera(tentativa, resposta))
+            self._desistir(chave, br, tentativas, erro, resposta)
+        except (ErroEnvio, RepetirEnvio):
+            raise
+        except BaseException:
+            self._inesperado(chave, br)
+            raise
+
+    async def enviar_async(self, chave, requisicao, tentativas=None):
+        """Versão assíncrona: requisicao() é uma coroutine function"""
+        br = self.breaker(chave)
+        self._liberar(chave, br)
+        tentativas = tentativas or self.tentativas
+        erro, resposta = None, None
+        try:
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    resposta = await requisicao()
+                    ok = self._avaliar(chave, br, resposta)
+                    if ok is not None:
+                        return ok
+                    erro = f"HTTP {resposta.status_code}"
+                except ERROS_REDE as e:
+                    erro, resposta = e, None
+                if tentativa < tentativas:
+                    self._contar(chave, "retentativas")
+                    await asyncio.sleep(self._espera(tentativa, resposta))
+            self._desistir(chave, br, tentativas, erro, resposta)
+        except ErroEnvio:
+            raise
+        except BaseException:
+            self._inesperado(chave, br)
+            raise
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                chave: {
+                    "circuito": br.estado,
+                    "falhas_seguidas": br.falhas_seguidas,
+                    **self._contadores[chave]
+                }
+                for chave, br in self._breakers.items()
+            }
+
+
+pipeline_envio = PipelineEnvio()
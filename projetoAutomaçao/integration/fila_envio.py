@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from integration.envio import RepetirEnvio, definir_tentativa_na_fila
+
+ENVIO_TAXA = float(os.getenv("ENVIO_TAXA", "0.2"))                  # mensagens/segundo por instância
+ENVIO_BURST = float(os.getenv("ENVIO_BURST", "3"))                  # rajada máxima por instância
+ENVIO_INTERVALO_MIN = float(os.getenv("ENVIO_INTERVALO_MIN", "2"))  # segundos entre duas mensagens
+ENVIO_WORKERS = int(os.getenv("ENVIO_WORKERS", "20"))
+
+
+class _Balde:
+    def __init__(self, burst, agora):
+        self.tokens = burst
+        self.atualizado = agora
+        self.ultimo_envio = float("-inf")
+
+
+class LimitadorEnvio:
+    """
+    Token bucket por instância com rajada e intervalo mínimo entre mensagens.
+
+    reservar() não dorme: devolve quantos segundos faltam para o horário reservado
+    do próximo envio daquela instância, e o chamador decide como esperar.
+    """
+
+    def __init__(self, taxa=ENVIO_TAXA, burst=ENVIO_BURST, intervalo_min=ENVIO_INTERVALO_MIN):
+        self.taxa = taxa
+        self.burst = burst
+        self.intervalo_min = intervalo_min
+        self._baldes = {}
+        self._lock = threading.Lock()
+
+    def _balde(self, chave, agora):
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = _Balde(self.burst, agora)
+        elif self.taxa > 0:
+            balde.tokens = min(self.burst, balde.tokens + (agora - balde.atualizado) * self.taxa)
+            balde.atualizado = agora
+        return balde
+
+    def _horario_livre(self, balde, agora):
+        horario = max(agora, balde.ultimo_envio + self.intervalo_min)
+        if balde.tokens < 1 and self.taxa > 0:
+            horario = max(horario, agora + (1 - balde.tokens) / self.taxa)
+        return horario
+
+    def reservar(self, chave):
+        """Reserva o próximo horário de envio da instância e retorna o atraso em segundos"""
+        with self._lock:
+            agora = time.monotonic()
+            balde = self._balde(chave, agora)
+            horario = self._horario_livre(balde, agora)
+            balde.tokens -= 1  # pode ficar negativo: é a fila de reservas futuras
+            balde.ultimo_envio = horario
+            return horario - agora
+
+    def espera(self, chave):
+        """Quanto um envio reservado agora teria que esperar (sem reservar)"""
+        with self._lock:
+            agora = time.monotonic()
+            return self._horario_livre(self._balde(chave, agora), agora) - agora
+
+    def estatisticas(self):
+        with self._lock:
+            agora = time.monotonic()
+            resultado = {}
+            for chave in list(self._baldes):
+                balde = self._balde(chave, agora)
+                resultado[chave] = {
+                    "tokens": round(balde.tokens, 2),
+                    "espera_seg": round(self._horario_livre(balde, agora) - agora, 2),
+                }
+            return resultado
+
+
+class FilaEnvio:
+    """
+    Fila de saída compartilhada pelos agentes GTI e Z-API.
+
+    agendar() reserva o horário no limitador e devolve um Future na hora; uma única
+    thread agenda os envios vencidos em um pool de workers, então quem chama não
+    fica bloqueado esperando o ritmo da instância. Uma tentativa que falha e vale
+    repetir (RepetirEnvio, do PipelineEnvio) volta para a fila com o backoff, sem
+    dormir no worker.
+    """
+
+    def __init__(self, limitador=None, workers=ENVIO_WORKERS):
+        self.limitador = limitador or LimitadorEnvio()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="envio")
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pendentes = {}
+        self._thread = None  # sobe no primeiro agendar(), não na importação
+
+    def agendar(self, chave, funcao, *args, **kwargs):
+        futuro = Future()
+        atraso = self.limitador.reservar(chave)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="fila-envio", daemon=True)
+                self._thread.start()
+            self._pendentes[chave] = self._pendentes.get(chave, 0) + 1
+            self._empurrar(atraso, chave, funcao, args, kwargs, futuro, 1)
+        return futuro
+
+    def _empurrar(self, atraso, chave, funcao, args, kwargs, futuro, tentativa):
+        heapq.heappush(self._heap, (time.monotonic() + atraso, next(self._seq), chave, funcao, args, kwargs, futuro, tentativa))
+        self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, *envio = heapq.heappop(self._heap)
+            self._executor.submit(self._executar, *envio)
+
+    def _executar(self, chave, funcao, args, kwargs, futuro, tentativa):
+        reagendado = False
+        definir_tentativa_na_fila(tentativa)
+        try:
+            futuro.set_result(funcao(*args, **kwargs))
+        except RepetirEnvio as repetir:
+            # A nova tentativa também respeita o ritmo da instância
+            atraso = max(repetir.espera, self.limitador.reservar(chave))
+            with self._cond:
+                self._empurrar(atraso, chave, funcao, args, kwargs, futuro, tentativa + 1)
+            reagendado = True
+        except Exception as e:
+            futuro.set_exception(e)
+        finally:
+            definir_tentativa_na_fila(None)
+            if not reagendado:
+                with self._cond:
+                    self._pendentes[chave] -= 1
+                    self._cond.notify_all()
+
+    def aguardar(self, timeout=None):
+        """Espera os envios já agendados terminarem (encerramento gracioso); False se estourar o timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not any(self._pendentes.values()), timeout)
+
+    def pendentes(self, chave=None):
+        with self._cond:
+            if chave is not None:
+                return self._pendentes.get(chave, 0)
+            return sum(self._pendentes.values())
+
+    def estatisticas(self):
+        limites = self.limitador.estatisticas()
+        with self._cond:
+            return {
+                chave: {"fila": self._pendentes.get(chave, 0), **limite}
+                for chave, limite in limites.items()
+            }
+
+
+async def aguardar_vez(chave, limitador=None):
+    """Ritmo para clientes assíncronos: reserva o horário e dorme sem bloquear o loop"""
+    atraso = (limitador or fila_envio.limitador).reservar(chave)
+    if atraso > 0:
+        await asyncio.sleep(atraso)
+
+
+fila_envio = FilaEnvio()
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from until.metricas import Histograma
+
+
+def chave_prompt(*partes):
+    """Hash estável de um prompt (modelo, mensagens, ...) para coalescer pedidos iguais"""
+    bruto = json.dumps(partes, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(bruto.encode("utf-8")).hexdigest()
+
+
+class ServicoInferencia:
+    """
+    Ponto único de acesso a um modelo de IA.
+
+    Limita quantas gerações rodam ao mesmo tempo (capacidade do modelo) e
+    coalesce pedidos idênticos em andamento: quem chega depois espera o
+    resultado do primeiro em vez de gerar de novo.
+    """
+
+    def __init__(self, nome, concorrencia=2):
+        self.nome = nome
+        self.concorrencia = concorrencia
+        self._semaforo = threading.BoundedSemaphore(max(1, concorrencia))
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.chamadas = 0
+        self.coalescidas = 0
+        self.erros = 0
+        self.aguardando = 0
+        self.gerando = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.geracao_total = 0.0
+        self.geracao_max = 0.0
+        self.latencia_espera = Histograma()   # tempo na fila do semáforo
+        self.latencia_geracao = Histograma()  # tempo da chamada ao modelo
+
+    def executar(self, chave, funcao, *args, **kwargs):
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = self._em_andamento[chave] = Future()
+                self.chamadas += 1
+                self.aguardando += 1
+            else:
+                self.coalescidas += 1
+
+        if not lider:
+            return futuro.result()
+
+        entrada = time.perf_counter()
+        inicio = None
+        try:
+            with self._semaforo:
+                inicio = time.perf_counter()
+                with self._lock:
+                    self.aguardando -= 1
+                    self.gerando += 1
+                try:
+                    resultado = funcao(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self.gerando -= 1
+            futuro.set_result(resultado)
+            return resultado
+        except Exception as e:
+            with self._lock:
+                self.erros += 1
+            futuro.set_exception(e)
+            raise
+        finally:
+            fim = time.perf_counter()
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+                if inicio is None:
+                    # Falhou antes de conseguir vaga
+                    self.aguardando -= 1
+                    inicio = fim
+                espera, geracao = inicio - entrada, fim - inicio
+                self.espera_total += espera
+                self.espera_max = max(self.espera_max, espera)
+                self.geracao_total += geracao
+                self.geracao_max = max(self.geracao_max, geracao)
+            if not futuro.done():
+                # Líder saiu por BaseException (KeyboardInterrupt, SystemExit...): libera quem espera
+                futuro.set_exception(RuntimeError(f"Geração interrompida em {self.nome}"))
+            self.latencia_espera.observar(espera)
+            self.latencia_geracao.observar(geracao)
+
+    def estatisticas(self):
+        with self._lock:
+            chamadas = self.chamadas
+            return {
+                "concorrencia": self.concorrencia,
+                "aguardando": self.aguardando,
+                "gerando": self.gerando,
+                "chamadas": chamadas,
+                "coalescidas": self.coalescidas,
+                "erros": self.erros,
+                "espera_media_ms": round(self.espera_total / chamadas * 1000, 1) if chamadas else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 1),
+                "geracao_media_ms": round(self.geracao_total / chamadas * 1000, 1) if chamadas else 0.0,
+                "geracao_max_ms": round(self.geracao_max * 1000, 1),
+            }
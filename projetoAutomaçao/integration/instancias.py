@@ -0,0 +1,47 @@
+import os
+
+from integration.registro_agentes import RegistroAgentes
+
+# Intervalo da redescoberta de instâncias (.env + tabela ROTA)
+INSTANCIAS_ATUALIZAR_SEG = int(os.getenv("INSTANCIAS_ATUALIZAR_SEG", "300"))
+
+
+def fonte_zapi_env():
+    """Instâncias Z-API do .env (qualquer ZAPI_LENTO_<n>_ID/_TOKEN), sem consultar status"""
+    from dotenv import load_dotenv
+    from integration.api import carregar_agentes_zapi
+
+    # Relê o .env para pegar instâncias adicionadas com o processo rodando, sem
+    # sobrescrever o que já está no ambiente (variáveis do deploy têm prioridade)
+    load_dotenv(override=False)
+    return carregar_agentes_zapi(atualizar=False)
+
+
+def fonte_gti_banco(classe=None):
+    """Fábrica da fonte GTI (tabela ROTA); `classe` é AgenteGTI (padrão) ou AgenteGTIAsync"""
+    def fonte():
+        from banco.dbo import DB, listar_rotas_gti
+        from integration.api_GTI import AgenteGTI
+
+        if classe is None:
+            return [AgenteGTI(nome=telefone, token=senha, atualizar=False) for telefone, senha in listar_rotas_gti(DB)]
+        return [classe(nome=telefone, token=senha) for telefone, senha in listar_rotas_gti(DB)]
+    return fonte
+
+
+def criar_registro(zapi=True, gti=True, classe_gti=None):
+    """Registro unificado das instâncias Z-API (.env) e GTI (banco)"""
+    fontes = {}
+    if zapi:
+        fontes["zapi_env"] = fonte_zapi_env
+    if gti:
+        fontes["gti_banco"] = fonte_gti_banco(classe_gti)
+    return RegistroAgentes(fontes=fontes)
+
+
+def descrever_instancia(ag):
+    """Descrição usada pelo monitor de status (Z-API tem instance_id; GTI só token)"""
+    instance_id = getattr(ag, "instance_id", None)
+    if instance_id:
+        return {"tipo": "zapi", "id": instance_id, "token": ag.token, "name": ag.nome}
+    return {"tipo": "gti", "token": ag.token, "name": ag.nome}
@@ -0,0 +1,174 @@
+import threading
+
+
+class RegistroAgentes:
+    """
+    Índice dos agentes (GTI e Z-API) por token, número e nome.
+
+    Mantém em dicionários os agentes conectados para que o roteamento seja O(1)
+    e é atualizado de forma incremental pelos eventos de conexão do webhook.
+
+    Com `fontes` (funções que retornam listas de agentes, ex.: .env e tabela ROTA),
+    recarregar() descobre instâncias novas e removidas sem recriar as existentes;
+    quem precisa reagir (monitor, maturação) se inscreve com ao_atualizar().
+    """
+
+    def __init__(self, agentes=None, fontes=()):
+        self.fontes = dict(fontes)     # nome -> função sem argumentos que retorna agentes
+        self._ultimo_por_fonte = {}    # nome -> tokens da última leitura bem-sucedida
+        self._ouvintes = []
+        self._parar = threading.Event()
+        self._lock = threading.RLock()
+        self._por_token = {}
+        self._todos_por_nome = {}
+        self._por_numero = {}
+        self._por_nome = {}
+        self._conectados = {}
+        self._numero_indexado = {}
+        self._lista = ()
+        if agentes:
+            self.carregar(agentes)
+
+    def carregar(self, agentes):
+        """Reconstrói o índice a partir de uma lista completa de agentes"""
+        with self._lock:
+            self._por_token.clear()
+            self._todos_por_nome.clear()
+            self._por_numero.clear()
+            self._por_nome.clear()
+            self._conectados.clear()
+            self._numero_indexado.clear()
+            for ag in agentes:
+                self._por_token[ag.token] = ag
+                self._todos_por_nome[ag.nome] = ag
+                self._indexar(ag)
+            self._lista = tuple(self._conectados.values())
+
+    def _indexar(self, ag):
+        # Remove a entrada antiga por número (o número pode ter mudado)
+        numero_antigo = self._numero_indexado.pop(ag.token, None)
+        if numero_antigo and self._por_numero.get(numero_antigo) is ag:
+            del self._por_numero[numero_antigo]
+
+        if ag.conectado:
+            self._conectados[ag.token] = ag
+            self._por_nome[ag.nome] = ag
+            if ag.numero:
+                self._por_numero[str(ag.numero)] = ag
+                self._numero_indexado[ag.token] = str(ag.numero)
+        else:
+            self._conectados.pop(ag.token, None)
+            if self._por_nome.get(ag.nome) is ag:
+                del self._por_nome[ag.nome]
+
+    def reindexar(self):
+        """Recalcula os índices de conexão depois de atualizar status em lote"""
+        with self._lock:
+            self.carregar(list(self._por_token.values()))
+
+    def sincronizar(self, agentes):
+        """
+        Aplica a lista completa de agentes de forma incremental (chave: token).
+
+        Agentes já conhecidos são mantidos (com o status que já têm); retorna
+        (novos, removidos).
+        """
+        with self._lock:
+            atuais = {ag.token: ag for ag in agentes if ag.token}
+            removidos = [ag for token, ag in self._por_token.items() if token not in atuais]
+            novos = [ag for token, ag in atuais.items() if token not in self._por_token]
+            for ag in removidos:
+                ag.conectado = False
+                self._indexar(ag)
+                del self._por_token[ag.token]
+                if self._todos_por_nome.get(ag.nome) is ag:
+                    del self._todos_por_nome[ag.nome]
+            for ag in novos:
+                self._por_token[ag.token] = ag
+                self._todos_por_nome[ag.nome] = ag
+                self._indexar(ag)
+            self._lista = tuple(self._conectados.values())
+        return novos, removidos
+
+    def recarregar(self):
+        """Lê todas as fontes e sincroniza; uma fonte que falhar mantém o que já tinha"""
+        agentes = []
+        for nome, fonte in self.fontes.items():
+            try:
+                lidos = list(fonte())
+                self._ultimo_por_fonte[nome] = {ag.token for ag in lidos}
+            except Exception as e:
+                print(f"⚠️ Erro ao ler instâncias de {nome}: {e}")
+                anteriores = self._ultimo_por_fonte.get(nome, set())
+                lidos = [ag for ag in self.todos() if ag.token in anteriores]
+            agentes.extend(lidos)
+
+        novos, removidos = self.sincronizar(agentes)
+        if novos or removidos:
+            print(f"🔎 Instâncias: +{len(novos)} / -{len(removidos)} (total {len(self._por_token)})")
+            for ouvinte in list(self._ouvintes):
+                try:
+                    ouvinte(novos, removidos)
+                except Exception as e:
+                    print(f"⚠️ Erro ao notificar atualização de instâncias: {e}")
+        return novos, removidos
+
+    def ao_atualizar(self, ouvinte):
+        """Registra ouvinte(novos, removidos), chamado quando o conjunto de instâncias muda"""
+        self._ouvintes.append(ouvinte)
+
+    def iniciar_atualizacao(self, intervalo=300):
+        """Recarrega as fontes periodicamente em uma thread daemon"""
+        def loop():
+            while not self._parar.wait(intervalo):
+                self.recarregar()
+
+        thread = threading.Thread(target=loop, name="registro-agentes", daemon=True)
+        thread.start()
+        return thread
+
+    def parar(self):
+        self._parar.set()
+
+    def atualizar(self, ag):
+        """Reindexa um agente depois de mudar numero/conectado"""
+        with self._lock:
+            self._por_token[ag.token] = ag
+            self._todos_por_nome[ag.nome] = ag
+            self._indexar(ag)
+            self._lista = tuple(self._conectados.values())
+
+    def evento_conexao(self, conectado, token=None, nome=None, numero=None):
+        """Aplica um evento CONNECTED/DISCONNECTED. Retorna o agente ou None se desconhecido."""
+        with self._lock:
+            ag = self._por_token.get(token) if token else None
+            if ag is None and nome:
+                ag = self._todos_por_nome.get(nome)
+            if ag is None:
+                return None
+
+            ag.conectado = conectado
+            if numero:
+                ag.numero = str(numero)
+            self.atualizar(ag)
+            return ag
+
+    def por_numero(self, numero):
+        return self._por_numero.get(str(numero)) if numero else None
+
+    def por_nome(self, nome):
+        return self._por_nome.get(nome)
+
+    def por_token(self, token):
+        return self._por_token.get(token)
+
+    def conectados(self):
+        """Snapshot imutável dos agentes conectados"""
+        return self._lista
+
+    def todos(self):
+        with self._lock:
+            return list(self._por_token.values())
+
+    def __len__(self):
+        return len(self._lista)
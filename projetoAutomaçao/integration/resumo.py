@@ -0,0 +1,22 @@
+# Resumo incremental da conversa (sem dependências: usado pela IA, pelo webhook e pela migração)
+
+JANELA_IA = 3      # últimas falas enviadas na íntegra ao modelo
+RESUMO_MAX = 150   # tamanho máximo do resumo das falas que saíram da janela
+
+
+def resumir_incremental(resumo, conteudo, limite=RESUMO_MAX):
+    """Acrescenta ao resumo uma fala que saiu da janela, mantendo os últimos `limite` caracteres"""
+    texto = f"{resumo} {conteudo}".strip() if resumo else str(conteudo).strip()
+    if len(texto) > limite:
+        texto = texto[-limite:]
+        espaco = texto.find(" ")
+        if 0 <= espaco < limite // 3:
+            texto = texto[espaco + 1:]  # não começa no meio de uma palavra
+    return texto
+
+
+def resumo_do_historico(mensagens, janela=JANELA_IA, resumo=""):
+    """Resumo das falas fora das últimas `janela`, como se tivessem saído da janela uma a uma"""
+    for mensagem in mensagens[:-janela] if janela else mensagens:
+        resumo = resumir_incremental(resumo, mensagem.get("content", ""))
+    return resumo
@@ -1,28 +1,43 @@
 import asyncio
 import itertools
-import random
+import time
 import keyboard
-from banco.dbo import carregar_agentes_async_do_banco_async
+from banco.estado_agentes import EstadoAgentes
+from integration.api_GTI import AgenteGTIAsync
+from integration.instancias import INSTANCIAS_ATUALIZAR_SEG, criar_registro
 from integration.IA import conversar_async, get_ia_response_ollama, get_ia_response_gemini
-from integration.api_GTI import atualizar_status_parallel
 
+# Estado de conexão compartilhado com o webhook (eventos /webhook/connection)
+estado_agentes = EstadoAgentes()
+
+# Instâncias GTI da tabela ROTA (mesmo registro usado pelo webhook e pelo monitor)
+registro_agentes = criar_registro(zapi=False, classe_gti=AgenteGTIAsync)
 
 # ===========================
 # Funções auxiliares
 # ===========================
 async def carregar_agentes():
-    agentes = await carregar_agentes_async_do_banco_async()
-    return agentes
+    """Relê o registro; só as instâncias novas consultam status"""
+    novos, _ = await asyncio.to_thread(registro_agentes.recarregar)
+    if novos:
+        await asyncio.gather(*(ag.async_init() for ag in novos))
+        estado_agentes.registrar_agentes(novos, origem="maturacao")
+        registro_agentes.reindexar()
+    return registro_agentes.todos()
 
 async def verificar_agentes(agentes):
     agentes_conectados = [ag for ag in agentes if ag.conectado]
     print(f"Agentes conectados: {len(agentes_conectados)}")
     return agentes_conectados
 
-async def criar_pares(agentes_conectados, pares_atuais=set()):
-    pares_agentes = [tuple(par) for par in itertools.batched(agentes_conectados, 2) if len(par) == 2]
-    # filtra apenas os pares novos
-    novos_pares = [par for par in pares_agentes if par not in pares_atuais]
+def chave_agente(ag):
+    return ag.token or ag.nome
+
+async def criar_pares(agentes_conectados, ocupados=None):
+    """Pares só entre agentes livres; quem já está em uma conversa não entra em outra"""
+    ocupados = ocupados if ocupados is not None else set()
+    livres = [ag for ag in agentes_conectados if chave_agente(ag) not in ocupados]
+    novos_pares = [tuple(par) for par in itertools.batched(livres, 2) if len(par) == 2]
     print(f"Novos pares de agentes detectados: {len(novos_pares)}")
     return novos_pares
 
@@ -32,46 +47,43 @@ async def criar_pares(agentes_conectados, pares_atuais=set()):
 async def main():
     sem = asyncio.Semaphore(20)
     tarefas = []
-    pares_em_execucao = set()
-
-    agentes = await carregar_agentes()
-    agentes_conectados = await verificar_agentes(agentes)
-    novos_pares = await criar_pares(agentes_conectados, pares_em_execucao)
+    ocupados = set()  # agentes em conversa; saem quando a conversa termina
 
-    # Criar tarefas iniciais
-    for par in novos_pares:
-        async def conversar_com_limite(a1, a2):
+    async def conversar_com_limite(a1, a2, rodadas):
+        try:
             async with sem:
                 try:
-                    await conversar_async(a1, a2, 100, False, get_ia_response_ollama)
+                    await conversar_async(a1, a2, rodadas, False, get_ia_response_ollama)
                 except Exception:
-                    await conversar_async(a1, a2, 100, False, get_ia_response_gemini)
-        tarefa = asyncio.create_task(conversar_com_limite(par[0], par[1]))
-        tarefas.append(tarefa)
-        pares_em_execucao.add(par)
+                    await conversar_async(a1, a2, rodadas, False, get_ia_response_gemini)
+        finally:
+            ocupados.difference_update((chave_agente(a1), chave_agente(a2)))
+
+    def iniciar_conversas(pares, rodadas):
+        tarefas[:] = [t for t in tarefas if not t.done()]
+        for a1, a2 in pares:
+            ocupados.update((chave_agente(a1), chave_agente(a2)))
+            tarefas.append(asyncio.create_task(conversar_com_limite(a1, a2, rodadas)))
+
+    agentes = await carregar_agentes()
+    agentes_conectados = await verificar_agentes(agentes)
+    iniciar_conversas(await criar_pares(agentes_conectados, ocupados), 100)
 
     print("Pressione 'r' para atualizar agentes ou 'q' para parada emergencial...")
 
     # Loop de monitoramento das teclas
     async def monitorar_teclas():
-        nonlocal tarefas, pares_em_execucao
+        ultima_descoberta = time.monotonic()
         while True:
             await asyncio.sleep(0.2)
-            if keyboard.is_pressed('r'):
+            # 'r' força; sem tecla, instâncias novas da ROTA entram a cada INSTANCIAS_ATUALIZAR_SEG
+            if keyboard.is_pressed('r') or time.monotonic() - ultima_descoberta >= INSTANCIAS_ATUALIZAR_SEG:
+                ultima_descoberta = time.monotonic()
                 print("verificando novos agentes")
-                atualizar_status_parallel(agentes)
+                agentes = await carregar_agentes()
+                estado_agentes.aplicar(agentes)
                 agentes_conectados = await verificar_agentes(agentes)
-                novos_pares = await criar_pares(agentes_conectados, pares_em_execucao)
-                for par in novos_pares:
-                    async def conversar_com_limite(a1, a2):
-                        async with sem:
-                            try:
-                                await conversar_async(a1, a2, 5, False, get_ia_response_ollama)
-                            except Exception:
-                                await conversar_async(a1, a2, 5, False, get_ia_response_gemini)
-                    tarefa = asyncio.create_task(conversar_com_limite(par[0], par[1]))
-                    tarefas.append(tarefa)
-                    pares_em_execucao.add(par)
+                iniciar_conversas(await criar_pares(agentes_conectados, ocupados), 5)
             if keyboard.is_pressed("q"):
                 print("\n⏹ Parada emergencial detectada! Cancelando todas as conversas...")
                 for t in tarefas:
@@ -0,0 +1,76 @@
+# test/test_agendador_agentes.py
+
+from concurrent.futures import Future
+
+from integration import agendador_agentes
+from integration.agendador_agentes import AgendadorAgentes
+
+
+class LimitadorFalso:
+    def __init__(self, esperas=None):
+        self.esperas = esperas or {}
+
+    def espera(self, chave):
+        return self.esperas.get(chave, 0)
+
+
+class Agente:
+    def __init__(self, nome, resultado=True):
+        self.nome = nome
+        self.chave_envio = nome
+        self.resultado = resultado
+        self.enviadas = []
+
+    def agendar_mensagem(self, numero, mensagem):
+        self.enviadas.append((numero, mensagem))
+        futuro = Future()
+        futuro.set_result(self.resultado)
+        return futuro
+
+
+def test_menos_carga_escolhe_quem_tem_menos_envios_em_andamento():
+    a, b = Agente("a"), Agente("b")
+    agendador = AgendadorAgentes(limitador=LimitadorFalso())
+    primeiro = agendador.escolher([a, b])
+    segundo = agendador.escolher([a, b])
+    assert {primeiro, segundo} == {a, b}
+
+    agendador.registrar(primeiro, True)
+    assert agendador.escolher([a, b]) is primeiro
+
+
+def test_menos_carga_desempata_pela_espera_no_limitador():
+    a, b = Agente("a"), Agente("b")
+    agendador = AgendadorAgentes(limitador=LimitadorFalso({"a": 5}))
+    assert agendador.escolher([a, b]) is b
+
+
+def test_round_robin_prefere_quem_pode_enviar_agora():
+    a, b = Agente("a"), Agente("b")
+    agendador = AgendadorAgentes("round_robin", limitador=LimitadorFalso({"b": 5}))
+    escolhidos = [agendador.escolher([a, b]).nome for _ in range(6)]
+    assert escolhidos.count("a") == 4 and escolhidos.count("b") == 2
+
+
+def test_falha_pausa_o_agente_com_backoff(monkeypatch):
+    monkeypatch.setattr(agendador_agentes, "AGENDADOR_PAUSA_FALHA", 30)
+    a, b = Agente("a"), Agente("b")
+    agendador = AgendadorAgentes(limitador=LimitadorFalso())
+    agendador.registrar(a, False)
+    assert all(agendador.escolher([a, b]) is b for _ in range(3))
+    assert agendador.estatisticas()["a"]["pausado_seg"] > 25
+
+    agendador.registrar(a, False)
+    assert agendador.estatisticas()["a"]["pausado_seg"] > 55  # 2ª falha seguida dobra a pausa
+    assert agendador.escolher([a]) is None
+
+
+def test_enviar_tenta_outro_agente_quando_falha():
+    ruim, bom = Agente("ruim", resultado=False), Agente("bom")
+    agendador = AgendadorAgentes(limitador=LimitadorFalso({"bom": 1}))
+    assert agendador.enviar([ruim, bom], "5511", "oi") is ruim
+    assert ruim.enviadas == [("5511", "oi")] and bom.enviadas == [("5511", "oi")]
+
+    estatisticas = agendador.estatisticas()
+    assert estatisticas["ruim"]["falhas"] == 1 and estatisticas["bom"]["enviados"] == 1
+    assert estatisticas["bom"]["em_voo"] == 0
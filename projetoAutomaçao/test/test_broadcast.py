@@ -0,0 +1,96 @@
+# test/test_broadcast.py
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from integration.broadcast import CheckpointBroadcast, MotorBroadcast
+
+
+class AgenteFalso:
+    """Agente síncrono: recusa os destinos em `recusar`"""
+
+    def __init__(self, nome, recusar=()):
+        self.nome = nome
+        self.recusar = set(recusar)
+        self.enviados = []
+        self._lock = threading.Lock()
+
+    def agendar_mensagem(self, numero, mensagem):
+        with self._lock:
+            self.enviados.append(numero)
+        futuro = Future()
+        futuro.set_result(None if numero in self.recusar else {"id": numero})
+        return futuro
+
+
+class AgenteAsyncFalso:
+    """Agente assíncrono que mede quantos envios ficaram em voo ao mesmo tempo"""
+
+    def __init__(self):
+        self.nome = "async"
+        self.em_voo = 0
+        self.maximo = 0
+
+    async def enviar_mensagem(self, numero, mensagem):
+        self.em_voo += 1
+        self.maximo = max(self.maximo, self.em_voo)
+        await asyncio.sleep(0.01)
+        self.em_voo -= 1
+        return {"id": numero}
+
+
+def test_retoma_execucao_pulando_o_que_ja_foi_enviado(tmp_path):
+    checkpoint = CheckpointBroadcast(str(tmp_path / "broadcast.db"))
+    motor = MotorBroadcast(workers=4, checkpoint=checkpoint)
+    destinos = [f"55{i}" for i in range(10)]
+
+    instavel = AgenteFalso("instavel", recusar={"553", "557"})
+    primeira = motor.executar(((instavel, d, "oi") for d in destinos), execucao="campanha")
+    assert (primeira["enviados"], primeira["falhas"], primeira["pulados"]) == (8, 2, 0)
+    assert checkpoint.concluidos("campanha") == set(range(10)) - {3, 7}
+
+    estavel = AgenteFalso("estavel")
+    segunda = motor.executar(((estavel, d, "oi") for d in destinos), execucao="campanha")
+    assert (segunda["enviados"], segunda["falhas"], segunda["pulados"]) == (2, 0, 8)
+    assert sorted(estavel.enviados) == ["553", "557"]
+    assert checkpoint.concluidos("campanha") == set(range(10))
+
+
+def test_sem_checkpoint_nao_grava_nada(tmp_path):
+    checkpoint = CheckpointBroadcast(str(tmp_path / "broadcast.db"))
+    motor = MotorBroadcast(workers=2, checkpoint=checkpoint)
+
+    resumo = motor.executar([(AgenteFalso("a"), "5511", "oi")], execucao="avulso", checkpoint=False)
+    assert resumo["enviados"] == 1
+    assert checkpoint.concluidos("avulso") == set()
+
+
+def test_tarefas_sao_lidas_fora_do_loop_e_respeitam_concorrencia(tmp_path):
+    motor = MotorBroadcast(workers=8, checkpoint=CheckpointBroadcast(str(tmp_path / "broadcast.db")))
+    agente = AgenteAsyncFalso()
+    threads = set()
+
+    def tarefas():
+        for i in range(20):
+            threads.add(threading.current_thread().name)
+            yield agente, f"55{i}", "oi"
+
+    resumo = motor.executar(tarefas(), concorrencia=2, checkpoint=False)
+    assert resumo["enviados"] == 20
+    assert "broadcast" not in threads
+    assert agente.maximo <= 2
+
+
+def test_execucoes_sem_id_no_mesmo_segundo_nao_dividem_checkpoint(tmp_path):
+    motor = MotorBroadcast(workers=2, checkpoint=CheckpointBroadcast(str(tmp_path / "broadcast.db")))
+    destinos = ["5511", "5522"]
+
+    primeira = motor.executar([(AgenteFalso("a"), d, "oi") for d in destinos])
+    segunda = motor.executar([(AgenteFalso("b"), d, "oi") for d in destinos])
+
+    assert primeira["execucao"] != segunda["execucao"]
+    assert (segunda["enviados"], segunda["pulados"]) == (2, 0)
+    # O id do resumo retoma a execução
+    retomada = motor.executar([(AgenteFalso("c"), d, "oi") for d in destinos], execucao=primeira["execucao"])
+    assert retomada["pulados"] == 2
@@ -0,0 +1,48 @@
+# test/test_cache_respostas.py
+
+import time
+
+from integration.cache_respostas import CacheRespostas, normalizar
+
+
+def test_ttl_e_lru():
+    cache = CacheRespostas(ttl=0.05, capacidade=2)
+    cache.guardar("a", "resposta a")
+    assert cache.obter("a") == "resposta a"
+    time.sleep(0.06)
+    assert cache.obter("a") is None  # venceu
+    assert cache.estatisticas()["expiradas"] == 1
+
+    cache = CacheRespostas(ttl=60, capacidade=2)
+    cache.guardar("a", "1")
+    cache.guardar("b", "2")
+    cache.obter("a")         # "a" passa a ser o mais recente
+    cache.guardar("c", "3")  # sai "b", o menos usado
+    assert cache.obter("b") is None
+    assert cache.obter("a") == "1" and cache.obter("c") == "3"
+    assert cache.estatisticas()["evictions"] == 1
+
+
+def test_variantes_so_servem_depois_de_juntar_n_respostas():
+    cache = CacheRespostas(ttl=60, variantes=3)
+    for resposta in ("oi", "eae"):
+        cache.guardar("k", resposta)
+    assert cache.obter("k") is None  # só 2 gerações até aqui
+
+    cache.guardar("k", "salve")
+    cache.guardar("k", "depois do limite")  # já completou as 3
+    vistas = {cache.obter("k") for _ in range(200)}
+    assert vistas == {"oi", "eae", "salve"}
+
+
+def test_prompt_deterministico_tambem_enche_as_variantes():
+    cache = CacheRespostas(ttl=60, variantes=3)
+    for _ in range(2):
+        cache.guardar("k", "sempre igual")
+    assert cache.obter("k") is None
+    cache.guardar("k", "sempre igual")
+    assert cache.obter("k") == "sempre igual"
+
+
+def test_normalizar():
+    assert normalizar("  Oi   TUDO\nbem ") == "oi tudo bem"
@@ -0,0 +1,62 @@
+# test/test_cliente_gti.py
+
+import asyncio
+
+import httpx
+
+from integration.cliente_gti import ClienteGTI, criar_sessao_gti
+
+
+def test_um_pool_por_event_loop_reaproveitado_nas_chamadas():
+    cliente = ClienteGTI(http2=False)
+
+    async def pegar_dois():
+        return cliente._cliente(), cliente._cliente()
+
+    a1, a2 = asyncio.run(pegar_dois())
+    b1, _ = asyncio.run(pegar_dois())
+    assert a1 is a2
+    assert b1 is not a1  # outro loop, outro pool
+
+
+def test_fechar_libera_o_pool_e_o_proximo_uso_cria_outro():
+    cliente = ClienteGTI(http2=False)
+
+    async def cenario():
+        primeiro = cliente._cliente()
+        await cliente.fechar()
+        await cliente.fechar()  # fechar de novo não faz nada
+        return primeiro, cliente._cliente()
+
+    primeiro, segundo = asyncio.run(cenario())
+    assert primeiro.is_closed
+    assert segundo is not primeiro and not segundo.is_closed
+
+
+def test_token_vai_por_requisicao_no_pool_compartilhado():
+    cliente = ClienteGTI(base_url="https://gti.teste", http2=False)
+    vistos = []
+
+    def responder(requisicao):
+        vistos.append((requisicao.url.path, requisicao.headers["token"], requisicao.headers["content-type"]))
+        return httpx.Response(200, json={"ok": True})
+
+    async def cenario():
+        pool = cliente._cliente()
+        pool._transport = httpx.MockTransport(responder)
+        await cliente.post("tok-a", "/send/text", json={"number": "5511"})
+        await cliente.get("tok-b", "/instance/status")
+        await cliente.fechar()
+
+    asyncio.run(cenario())
+    assert vistos == [
+        ("/send/text", "tok-a", "application/json"),
+        ("/instance/status", "tok-b", "application/json"),
+    ]
+
+
+def test_sessao_sincrona_compartilhada():
+    sessao = criar_sessao_gti(limite=7)
+    adaptador = sessao.get_adapter("https://api.gtiapi.workers.dev")
+    assert adaptador._pool_maxsize == 7
+    assert sessao.headers["Content-Type"] == "application/json"
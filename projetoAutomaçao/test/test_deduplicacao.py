@@ -0,0 +1,34 @@
+# test/test_deduplicacao.py
+
+import time
+
+from webhook.deduplicacao import JanelaVistos
+
+
+def test_repetido_dentro_da_janela_e_taxa_de_acerto():
+    vistos = JanelaVistos(ttl=60, capacidade=100)
+    assert not vistos.visto("m1")
+    assert vistos.visto("m1")
+    assert not vistos.visto("m2")
+
+    estatisticas = vistos.estatisticas()
+    assert estatisticas["duplicados"] == 1
+    assert estatisticas["taxa_acerto"] == round(1 / 3, 4)
+
+    vistos.esquecer("m2")
+    assert not vistos.visto("m2")
+
+
+def test_validade_e_capacidade():
+    vistos = JanelaVistos(ttl=0.05, capacidade=3)
+    assert not vistos.visto("velho")
+    time.sleep(0.06)
+    assert not vistos.visto("velho")  # venceu, conta como novo
+
+    for i in range(5):
+        vistos.visto(f"m{i}")
+    estatisticas = vistos.estatisticas()
+    assert estatisticas["tamanho"] == 3
+    assert estatisticas["expulsos"] == 3
+    assert not vistos.visto("m0")
+
@@ -0,0 +1,122 @@
+# test/test_envio.py
+
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from integration import envio
+from integration.envio import CircuitBreaker, CircuitoAberto, ErroEnvio, PipelineEnvio, backoff, retry_after
+from integration.fila_envio import FilaEnvio, LimitadorEnvio
+
+
+class Resposta:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_disjuntor_abre_meio_abre_e_fecha():
+    br = CircuitBreaker(limite_falhas=2, reabrir_apos=0.05)
+    assert br.permitir()
+    br.falha()
+    br.falha()
+    assert br.estado == CircuitBreaker.ABERTO and not br.permitir()
+
+    time.sleep(0.06)
+    assert br.permitir()        # envio de teste
+    assert not br.permitir()    # só um por vez no meio-aberto
+    br.falha()
+    assert br.estado == CircuitBreaker.ABERTO
+
+    time.sleep(0.06)
+    assert br.permitir()
+    br.sucesso()
+    assert br.estado == CircuitBreaker.FECHADO and br.permitir()
+
+
+def test_retry_after():
+    assert retry_after(Resposta(429, {"Retry-After": "7"})) == 7
+    assert retry_after(Resposta(429, {"Retry-After": "9999"}), maximo=30) == 30
+    assert retry_after(Resposta(429, {"Retry-After": "-3"})) == 0
+    assert 8 <= retry_after(Resposta(503, {"Retry-After": formatdate(time.time() + 10, usegmt=True)})) <= 10
+    assert retry_after(Resposta(503, {"Retry-After": "amanhã"})) is None
+    assert retry_after(Resposta(503)) is None
+    assert retry_after(None) is None
+
+
+def test_backoff_com_jitter_fica_entre_meio_teto_e_teto():
+    for tentativa, teto in ((1, 1), (2, 2), (3, 4), (10, 30)):
+        esperas = [backoff(tentativa, base=1, maximo=30) for _ in range(200)]
+        assert all(teto / 2 <= e <= teto for e in esperas)
+        assert max(esperas) - min(esperas) > 0
+
+
+def test_pipeline_repete_5xx_e_nao_repete_4xx(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(envio.time, "sleep", esperas.append)
+    pipeline = PipelineEnvio(tentativas=3, base=1, maximo=30)
+
+    respostas = iter([Resposta(503), Resposta(429, {"Retry-After": "2"}), Resposta(200)])
+    assert pipeline.enviar("inst", lambda: next(respostas)).status_code == 200
+    assert len(esperas) == 2 and esperas[1] == 2
+
+    with pytest.raises(ErroEnvio):
+        pipeline.enviar("inst", lambda: Resposta(400))
+    contadores = pipeline.estatisticas()["inst"]
+    assert contadores["retentativas"] == 2 and contadores["falhas"] == 1 and contadores["falhas_seguidas"] == 0
+
+
+def test_erro_inesperado_no_meio_aberto_nao_prende_o_disjuntor():
+    pipeline = PipelineEnvio(tentativas=1)
+    br = pipeline.breaker("inst")
+    br.limite_falhas, br.reabrir_apos = 1, 0.05
+
+    def rede():
+        raise requests.ConnectionError("caiu")
+
+    with pytest.raises(ErroEnvio):
+        pipeline.enviar("inst", rede)
+    time.sleep(0.06)
+
+    def json_quebrado():
+        raise ValueError("resposta ilegível")
+
+    with pytest.raises(ValueError):
+        pipeline.enviar("inst", json_quebrado)  # este era o envio de teste
+    assert br.estado == CircuitBreaker.ABERTO
+    with pytest.raises(CircuitoAberto):
+        pipeline.enviar("inst", lambda: Resposta(200))
+
+    time.sleep(0.06)
+    assert pipeline.enviar("inst", lambda: Resposta(200)).status_code == 200
+    assert br.estado == CircuitBreaker.FECHADO
+
+
+def test_4xx_no_meio_aberto_libera_novo_teste_sem_fechar():
+    pipeline = PipelineEnvio(tentativas=1)
+    br = pipeline.breaker("inst")
+    br.limite_falhas, br.reabrir_apos = 1, 0.0
+    br.falha()
+
+    with pytest.raises(ErroEnvio):
+        pipeline.enviar("inst", lambda: Resposta(404))
+    assert br.estado == CircuitBreaker.MEIO_ABERTO
+    assert br.permitir()
+
+
+def test_retentativa_na_fila_reagenda_sem_dormir_no_worker():
+    pipeline = PipelineEnvio(tentativas=3, base=0.05, maximo=0.05)
+    fila = FilaEnvio(LimitadorEnvio(taxa=0, burst=100, intervalo_min=0), workers=1)
+    respostas = iter([Resposta(502), Resposta(502), Resposta(200)])
+
+    lento = fila.agendar("inst", pipeline.enviar, "inst", lambda: next(respostas))
+    # Com um worker só, este envio passa na frente enquanto o outro espera o backoff
+    rapido = fila.agendar("outra", lambda: "ok")
+
+    assert rapido.result(timeout=1) == "ok"
+    assert not lento.done()
+    assert lento.result(timeout=2).status_code == 200
+    assert pipeline.estatisticas()["inst"]["retentativas"] == 2
+    assert fila.aguardar(timeout=1) and fila.pendentes() == 0
@@ -0,0 +1,63 @@
+# test/test_eventos.py
+
+from webhook.eventos import CHAT_DESCONHECIDO, mesclar_eventos, normalizar
+
+
+def test_mensagem_de_texto():
+    evento = normalizar({
+        "isGroup": False,
+        "message": {
+            "chatid": "5511999999999@s.whatsapp.net",
+            "sender": "5511888888888@s.whatsapp.net",
+            "text": "oi",
+            "messageid": "ABC",
+        },
+    }, "mensagem")
+
+    assert evento.chat_id == "5511999999999@s.whatsapp.net"
+    assert evento.texto == "oi"
+    assert evento.numero == "5511888888888"
+    assert evento.id_mensagem == "ABC"
+    assert not evento.grupo
+
+    junto = evento.com_texto("oi\ntudo bem?")
+    assert junto.texto == "oi\ntudo bem?" and junto.id_mensagem == "ABC"
+    assert evento.texto == "oi"
+
+
+def test_formatos_alternativos_de_mensagem():
+    assert normalizar({"phone": "55119", "text": {"message": "olá"}}, "mensagem").texto == "olá"
+    assert normalizar({"chatName": "grupo", "mensagem": "x", "messageId": 7}, "mensagem").id_mensagem == "7"
+
+    vazio = normalizar(["não é objeto"], "mensagem")
+    assert vazio.chat_id == CHAT_DESCONHECIDO and vazio.texto == "" and vazio.numero is None
+
+
+def test_conexao_e_tipo_sem_extrator():
+    evento = normalizar({"instance": {"status": {"connected": True}, "token": "t", "name": "inst"}}, "conexao")
+    assert (evento.status, evento.token, evento.instancia) == ("CONNECTED", "t", "inst")
+
+    presenca = normalizar({"presence": "composing"}, "presenca")
+    assert presenca.tipo == "presenca" and presenca.dados == {"presence": "composing"}
+
+
+def mensagem(remetente, texto, grupo=True):
+    return normalizar({
+        "isGroup": grupo,
+        "message": {"chatid": "grupo@g.us", "sender": f"{remetente}@s.whatsapp.net", "text": texto},
+    }, "mensagem")
+
+
+def test_mesclar_mantem_quem_falou_quando_ha_mais_de_um_remetente():
+    junto = mesclar_eventos([mensagem("5511", "bora?"), mensagem("5522", "bora"), mensagem("5511", "18h")])
+    assert junto.texto == "5511: bora?\n5522: bora\n5511: 18h"
+    assert junto.numero == "5511"
+
+    sozinho = mesclar_eventos([mensagem("5511", "oi", grupo=False), mensagem("5511", "tudo bem?", grupo=False)])
+    assert sozinho.texto == "oi\ntudo bem?"
+
+
+def test_de_mim_vem_da_mensagem_ou_do_payload():
+    assert normalizar({"message": {"chatid": "c", "text": "x", "fromMe": True}}, "mensagem").de_mim
+    assert normalizar({"phone": "c", "text": "x", "fromMe": True}, "mensagem").de_mim
+    assert not mensagem("5511", "oi").de_mim
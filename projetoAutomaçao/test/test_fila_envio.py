@@ -0,0 +1,96 @@
+# test/test_fila_envio.py
+
+import threading
+import time
+
+from integration.agendador_agentes import AgendadorAgentes
+from integration.fila_envio import FilaEnvio, LimitadorEnvio
+
+
+def test_limitador_rajada_depois_taxa():
+    limitador = LimitadorEnvio(taxa=10, burst=3, intervalo_min=0)
+    atrasos = [limitador.reservar("inst") for _ in range(5)]
+    assert all(a <= 0.01 for a in atrasos[:3])  # a rajada sai na hora
+    assert 0.09 <= atrasos[3] <= 0.11 and 0.19 <= atrasos[4] <= 0.21
+    assert limitador.reservar("outra") <= 0.01  # cada instância tem seu balde
+
+
+def test_limitador_intervalo_minimo_e_espera_sem_reservar():
+    limitador = LimitadorEnvio(taxa=0, burst=10, intervalo_min=0.5)
+    assert limitador.reservar("inst") <= 0.01
+    assert 0.49 <= limitador.espera("inst") <= 0.5
+    assert 0.49 <= limitador.espera("inst") <= 0.5  # espera() não consome a vaga
+    assert 0.49 <= limitador.reservar("inst") <= 0.5
+    assert 0.99 <= limitador.reservar("inst") <= 1.0
+
+
+def test_fila_nao_bloqueia_e_respeita_o_ritmo():
+    fila = FilaEnvio(LimitadorEnvio(taxa=0, burst=10, intervalo_min=0.1), workers=2)
+    horarios = []
+
+    inicio = time.monotonic()
+    futuros = [fila.agendar("inst", lambda i=i: horarios.append((i, time.monotonic())) or i) for i in range(3)]
+    assert time.monotonic() - inicio < 0.05  # agendar() volta na hora
+    assert [f.result(timeout=2) for f in futuros] == [0, 1, 2]
+
+    assert [i for i, _ in horarios] == [0, 1, 2]
+    assert horarios[2][1] - horarios[0][1] >= 0.19
+    assert fila.aguardar(timeout=1) and fila.pendentes() == 0
+
+
+def test_fila_entrega_erro_no_future():
+    fila = FilaEnvio(LimitadorEnvio(taxa=0, burst=10, intervalo_min=0), workers=1)
+
+    def falha():
+        raise RuntimeError("instância fora")
+
+    futuro = fila.agendar("inst", falha)
+    assert isinstance(futuro.exception(timeout=1), RuntimeError)
+    assert fila.aguardar(timeout=1)
+
+
+class AgenteFalso:
+    def __init__(self, nome, fila, resultado):
+        self.nome = nome
+        self.chave_envio = f"falso:{nome}"
+        self.fila = fila
+        self.resultado = resultado
+        self.enviados = []
+
+    def agendar_mensagem(self, numero, mensagem):
+        def enviar():
+            self.enviados.append((numero, mensagem))
+            return self.resultado
+        return self.fila.agendar(self.chave_envio, enviar)
+
+
+def test_agendador_nao_espera_e_repassa_falha_para_outro_agente():
+    limitador = LimitadorEnvio(taxa=0, burst=10, intervalo_min=0)
+    fila = FilaEnvio(limitador, workers=2)
+    agendador = AgendadorAgentes(limitador=limitador)
+    quebrado = AgenteFalso("quebrado", fila, False)
+    ok = AgenteFalso("ok", fila, {"id": 1})
+
+    # O quebrado tem menos carga que o ok, então é o primeiro escolhido
+    agendador._carga(ok).em_voo = 1
+    assert agendador.enviar([quebrado, ok], "5511", "oi") is quebrado
+
+    assert fila.aguardar(timeout=2)
+    limite = time.monotonic() + 2
+    while not ok.enviados and time.monotonic() < limite:
+        time.sleep(0.01)
+        fila.aguardar(timeout=0.1)
+    assert quebrado.enviados == [("5511", "oi")] and ok.enviados == [("5511", "oi")]
+
+    estatisticas = agendador.estatisticas()
+    assert estatisticas["falso:quebrado"]["falhas"] == 1 and estatisticas["falso:quebrado"]["pausado_seg"] > 0
+    assert estatisticas["falso:ok"]["enviados"] == 1
+
+
+def test_fila_so_cria_a_thread_no_primeiro_envio():
+    antes = {t.name for t in threading.enumerate()}
+    fila = FilaEnvio(LimitadorEnvio(taxa=0, burst=10, intervalo_min=0), workers=1)
+    assert "fila-envio" not in {t.name for t in threading.enumerate()} - antes
+
+    assert fila.agendar("inst", lambda: "ok").result(timeout=1) == "ok"
+    assert any(t.name == "fila-envio" for t in threading.enumerate())
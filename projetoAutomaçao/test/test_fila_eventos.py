@@ -0,0 +1,149 @@
+# test/test_fila_eventos.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from webhook.fila_eventos import AgrupadorPorChave, DespachantePorChave, FilaEventos
+
+
+def test_fila_recusa_quando_cheia():
+    liberar = threading.Event()
+    fila = FilaEventos(lambda evento: liberar.wait(5), workers=1, capacidade=2)
+
+    # O primeiro sai da fila e prende o worker; os dois seguintes ocupam a capacidade
+    assert fila.enfileirar("a", 0)
+    time.sleep(0.05)
+    assert fila.enfileirar("a", 1)
+    assert fila.enfileirar("a", 2)
+    assert not fila.enfileirar("a", 3)
+    assert fila.estatisticas()["rejeitados"] == 1
+
+    liberar.set()
+    fila.encerrar(timeout=5)
+    assert fila.estatisticas()["processados"] == 3
+
+
+
+def test_encerrar_respeita_um_prazo_para_todos_os_workers():
+    liberar = threading.Event()
+    fila = FilaEventos(lambda evento: liberar.wait(5), workers=3, capacidade=3)
+    for chave in range(30):
+        fila.enfileirar(chave, chave)  # trava os três workers e enche as filas
+    time.sleep(0.05)
+
+    inicio = time.monotonic()
+    fila.encerrar(timeout=0.3)
+    assert time.monotonic() - inicio < 0.6  # não é 0.3s por fila nem por thread
+    liberar.set()
+
+def test_fila_mantem_ordem_por_chave_e_drena_no_encerramento():
+    vistos = []
+    lock = threading.Lock()
+
+    def processar(evento):
+        time.sleep(0.001)
+        with lock:
+            vistos.append(evento)
+        if evento == ("b", 3):
+            raise ValueError("falha isolada")
+
+    fila = FilaEventos(processar, workers=3, capacidade=300)
+    for i in range(20):
+        for chave in ("a", "b", "c"):
+            assert fila.enfileirar(chave, (chave, i))
+    fila.encerrar(timeout=5)
+
+    for chave in ("a", "b", "c"):
+        assert [i for c, i in vistos if c == chave] == list(range(20))
+    estatisticas = fila.estatisticas()
+    assert estatisticas["processados"] == 60 and estatisticas["erros"] == 1
+    assert estatisticas["profundidade"] == 0
+
+
+def test_mesma_chave_em_ordem_e_sem_sobreposicao():
+    despachante = DespachantePorChave(ThreadPoolExecutor(max_workers=4))
+    ordem, ativos, sobreposicoes = [], set(), []
+    lock = threading.Lock()
+
+    def tarefa(chave, i):
+        with lock:
+            if chave in ativos:
+                sobreposicoes.append((chave, i))
+            ativos.add(chave)
+        time.sleep(0.005)
+        with lock:
+            ativos.discard(chave)
+            ordem.append((chave, i))
+        return i
+
+    futuros = [despachante.submeter(c, tarefa, c, i) for i in range(10) for c in ("a", "b")]
+    assert [f.result(timeout=5) for f in futuros] == [i for i in range(10) for _ in ("a", "b")]
+    assert despachante.aguardar(timeout=5)
+
+    assert not sobreposicoes
+    assert [i for c, i in ordem if c == "a"] == list(range(10))
+    assert [i for c, i in ordem if c == "b"] == list(range(10))
+    assert despachante.estatisticas()["raias_ativas"] == 0
+
+
+def test_chaves_diferentes_em_paralelo_e_erro_nao_trava_a_raia():
+    despachante = DespachantePorChave(ThreadPoolExecutor(max_workers=2))
+    barreira = threading.Barrier(2, timeout=2)
+
+    def falha():
+        raise ValueError("x")
+
+    a = despachante.submeter("a", barreira.wait)
+    b = despachante.submeter("b", barreira.wait)
+    erro = despachante.submeter("a", falha)
+    depois = despachante.submeter("a", lambda: "ok")
+
+    # Só passam da barreira se as duas raias rodarem ao mesmo tempo
+    a.result(timeout=5)
+    b.result(timeout=5)
+    assert isinstance(erro.exception(timeout=5), ValueError)
+    assert depois.result(timeout=5) == "ok"
+    assert despachante.estatisticas()["erros"] == 1
+
+
+def test_agrupador_junta_rajada_e_respeita_espera_max():
+    liberados = []
+    agrupador = AgrupadorPorChave(lambda chave, itens: liberados.append((chave, itens)), janela=0.1, espera_max=0.3)
+
+    for i in range(3):
+        agrupador.adicionar("a", i)
+    agrupador.adicionar("b", "x")
+    time.sleep(0.25)
+    assert sorted(liberados) == [("a", [0, 1, 2]), ("b", ["x"])]
+
+    # Rajada contínua: o grupo sai pela espera máxima, não espera a rajada acabar
+    liberados.clear()
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < 0.5:
+        agrupador.adicionar("c", 1)
+        time.sleep(0.02)
+    assert liberados and liberados[0][0] == "c"
+    assert agrupador.estatisticas()["por_espera_max"] >= 1
+
+    agrupador.liberar_tudo()
+    assert agrupador.estatisticas()["grupos_abertos"] == 0
+
+
+def test_pendentes_do_agrupador_e_das_raias():
+    liberar = threading.Event()
+    despachante = DespachantePorChave(ThreadPoolExecutor(max_workers=2))
+    agrupador = AgrupadorPorChave(
+        lambda chave, itens: despachante.submeter(chave, liberar.wait, 5), janela=0.05, espera_max=0.1
+    )
+
+    for chave in ("a", "a", "b"):
+        agrupador.adicionar(chave, chave)
+    assert agrupador.pendentes() == 3 and despachante.pendentes() == 0
+
+    time.sleep(0.2)  # grupos liberados: um item por chat nas raias, presos no wait
+    assert agrupador.pendentes() == 0 and despachante.pendentes() == 2
+
+    liberar.set()
+    assert despachante.aguardar(timeout=5)
+    assert despachante.pendentes() == 0
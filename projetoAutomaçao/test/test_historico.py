@@ -0,0 +1,65 @@
+# test/test_historico.py
+
+import json
+
+from banco.historico import HistoricoSQLite, migrar_json
+
+
+def test_sqlite_anexa_e_le_ultimas(tmp_path):
+    store = HistoricoSQLite(str(tmp_path / "historicos.db"))
+    for i in range(10):
+        store.anexar("chat1", {"role": "user", "content": f"msg {i}"})
+    store.anexar("chat2", {"role": "user", "content": "outro chat"})
+
+    ultimas = store.ultimos("chat1", 3)
+    assert [m["content"] for m in ultimas] == ["msg 7", "msg 8", "msg 9"]
+    assert len(store.ultimos("chat1")) == 10
+    assert sorted(store.chats()) == ["chat1", "chat2"]
+
+
+def test_sqlite_compactacao_mantem_ultimas(tmp_path):
+    store = HistoricoSQLite(str(tmp_path / "historicos.db"), manter=4)
+    for i in range(10):
+        store.anexar("chat1", {"role": "user", "content": f"msg {i}"})
+
+    store.compactar()
+    assert [m["content"] for m in store.ultimos("chat1")] == ["msg 6", "msg 7", "msg 8", "msg 9"]
+
+
+def test_migracao_json(tmp_path):
+    pasta = tmp_path / "historicos"
+    pasta.mkdir()
+    historico = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "eae"}]
+    (pasta / "5511999999999.json").write_text(json.dumps(historico), encoding="utf-8")
+
+    destino = HistoricoSQLite(str(tmp_path / "historicos.db"))
+    assert migrar_json(str(pasta), destino) == (1, 2)
+    assert destino.ultimos("5511999999999") == historico
+    assert destino.obter_resumo("5511999999999") == ""  # tudo cabe na janela
+
+    # Rodar de novo não duplica; chats novos da pasta entram
+    (pasta / "outro.json").write_text(json.dumps(historico[:1]), encoding="utf-8")
+    assert migrar_json(str(pasta), destino) == (1, 1)
+    assert destino.ultimos("5511999999999") == historico
+    assert destino.ultimos("outro") == historico[:1]
+
+
+def test_migracao_json_monta_resumo_do_que_saiu_da_janela(tmp_path):
+    pasta = tmp_path / "historicos"
+    pasta.mkdir()
+    falas = ["oi", "eae", "bora sair hoje?", "bora", "onde?", "no bar"]
+    historico = [{"role": "user", "content": fala} for fala in falas]
+    (pasta / "chat.json").write_text(json.dumps(historico), encoding="utf-8")
+
+    destino = HistoricoSQLite(str(tmp_path / "historicos.db"))
+    migrar_json(str(pasta), destino)
+    assert destino.obter_resumo("chat") == "oi eae bora sair hoje?"
+
+
+def test_resumo_guardado_junto_da_conversa(tmp_path):
+    store = HistoricoSQLite(str(tmp_path / "historicos.db"))
+    assert store.obter_resumo("chat1") == ""
+
+    store.salvar_resumo("chat1", "oi tudo bem")
+    store.salvar_resumo("chat1", "oi tudo bem bora sair")
+    assert store.obter_resumo("chat1") == "oi tudo bem bora sair"
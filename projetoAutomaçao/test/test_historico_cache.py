@@ -0,0 +1,109 @@
+# test/test_historico_cache.py
+
+import threading
+import time
+
+from banco.historico import HistoricoSQLite
+from banco.historico_cache import HistoricoCache
+
+
+def msg(texto):
+    return {"role": "user", "content": texto}
+
+
+def textos(mensagens):
+    return [m["content"] for m in mensagens]
+
+
+def criar(tmp_path, **kwargs):
+    backend = HistoricoSQLite(str(tmp_path / "historicos.db"))
+    # Flush só quando o teste pede
+    return backend, HistoricoCache(backend, intervalo=60, **kwargs)
+
+
+def test_write_behind_grava_em_lote_no_flush(tmp_path):
+    backend, cache = criar(tmp_path, janela=3)
+    for i in range(5):
+        cache.anexar("a", msg(f"m{i}"))
+    cache.salvar_resumo("a", "resumo")
+
+    assert backend.ultimos("a") == [] and backend.obter_resumo("a") == ""
+    assert textos(cache.ultimos("a", 3)) == ["m2", "m3", "m4"]  # miss: backend vazio + pendentes
+    assert textos(cache.ultimos("a")) == [f"m{i}" for i in range(5)]  # fora da janela, sem flush
+    assert cache.obter_resumo("a") == "resumo"
+
+    assert cache.flush() == 5
+    assert textos(backend.ultimos("a")) == [f"m{i}" for i in range(5)]
+    assert backend.obter_resumo("a") == "resumo"
+    assert cache.estatisticas()["pendentes"] == 0
+    cache.fechar()
+
+
+def test_eviction_mantem_pendencias_ate_o_flush(tmp_path):
+    backend, cache = criar(tmp_path, janela=5, capacidade=1)
+    cache.ultimos("a", 5)
+    cache.anexar("a", msg("pendente"))
+    cache.ultimos("b", 5)  # "a" sai do cache com a mensagem ainda não gravada
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas["evictions"] == 1 and estatisticas["chats_em_cache"] == 1
+    assert textos(cache.ultimos("a", 5)) == ["pendente"]
+    cache.flush()
+    assert textos(cache.ultimos("a", 5)) == ["pendente"]  # sem duplicar depois do flush
+    assert estatisticas["misses"] == 2
+    cache.fechar()
+
+
+class BackendLento(HistoricoSQLite):
+    """anexar_lote demora, para o flush ficar no meio da gravação"""
+
+    def anexar_lote(self, chat_id, mensagens):
+        time.sleep(0.1)
+        super().anexar_lote(chat_id, mensagens)
+
+
+def test_miss_com_trava_do_chat_nao_trava_com_flush_concorrente(tmp_path):
+    backend = BackendLento(str(tmp_path / "historicos.db"))
+    cache = HistoricoCache(backend, janela=5, capacidade=1, intervalo=60)
+    cache.ultimos("a", 5)
+    cache.anexar("a", msg("pendente"))
+    cache.ultimos("b", 5)  # "a" despejado com pendência
+
+    lido = []
+
+    def worker():
+        # Como registrar_historico: trava do chat e depois leitura (miss)
+        with cache.trava("a"):
+            time.sleep(0.05)  # o flush começa enquanto a trava está com o worker
+            lido.extend(cache.ultimos("a", 5))
+            cache.anexar("a", msg("nova"))
+
+    t_worker = threading.Thread(target=worker, daemon=True)
+    t_flush = threading.Thread(target=cache.flush, daemon=True)
+    t_worker.start()
+    time.sleep(0.01)
+    t_flush.start()
+    t_worker.join(3)
+    t_flush.join(3)
+
+    assert not t_worker.is_alive() and not t_flush.is_alive()
+    assert textos(lido) == ["pendente"]
+    cache.flush()
+    assert textos(backend.ultimos("a")) == ["pendente", "nova"]
+    cache.fechar()
+
+
+def test_flush_concorrente_nao_perde_nem_duplica(tmp_path):
+    backend = BackendLento(str(tmp_path / "historicos.db"))
+    cache = HistoricoCache(backend, janela=50, capacidade=1, intervalo=60)
+    for i in range(10):
+        cache.anexar("a", msg(f"m{i}"))
+
+    t_flush = threading.Thread(target=cache.flush, daemon=True)
+    t_flush.start()
+    time.sleep(0.02)  # gravação em andamento
+    cache.ultimos("b", 5)
+    assert textos(cache.ultimos("a", 50)) == [f"m{i}" for i in range(10)]
+    t_flush.join(3)
+    assert textos(backend.ultimos("a")) == [f"m{i}" for i in range(10)]
+    cache.fechar()
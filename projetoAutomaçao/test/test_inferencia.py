@@ -0,0 +1,106 @@
+# test/test_inferencia.py
+
+import threading
+import time
+
+import pytest
+
+from integration.inferencia import ServicoInferencia
+
+
+def test_pedidos_iguais_coalescem_no_lider():
+    servico = ServicoInferencia("teste", concorrencia=4)
+    liberar = threading.Event()
+    chamadas = []
+
+    def gerar():
+        chamadas.append(1)
+        liberar.wait(5)
+        return "resposta"
+
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(servico.executar("k", gerar))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    liberar.set()
+    for t in threads:
+        t.join(5)
+
+    assert resultados == ["resposta"] * 5
+    assert len(chamadas) == 1
+    estatisticas = servico.estatisticas()
+    assert estatisticas["chamadas"] == 1 and estatisticas["coalescidas"] == 4
+
+
+def test_semaforo_limita_geracoes_simultaneas():
+    servico = ServicoInferencia("teste", concorrencia=2)
+    ativos, pico = [0], [0]
+    lock = threading.Lock()
+
+    def gerar():
+        with lock:
+            ativos[0] += 1
+            pico[0] = max(pico[0], ativos[0])
+        time.sleep(0.05)
+        with lock:
+            ativos[0] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=servico.executar, args=(f"k{i}", gerar)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert pico[0] == 2
+    assert servico.estatisticas()["chamadas"] == 6
+
+
+def test_lider_interrompido_libera_quem_espera():
+    servico = ServicoInferencia("teste")
+    entrou = threading.Event()
+    liberar = threading.Event()
+    erros = []
+
+    def gerar():
+        entrou.set()
+        liberar.wait(5)
+        raise KeyboardInterrupt
+
+    def lider():
+        try:
+            servico.executar("k", gerar)
+        except KeyboardInterrupt:
+            pass
+
+    def seguidor():
+        try:
+            servico.executar("k", lambda: "nunca")
+        except RuntimeError as e:
+            erros.append(e)
+
+    t_lider = threading.Thread(target=lider)
+    t_lider.start()
+    entrou.wait(5)
+    t_seguidor = threading.Thread(target=seguidor)
+    t_seguidor.start()
+    time.sleep(0.05)
+    liberar.set()
+    t_lider.join(5)
+    t_seguidor.join(5)
+
+    assert not t_seguidor.is_alive() and len(erros) == 1
+    # A chave saiu do mapa: o próximo pedido gera de novo
+    assert servico.executar("k", lambda: "de novo") == "de novo"
+
+
+def test_erro_do_lider_propaga_e_conta():
+    servico = ServicoInferencia("teste")
+
+    def falha():
+        raise ValueError("modelo fora")
+
+    with pytest.raises(ValueError):
+        servico.executar("k", falha)
+    assert servico.estatisticas()["erros"] == 1
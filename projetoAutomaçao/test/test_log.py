@@ -0,0 +1,48 @@
+# test/test_log.py
+
+import json
+import logging
+
+from until.log import FiltroAmostragem, FormatadorJSON, FormatadorTexto, Preguicoso, json_bonito
+
+
+def registro(nivel=logging.INFO, msg="oi %s", args=("mundo",), **extra):
+    rec = logging.LogRecord("webhook", nivel, __file__, 1, msg, args, None)
+    rec.__dict__.update(extra)
+    return rec
+
+
+def test_preguicoso_so_formata_quando_escrito():
+    chamadas = []
+    valor = Preguicoso(lambda x: chamadas.append(x) or f"<{x}>", 1)
+    assert chamadas == []
+    assert str(valor) == "<1>" and chamadas == [1]
+    assert str(json_bonito({"a": "é"})) == '{\n  "a": "é"\n}'
+
+
+def test_preguicoso_nao_formata_se_o_nivel_estiver_desligado():
+    log = logging.getLogger("teste.preguicoso")
+    log.setLevel(logging.WARNING)
+    chamadas = []
+    log.debug("payload %s", Preguicoso(chamadas.append, "x"))
+    assert chamadas == []
+
+
+def test_amostragem_deixa_passar_um_em_n_e_todos_os_avisos():
+    filtro = FiltroAmostragem(3)
+    passaram = [filtro.filter(registro()) for _ in range(6)]
+    assert passaram == [True, False, False, True, False, False]
+    assert filtro.descartados == 4
+    assert all(filtro.filter(registro(logging.WARNING)) for _ in range(3))
+
+
+def test_formatador_json_inclui_campos_e_amostragem():
+    dados = json.loads(FormatadorJSON().format(registro(campos={"chat": "5511"}, amostragem=10)))
+    assert dados["msg"] == "oi mundo" and dados["nivel"] == "INFO"
+    assert dados["logger"] == "webhook"
+    assert dados["chat"] == "5511" and dados["amostragem"] == 10
+
+
+def test_formatador_texto_acrescenta_campos():
+    texto = FormatadorTexto().format(registro(campos={"chat": "5511", "ms": 3}))
+    assert texto.endswith("INFO [webhook] oi mundo chat=5511 ms=3")
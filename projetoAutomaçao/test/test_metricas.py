@@ -0,0 +1,62 @@
+# test/test_metricas.py
+
+from flask import Flask
+
+from until.metricas import Histograma, RegistroMetricas, instrumentar_flask
+
+
+def test_histograma_cumulativo_e_percentis():
+    hist = Histograma(buckets=(0.1, 1))
+    for valor in (0.05, 0.1, 0.5, 5):
+        hist.observar(valor)
+    assert hist.cumulativo() == [(0.1, 2), (1, 3), (float("inf"), 4)]
+    assert hist.percentil(50) == 0.1
+    assert hist.percentil(99) == 1  # +Inf vira o maior bucket
+    assert Histograma().percentil(50) == 0.0
+
+
+def test_exportar_no_formato_do_prometheus():
+    registro = RegistroMetricas()
+    envios = registro.contador("envios_total", "Envios", ("agente",))
+    envios.inc(agente='a"b')
+    envios.inc(2, agente='a"b')
+    registro.coletor("fila", "gauge", "Itens na fila", lambda: 3)
+    registro.histograma("lat", "Latência", buckets=(1,)).observar(0.5)
+
+    linhas = registro.exportar().splitlines()
+    assert "# TYPE envios_total counter" in linhas
+    assert 'envios_total{agente="a\\"b"} 3' in linhas
+    assert "fila 3" in linhas
+    assert 'lat_bucket{le="1"} 1' in linhas
+    assert 'lat_bucket{le="+Inf"} 1' in linhas
+    assert "lat_sum 0.5" in linhas and "lat_count 1" in linhas
+
+
+def test_coletor_com_erro_nao_derruba_a_exportacao():
+    registro = RegistroMetricas()
+    registro.coletor("quebrado", "gauge", "Falha", lambda: 1 / 0)
+    registro.coletor("ok", "gauge", "Ok", lambda: {("x",): 1}, rotulos=("nome",))
+    texto = registro.exportar()
+    assert "# erro ao coletar quebrado" in texto
+    assert 'ok{nome="x"} 1' in texto
+
+
+def test_instrumentar_flask_usa_o_padrao_da_rota():
+    app = Flask(__name__)
+
+    @app.route("/chat/<numero>")
+    def chat(numero):
+        return numero
+
+    instrumentar_flask(app, RegistroMetricas())
+    cliente = app.test_client()
+    cliente.get("/chat/5511")
+    cliente.get("/chat/5522")
+    cliente.get("/nao-existe")
+
+    resposta = cliente.get("/metrics")
+    assert resposta.mimetype == "text/plain"
+    texto = resposta.get_data(as_text=True)
+    assert 'http_requests_total{rota="/chat/<numero>",metodo="GET",status="200"} 2' in texto
+    assert 'http_requests_total{rota="nao_encontrada",metodo="GET",status="404"} 1' in texto
+    assert "5511" not in texto
@@ -0,0 +1,148 @@
+# test/test_monitor_instancias.py
+
+import asyncio
+import threading
+import time
+
+from webhook.monitor_instancias import MonitorInstancias, NotificadorAlertas
+
+
+class SessaoFalsa:
+    def __init__(self, falhar=False):
+        self.corpos = []
+        self.falhar = falhar
+
+    def post(self, url, json=None, timeout=None):
+        if self.falhar:
+            raise ConnectionError("receptor fora")
+        self.corpos.append(json)
+        return RespostaFalsa({})
+
+
+class RespostaFalsa:
+    def __init__(self, dados):
+        self.dados = dados
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.dados
+
+
+def aguardar(condicao, timeout=2):
+    limite = time.monotonic() + timeout
+    while not condicao() and time.monotonic() < limite:
+        time.sleep(0.01)
+    return condicao()
+
+
+def test_notificador_mantem_um_post_por_alerta_por_padrao():
+    notificador = NotificadorAlertas("http://alertas", intervalo=0.05)
+    notificador._sessao = sessao = SessaoFalsa()
+    notificador.enviar("inst1", False)
+    notificador.enviar("inst2", True)
+
+    assert aguardar(lambda: notificador.enviados == 2)
+    assert [(c["instance"], c["status"]) for c in sessao.corpos] == [("inst1", "desconectada"), ("inst2", "conectada")]
+
+
+def test_notificador_em_lote_junta_alertas_e_conta_falhas():
+    notificador = NotificadorAlertas("http://alertas", intervalo=0.1, lote_max=10, em_lote=True)
+    notificador._sessao = sessao = SessaoFalsa()
+    for i in range(3):
+        notificador.enviar(f"inst{i}", False)
+
+    assert aguardar(lambda: notificador.enviados == 3)
+    assert len(sessao.corpos) == 1 and len(sessao.corpos[0]["alertas"]) == 3
+
+    sessao.falhar = True
+    notificador.enviar("inst9", True)
+    assert aguardar(lambda: notificador.falhas == 1)
+    assert notificador.estatisticas()["pendentes"] == 0
+
+
+class ClienteFalso:
+    def __init__(self):
+        self.conectado = True
+
+    async def get(self, url, headers=None):
+        return RespostaFalsa({"connected": self.conectado})
+
+
+def test_monitor_espaca_consultas_estaveis_e_volta_ao_base_na_mudanca():
+    mudancas = []
+    monitor = MonitorInstancias(
+        [{"name": "a", "id": "i", "token": "t"}], ao_mudar=lambda inst, s, ant: mudancas.append((s, ant)),
+        intervalo=1, intervalo_max=3
+    )
+    cliente = ClienteFalso()
+
+    async def cenario():
+        monitor._loop = asyncio.get_running_loop()
+        monitor._acordar = asyncio.Event()
+        intervalos = []
+        for _ in range(5):
+            await monitor._verificar(cliente, "a")
+            intervalos.append(monitor.estado()["a"]["intervalo_seg"])
+        cliente.conectado = False
+        await monitor._verificar(cliente, "a")
+        intervalos.append(monitor.estado()["a"]["intervalo_seg"])
+        ultimo = max(monitor._heap, key=lambda item: item[1])
+        return intervalos, ultimo[0] - monitor._loop.time()
+
+    intervalos, proxima = asyncio.run(cenario())
+    assert intervalos == [1.0, 1.5, 2.2, 3.0, 3.0, 1.0]
+    assert 0.7 <= proxima <= 1.2  # intervalo base com jitter de ±20%
+    assert mudancas == [(True, None), (False, True)]
+    assert monitor.estado()["a"]["mudancas"] == 1
+
+
+class ClienteContador(ClienteFalso):
+    def __init__(self):
+        super().__init__()
+        self.consultas = 0
+
+    async def get(self, url, headers=None):
+        self.consultas += 1
+        return await super().get(url, headers)
+
+
+def test_monitor_usa_estado_compartilhado_e_so_consulta_sem_estado():
+    tabela = {"gti-ok": True}
+    gravados = []
+    monitor = MonitorInstancias(
+        [{"tipo": "gti", "name": "gti-ok", "token": "t1"}, {"tipo": "gti", "name": "gti-novo", "token": "t2"}],
+        ler_estado=lambda inst: tabela.get(inst["name"]),
+        gravar_estado=lambda inst, status: gravados.append((inst["name"], status)),
+    )
+    cliente = ClienteContador()
+
+    async def cenario():
+        monitor._loop = asyncio.get_running_loop()
+        monitor._acordar = asyncio.Event()
+        await monitor._verificar(cliente, "gti-ok")
+        assert cliente.consultas == 0
+        await monitor._verificar(cliente, "gti-novo")
+        assert cliente.consultas == 1
+
+    asyncio.run(cenario())
+    assert gravados == [("gti-novo", False)]  # resposta GTI sem "status" conta como desconectada
+    assert monitor.estado()["gti-ok"]["conectado"] is True
+
+
+def test_ao_verificar_roda_fora_do_loop():
+    threads = []
+    monitor = MonitorInstancias(
+        [{"name": "a", "id": "i", "token": "t"}],
+        ao_verificar=lambda inst, status: threads.append(threading.current_thread()),
+    )
+
+    async def cenario():
+        monitor._loop = asyncio.get_running_loop()
+        monitor._acordar = asyncio.Event()
+        await monitor._verificar(ClienteFalso(), "a")
+        return threading.current_thread()
+
+    thread_do_loop = asyncio.run(cenario())
+    assert len(threads) == 1 and threads[0] is not thread_do_loop
@@ -0,0 +1,66 @@
+# test/test_registro_agentes.py
+
+from integration.registro_agentes import RegistroAgentes
+
+
+class Agente:
+    def __init__(self, nome, token, numero=None, conectado=True):
+        self.nome = nome
+        self.token = token
+        self.numero = numero
+        self.conectado = conectado
+
+
+def test_indexa_conectados_por_numero_nome_e_token():
+    a = Agente("ana", "t1", "5511")
+    b = Agente("bia", "t2", "5522", conectado=False)
+    registro = RegistroAgentes([a, b])
+
+    assert registro.por_numero("5511") is a and registro.por_numero(5511) is a
+    assert registro.por_nome("ana") is a
+    assert registro.por_numero("5522") is None and registro.por_nome("bia") is None
+    assert registro.por_token("t2") is b
+    assert registro.conectados() == (a,) and len(registro) == 1
+
+
+def test_evento_de_conexao_atualiza_o_indice():
+    a = Agente("ana", "t1", "5511", conectado=False)
+    registro = RegistroAgentes([a])
+
+    assert registro.evento_conexao(True, nome="ana", numero="5599") is a
+    assert registro.por_numero("5599") is a and registro.por_nome("ana") is a
+
+    registro.evento_conexao(False, token="t1")
+    assert registro.por_numero("5599") is None and registro.conectados() == ()
+    assert registro.evento_conexao(True, token="desconhecido") is None
+
+
+def test_numero_novo_remove_o_antigo():
+    a = Agente("ana", "t1", "5511")
+    registro = RegistroAgentes([a])
+    registro.evento_conexao(True, token="t1", numero="5533")
+    assert registro.por_numero("5511") is None
+    assert registro.por_numero("5533") is a
+
+
+def test_recarregar_sincroniza_e_mantem_fonte_que_falhou():
+    a, b = Agente("ana", "t1", "5511"), Agente("bia", "t2", "5522")
+    lidos = {"env": [a], "rota": [b]}
+
+    def rota():
+        if lidos["rota"] is None:
+            raise ConnectionError("banco fora")
+        return lidos["rota"]
+
+    registro = RegistroAgentes(fontes={"env": lambda: lidos["env"], "rota": rota})
+    avisos = []
+    registro.ao_atualizar(lambda novos, removidos: avisos.append((novos, removidos)))
+
+    assert registro.recarregar() == ([a, b], [])
+    lidos["rota"] = None  # fonte fora: bia continua
+    assert registro.recarregar() == ([], [])
+    lidos["env"] = []
+    assert registro.recarregar() == ([], [a])
+    assert registro.por_token("t1") is None and registro.por_numero("5511") is None
+    assert registro.por_numero("5522") is b
+    assert avisos == [([a, b], []), ([], [a])]
@@ -0,0 +1,39 @@
+# test/test_resumo.py
+
+import os
+
+from integration.resumo import JANELA_IA, RESUMO_MAX, resumir_incremental, resumo_do_historico
+
+os.environ.setdefault("GEMINI_API_KEY", "teste")  # o cliente Gemini é criado na importação de integration.IA
+from integration.IA import janela_com_resumo  # noqa: E402
+
+
+def falas(*textos):
+    return [{"role": "user", "content": t} for t in textos]
+
+
+def test_resumo_incremental_mantem_o_mais_recente_sem_cortar_palavra():
+    resumo = ""
+    for i in range(100):
+        resumo = resumir_incremental(resumo, f"palavra{i}")
+    assert len(resumo) <= RESUMO_MAX
+    assert resumo.endswith("palavra99")
+    assert resumo.split()[0].startswith("palavra")  # começa numa palavra inteira
+
+
+def test_resumo_do_historico_ignora_a_janela():
+    mensagens = falas("a", "b", "c", "d", "e")
+    assert resumo_do_historico(mensagens, janela=3) == "a b"
+    assert resumo_do_historico(mensagens, janela=3, resumo="antes") == "antes a b"
+    assert resumo_do_historico(falas("a"), janela=3) == ""
+
+
+def test_janela_sem_resumo_salvo_usa_a_mesma_regra():
+    mensagens = falas(*(f"fala numero {i}" for i in range(40)))
+    janela = janela_com_resumo(mensagens)
+    assert janela[1:] == mensagens[-JANELA_IA:]
+    assert janela[0]["content"] == f"Resumo: {resumo_do_historico(mensagens)}..."
+
+    # Com resumo salvo ele é usado como está
+    assert janela_com_resumo(mensagens, "salvo")[0]["content"] == "Resumo: salvo..."
+    assert janela_com_resumo(falas("oi")) == falas("oi")
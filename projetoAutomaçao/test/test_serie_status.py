@@ -0,0 +1,48 @@
+# test/test_serie_status.py
+
+from banco.serie_status import SerieStatus, janela_em_segundos
+
+
+def test_amostras_iguais_viram_um_periodo(tmp_path):
+    serie = SerieStatus(str(tmp_path / "serie.db"), lacuna=30)
+    for i in range(0, 600, 5):
+        serie.registrar("inst", True, 1000 + i)
+    assert serie.flush() == 1  # só o fim do período aberto vai para o disco
+    assert serie.flush() == 0
+
+    # Outro processo lendo o mesmo arquivo vê um período contínuo, sem transições
+    resumo = SerieStatus(str(tmp_path / "serie.db"), lacuna=30).resumo(600, agora=1595)["inst"]
+    assert resumo["observado_seg"] == 595
+    assert resumo["mudancas"] == 0
+    assert resumo["uptime_pct"] == 100.0
+
+
+def test_uptime_quedas_e_desconexoes(tmp_path):
+    serie = SerieStatus(str(tmp_path / "serie.db"), lacuna=30)
+    # conectada 0-100, desconectada 100-160, conectada de novo até 300
+    for t in range(0, 301, 5):
+        serie.registrar("inst", not (100 <= t < 160), 1000 + t)
+
+    resumo = serie.resumo(300, agora=1300)["inst"]
+    assert resumo["quedas"] == 1
+    assert resumo["mudancas"] == 2
+    assert resumo["desconectado_seg"] == 60
+    assert resumo["uptime_pct"] == 80.0
+    assert serie.desconexoes("inst", 300, agora=1300) == [{"inicio": 1095, "fim": 1155, "duracao_seg": 60}]
+
+
+def test_lacuna_nao_conta_como_transicao(tmp_path):
+    serie = SerieStatus(str(tmp_path / "serie.db"), lacuna=30)
+    serie.registrar("inst", True, 1000)
+    serie.registrar("inst", False, 2000)  # monitor parado por ~17min
+
+    resumo = serie.resumo(1500, agora=2000)["inst"]
+    assert resumo["quedas"] == 0
+    assert resumo["observado_seg"] == 0
+
+
+def test_janela_em_segundos():
+    assert janela_em_segundos("90") == 90
+    assert janela_em_segundos("30m") == 1800
+    assert janela_em_segundos("7d") == 7 * 86400
+    assert janela_em_segundos(None) == 86400
@@ -0,0 +1,82 @@
+# test/test_stream.py
+
+import os
+
+import pytest
+
+from integration.cache_respostas import CacheRespostas
+
+os.environ.setdefault("GEMINI_API_KEY", "teste")  # o cliente Gemini é criado na importação de integration.IA
+from integration import IA  # noqa: E402
+
+
+class StreamFalso:
+    def __init__(self, pedacos):
+        self.pedacos = pedacos
+        self.lidos = 0
+        self.fechado = False
+
+    def __iter__(self):
+        for pedaco in self.pedacos:
+            self.lidos += 1
+            yield {"message": {"content": pedaco}}
+
+    def close(self):
+        self.fechado = True
+
+
+def texto(parte):
+    return parte["message"]["content"]
+
+
+def test_consumir_stream_corta_na_frase_e_fecha_o_stream():
+    stream = StreamFalso(["Oi, tudo certo por aqui. ", "Isso não ", "devia ser lido"])
+    resposta, completo = IA.consumir_stream(stream, texto, "ollama")
+    assert resposta == "Oi, tudo certo por aqui."
+    assert not completo
+    assert stream.lidos == 1
+    assert stream.fechado
+
+
+def test_consumir_stream_ate_o_fim_e_resposta_completa():
+    stream = StreamFalso(["Oi", " tudo bem"])
+    assert IA.consumir_stream(stream, texto, "ollama") == ("Oi tudo bem", True)
+    assert stream.fechado
+
+
+def test_chave_do_stream_nao_colide_com_a_resposta_completa():
+    mensagens = [{"role": "user", "content": "oi"}]
+    completa = IA.chave_cache("modelo", mensagens)
+    assert completa != IA.chave_cache("modelo", mensagens, "stream:120")
+    assert IA.chave_cache("modelo", mensagens, "stream:120") != IA.chave_cache("modelo", mensagens, "stream:60")
+
+
+def test_resposta_cortada_nao_vai_para_o_cache(monkeypatch):
+    cache = CacheRespostas(ttl=60)
+    monkeypatch.setattr(IA.ollama, "chat", lambda **_: StreamFalso(["Primeira frase inteira. ", "resto"]))
+    assert IA.get_ia_response_ollama_stream("oi", cache=cache) == "Primeira frase inteira."
+    assert cache.estatisticas()["entradas"] == 0
+
+    monkeypatch.setattr(IA.ollama, "chat", lambda **_: StreamFalso(["curta"]))
+    assert IA.get_ia_response_ollama_stream("eae", cache=cache) == "curta"
+    assert cache.estatisticas()["entradas"] == 1
+
+
+def test_ponto_de_corte():
+    assert IA.ponto_de_corte("Oi!") is None  # curta demais para ser uma resposta
+    assert IA.ponto_de_corte("Tudo certo por aqui, e você? Eu") == len("Tudo certo por aqui, e você?")
+    assert IA.ponto_de_corte("palavra " * 5, limite=60) is None  # sem fim de frase nem limite
+    corte = IA.ponto_de_corte("palavra " * 5, limite=20, minimo=5)
+    assert corte == len("palavra palavra")  # recua até o último espaço
+
+
+def test_stream_fecha_mesmo_com_erro_no_meio():
+    class StreamQuebrado(StreamFalso):
+        def __iter__(self):
+            yield {"message": {"content": "começo"}}
+            raise ConnectionError("caiu")
+
+    stream = StreamQuebrado([])
+    with pytest.raises(ConnectionError):
+        IA.consumir_stream(stream, texto, "gemini")
+    assert stream.fechado
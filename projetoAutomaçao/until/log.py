@@ -0,0 +1,141 @@
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO")
+LOG_FORMATO = os.getenv("LOG_FORMATO", "texto")  # "texto" ou "json"
+LOG_FILA_MAX = int(os.getenv("LOG_FILA_MAX", "10000"))
+
+
+class Preguicoso:
+    """Adia uma formatação cara (ex.: json.dumps com indent) até o registro ser escrito"""
+
+    __slots__ = ("funcao", "args")
+
+    def __init__(self, funcao, *args):
+        self.funcao = funcao
+        self.args = args
+
+    def __str__(self):
+        return str(self.funcao(*self.args))
+
+
+def json_bonito(dados):
+    """JSON indentado, montado só se o nível estiver ligado (use como argumento do log)"""
+    return Preguicoso(lambda d: json.dumps(d, indent=2, ensure_ascii=False), dados)
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Deixa passar 1 a cada `taxa` registros abaixo de `nivel_integral` (WARNING e
+    acima sempre passam). Para rotas de alto volume.
+    """
+
+    def __init__(self, taxa, nivel_integral=logging.WARNING):
+        super().__init__()
+        self.taxa = max(1, int(taxa))
+        self.nivel_integral = nivel_integral
+        self._contador = itertools.count()
+        self.descartados = 0
+
+    def filter(self, record):
+        if record.levelno >= self.nivel_integral or self.taxa == 1:
+            return True
+        if next(self._contador) % self.taxa == 0:
+            record.amostragem = self.taxa
+            return True
+        self.descartados += 1
+        return False
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro, com os campos passados em extra={"campos": {...}}"""
+
+    def format(self, record):
+        dados = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        campos = getattr(record, "campos", None)
+        if campos:
+            dados.update(campos)
+        if getattr(record, "amostragem", None):
+            dados["amostragem"] = record.amostragem
+        if record.exc_info:
+            dados["erro"] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class FormatadorTexto(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+
+    def format(self, record):
+        texto = super().format(record)
+        campos = getattr(record, "campos", None)
+        if campos:
+            texto += " " + " ".join(f"{k}={v}" for k, v in campos.items())
+        return texto
+
+
+class _HandlerFila(logging.handlers.QueueHandler):
+    """
+    QueueHandler que não formata na thread de quem loga: o registro vai inteiro
+    para a fila e a mensagem (e os Preguicoso) só é montada pela thread do listener.
+    Se a fila encher, o registro é descartado e contado em vez de bloquear.
+    """
+
+    descartados = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _HandlerFila.descartados += 1
+
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configurar_logging(nivel=LOG_NIVEL, formato=LOG_FORMATO, fila_max=LOG_FILA_MAX):
+    """
+    Liga o logging assíncrono do processo: os handlers só enfileiram e uma thread
+    (QueueListener) escreve no console. Chamadas repetidas não fazem nada.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        saida = logging.StreamHandler()
+        saida.setFormatter(FormatadorJSON() if formato == "json" else FormatadorTexto())
+
+        fila = queue.Queue(maxsize=fila_max)
+        raiz = logging.getLogger()
+        raiz.handlers = [_HandlerFila(fila)]
+        raiz.setLevel(nivel)
+
+        _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def logger_amostrado(nome, taxa):
+    """Logger com FiltroAmostragem (1 em `taxa` registros abaixo de WARNING)"""
+    log = logging.getLogger(nome)
+    if not any(isinstance(f, FiltroAmostragem) for f in log.filters):
+        log.addFilter(FiltroAmostragem(taxa))
+    return log
+
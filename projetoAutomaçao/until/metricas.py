@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+
+# Buckets em segundos (de 5ms a 2min), pensados para HTTP e geração de IA
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Histograma:
+    """Histograma de latências com buckets fixos (contagem cumulativa ao exportar)"""
+
+    def __init__(self, buckets=BUCKETS_PADRAO):
+        self.buckets = tuple(sorted(buckets))
+        self._contagens = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self._lock = threading.Lock()
+        self.total = 0
+        self.soma = 0.0
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            self._contagens[indice] += 1
+            self.total += 1
+            self.soma += valor
+
+    def cumulativo(self):
+        """Lista de (limite, contagem acumulada), incluindo +Inf"""
+        with self._lock:
+            contagens = list(self._contagens)
+        acumulado, resultado = 0, []
+        for limite, n in zip(self.buckets + (float("inf"),), contagens):
+            acumulado += n
+            resultado.append((limite, acumulado))
+        return resultado
+
+    def percentil(self, p):
+        """Aproxima o percentil p (0-100) pelo limite superior do bucket"""
+        if not self.total:
+            return 0.0
+        alvo = self.total * p / 100
+        for limite, acumulado in self.cumulativo():
+            if acumulado >= alvo:
+                return limite if limite != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def estatisticas(self):
+        return {
+            "total": self.total,
+            "media_ms": round(self.soma / self.total * 1000, 1) if self.total else 0.0,
+            "p50_ms": round(self.percentil(50) * 1000, 1),
+            "p90_ms": round(self.percentil(90) * 1000, 1),
+            "p99_ms": round(self.percentil(99) * 1000, 1),
+        }
+
+
+# -------------------- EXPORTAÇÃO (formato texto do Prometheus) --------------------
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes, valores, extra=None):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico com rótulos (ex.: requisições por rota/status)"""
+
+    def __init__(self, rotulos=()):
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(str(rotulos.get(n, "")) for n in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def amostras(self):
+        with self._lock:
+            return dict(self._valores)
+
+
+class FamiliaHistogramas:
+    """Um Histograma por combinação de rótulos"""
+
+    def __init__(self, rotulos=(), buckets=BUCKETS_PADRAO):
+        self.rotulos = tuple(rotulos)
+        self.buckets = buckets
+        self._filhos = {}
+        self._lock = threading.Lock()
+
+    def filho(self, **rotulos):
+        chave = tuple(str(rotulos.get(n, "")) for n in self.rotulos)
+        hist = self._filhos.get(chave)
+        if hist is None:
+            with self._lock:
+                hist = self._filhos.setdefault(chave, Histograma(self.buckets))
+        return hist
+
+    def observar(self, valor, **rotulos):
+        self.filho(**rotulos).observar(valor)
+
+    def amostras(self):
+        with self._lock:
+            return dict(self._filhos)
+
+
+class RegistroMetricas:
+    """
+    Métricas de um processo, exportadas no formato texto do Prometheus.
+
+    Contadores e histogramas são atualizados no caminho da requisição (um lock curto
+    por observação). Valores que já existem em outros objetos (profundidade de fila,
+    agentes conectados, contadores do pipeline de envio...) entram como coletores,
+    lidos só quando /metrics é consultado.
+    """
+
+    def __init__(self):
+        self._metricas = []  # (nome, tipo, ajuda, rotulos, fonte)
+        self._lock = threading.Lock()
+
+    def _adicionar(self, nome, tipo, ajuda, rotulos, fonte):
+        with self._lock:
+            self._metricas.append((nome, tipo, ajuda, tuple(rotulos), fonte))
+
+    def contador(self, nome, ajuda, rotulos=()):
+        contador = Contador(rotulos)
+        self._adicionar(nome, "counter", ajuda, rotulos, contador.amostras)
+        return contador
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        familia = FamiliaHistogramas(rotulos, buckets)
+        self._adicionar(nome, "histogram", ajuda, rotulos, familia.amostras)
+        return familia
+
+    def coletor(self, nome, tipo, ajuda, funcao, rotulos=()):
+        """
+        funcao() é chamada a cada exportação. Para gauge/counter retorna um número ou
+        {(valores dos rótulos): número}; para histogram, {(valores dos rótulos): Histograma}.
+        """
+        def fonte():
+            valor = funcao()
+            return valor if isinstance(valor, dict) else {(): valor}
+        self._adicionar(nome, tipo, ajuda, rotulos, fonte)
+
+    def exportar(self):
+        with self._lock:
+            metricas = list(self._metricas)
+
+        linhas = []
+        for nome, tipo, ajuda, rotulos, fonte in metricas:
+            try:
+                amostras = fonte()
+            except Exception as e:
+                linhas.append(f"# erro ao coletar {nome}: {_escapar(e)}")
+                continue
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for valores, amostra in sorted(amostras.items()):
+                valores = valores if isinstance(valores, tuple) else (valores,)
+                if tipo != "histogram":
+                    linhas.append(f"{nome}{_rotulos(rotulos, valores)} {_numero(amostra)}")
+                    continue
+                for limite, acumulado in amostra.cumulativo():
+                    le = 'le="' + _numero(limite) + '"'
+                    linhas.append(f"{nome}_bucket{_rotulos(rotulos, valores, le)} {acumulado}")
+                linhas.append(f"{nome}_sum{_rotulos(rotulos, valores)} {_numero(amostra.soma)}")
+                linhas.append(f"{nome}_count{_rotulos(rotulos, valores)} {amostra.total}")
+        return "\n".join(linhas) + "\n"
+
+
+def instrumentar_flask(app, registro, rota="/metrics"):
+    """Conta e mede cada requisição do app por rota e expõe o registro em `rota`"""
+    from flask import Response, g, request
+
+    requisicoes = registro.contador(
+        "http_requests_total", "Requisições HTTP recebidas", ("rota", "metodo", "status")
+    )
+    duracao = registro.histograma(
+        "http_request_duration_seconds", "Tempo de resposta por rota", ("rota", "metodo")
+    )
+
+    @app.before_request
+    def _inicio_requisicao():
+        g._metricas_inicio = time.perf_counter()
+
+    @app.after_request
+    def _fim_requisicao(resposta):
+        inicio = g.pop("_metricas_inicio", None)
+        if inicio is not None:
+            # Usa o padrão da rota (não a URL) para não explodir a cardinalidade
+            padrao = request.url_rule.rule if request.url_rule else "nao_encontrada"
+            duracao.observar(time.perf_counter() - inicio, rota=padrao, metodo=request.method)
+            requisicoes.inc(rota=padrao, metodo=request.method, status=resposta.status_code)
+        return resposta
+
+    @app.route(rota, methods=["GET"])
+    def metricas():
+        return Response(registro.exportar(), mimetype="text/plain; version=0.0.4")
+
+    return registro
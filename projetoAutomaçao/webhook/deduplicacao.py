@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEDUP_TTL_SEG = float(os.getenv("DEDUP_TTL_SEG", "600"))        # retentativas do provedor chegam bem antes disso
+DEDUP_CAPACIDADE = int(os.getenv("DEDUP_CAPACIDADE", "100000"))  # teto de IDs guardados (~10MB)
+
+
+class JanelaVistos:
+    """
+    IDs vistos recentemente, com validade (ttl) e teto de memória (capacidade).
+
+    Um OrderedDict em ordem de chegada: a consulta é um lookup no dict e a limpeza só
+    olha o começo, onde ficam os mais antigos. Passando da capacidade os mais antigos
+    saem antes de vencer (contados em `expulsos`).
+    """
+
+    def __init__(self, ttl=DEDUP_TTL_SEG, capacidade=DEDUP_CAPACIDADE):
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self._vistos = OrderedDict()  # id -> vence_em
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.duplicados = 0
+        self.expulsos = 0
+
+    def _limpar(self, agora):
+        while self._vistos:
+            vence_em = next(iter(self._vistos.values()))
+            if vence_em > agora and len(self._vistos) <= self.capacidade:
+                break
+            self._vistos.popitem(last=False)
+            if vence_em > agora:
+                self.expulsos += 1
+
+    def visto(self, id_mensagem):
+        """True se o ID já passou dentro da janela; senão registra e retorna False"""
+        agora = time.monotonic()
+        with self._lock:
+            self.consultas += 1
+            vence_em = self._vistos.get(id_mensagem)
+            if vence_em is not None and vence_em > agora:
+                self.duplicados += 1
+                return True
+            self._vistos.pop(id_mensagem, None)
+            self._vistos[id_mensagem] = agora + self.ttl
+            self._limpar(agora)
+            return False
+
+    def esquecer(self, id_mensagem):
+        """Desfaz o registro (ex.: o evento foi recusado e a retentativa deve passar)"""
+        with self._lock:
+            self._vistos.pop(id_mensagem, None)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "tamanho": len(self._vistos),
+                "capacidade": self.capacidade,
+                "ttl_seg": self.ttl,
+                "consultas": self.consultas,
+                "duplicados": self.duplicados,
+                "taxa_acerto": round(self.duplicados / self.consultas, 4) if self.consultas else 0.0,
+                "expulsos": self.expulsos,
+            }
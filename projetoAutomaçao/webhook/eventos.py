@@ -0,0 +1,128 @@
+import re
+
+# Compilados uma vez: número do remetente ("5511999999999@s.whatsapp.net" -> "5511999999999")
+_PADRAO_NUMERO = re.compile(r"(\d+)@")
+
+CHAT_DESCONHECIDO = "desconhecido"
+
+
+class Evento:
+    """
+    Evento do webhook já normalizado: o JSON é lido uma vez, pelo extrator do tipo,
+    e o resto do pipeline (dedup, fila, agrupamento, resposta) usa só os campos.
+    `dados` guarda o payload original para log e depuração.
+    """
+
+    __slots__ = (
+        "tipo", "dados", "chat_id", "texto", "remetente", "numero", "id_mensagem", "grupo", "de_mim",
+        "status", "token", "instancia", "dono",
+    )
+
+    def __init__(self, tipo, dados, chat_id=CHAT_DESCONHECIDO, texto="", remetente="", numero=None,
+                 id_mensagem=None, grupo=False, de_mim=False, status="", token=None, instancia=None, dono=None):
+        self.tipo = tipo
+        self.dados = dados
+        self.chat_id = chat_id
+        self.texto = texto
+        self.remetente = remetente
+        self.numero = numero
+        self.id_mensagem = id_mensagem
+        self.grupo = grupo
+        self.de_mim = de_mim
+        self.status = status
+        self.token = token
+        self.instancia = instancia
+        self.dono = dono
+
+    def com_texto(self, texto):
+        """Cópia do evento com outro texto (usado ao juntar mensagens em sequência)"""
+        copia = Evento.__new__(Evento)
+        for campo in Evento.__slots__:
+            setattr(copia, campo, getattr(self, campo))
+        copia.texto = texto
+        return copia
+
+    def __repr__(self):
+        return f"Evento({self.tipo!r}, chat_id={self.chat_id!r}, id_mensagem={self.id_mensagem!r})"
+
+
+def mesclar_eventos(eventos):
+    """
+    Um evento com o texto de todos (uma linha por mensagem), sobre o último. Se a
+    rajada tem mais de um remetente (grupo), cada linha leva o número de quem falou.
+    """
+    if len(eventos) == 1:
+        return eventos[0]
+    com_texto = [e for e in eventos if e.texto]
+    if len({e.remetente for e in com_texto}) > 1:
+        linhas = [f"{e.numero or e.remetente or '?'}: {e.texto}" for e in com_texto]
+    else:
+        linhas = [e.texto for e in com_texto]
+    return eventos[-1].com_texto("\n".join(linhas))
+
+
+# -------------------- EXTRATORES POR TIPO --------------------
+
+def _campos_mensagem(dados):
+    mensagem = dados.get("message")
+    if not isinstance(mensagem, dict):
+        mensagem = {}
+
+    if "text" in mensagem:
+        texto = str(mensagem["text"])
+    elif "text" in dados:
+        texto = dados["text"].get("message", "") if isinstance(dados["text"], dict) else str(dados["text"])
+    else:
+        texto = str(dados.get("mensagem", ""))
+
+    remetente = mensagem.get("sender") or ""
+    numero = _PADRAO_NUMERO.search(remetente)
+    id_mensagem = (mensagem.get("messageid") or mensagem.get("messageId") or mensagem.get("id")
+                   or dados.get("messageId") or dados.get("messageid") or dados.get("id"))
+    return {
+        "chat_id": str(
+            mensagem.get("chatid")
+            or mensagem.get("chatName")
+            or dados.get("chatid")
+            or dados.get("chatName")
+            or dados.get("phone")
+            or CHAT_DESCONHECIDO
+        ),
+        "texto": texto,
+        "remetente": remetente,
+        "numero": numero.group(1) if numero else None,
+        "id_mensagem": str(id_mensagem) if id_mensagem else None,
+        "grupo": bool(dados.get("isGroup", False)),
+        "de_mim": bool(mensagem.get("fromMe") or dados.get("fromMe")),
+    }
+
+
+def _campos_conexao(dados):
+    instancia = dados.get("instance") if isinstance(dados.get("instance"), dict) else {}
+    status = dados.get("status") or instancia.get("status") or ""
+    if isinstance(status, dict):
+        status = "CONNECTED" if status.get("connected") else "DISCONNECTED"
+    return {
+        "status": str(status).upper(),
+        "token": dados.get("token") or instancia.get("token"),
+        "instancia": dados.get("instanceName") or instancia.get("name"),
+        "dono": dados.get("owner") or instancia.get("owner"),
+    }
+
+
+def _sem_campos(dados):
+    return {}
+
+
+# Tipos sem extrator (presença, chats, contatos...) só carregam o payload
+EXTRATORES = {
+    "mensagem": _campos_mensagem,
+    "conexao": _campos_conexao,
+}
+
+
+def normalizar(dados, tipo):
+    """Monta o Evento do tipo a partir do JSON recebido"""
+    if not isinstance(dados, dict):
+        dados = {}
+    return Evento(tipo, dados, **EXTRATORES.get(tipo, _sem_campos)(dados))
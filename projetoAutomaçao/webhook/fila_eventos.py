@@ -0,0 +1,328 @@
+import heapq
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+
+_PARAR = object()
+
+log = logging.getLogger(__name__)
+
+
+class FilaEventos:
+    """
+    Fila limitada de eventos do webhook drenada por um pool de workers.
+
+    Cada chave (chat_id) é sempre atendida pelo mesmo worker, o que mantém a ordem
+    das mensagens de um mesmo chat enquanto chats diferentes seguem em paralelo.
+    Quando a fila do worker está cheia o evento é recusado (backpressure) e o
+    chamador decide o que responder ao provedor.
+    """
+
+    def __init__(self, processador, workers=4, capacidade=1000, nome="fila"):
+        self.processador = processador
+        self.nome = nome
+        self.capacidade = capacidade
+        por_worker = max(1, capacidade // max(1, workers))
+        self._filas = [queue.Queue(maxsize=por_worker) for _ in range(max(1, workers))]
+        self._lock = threading.Lock()
+        self._threads = []
+
+        # Métricas
+        self.recebidos = 0
+        self.rejeitados = 0
+        self.processados = 0
+        self.erros = 0
+        self.pico = 0
+        self.espera_total = 0.0
+        self.processamento_total = 0.0
+
+        for i, fila in enumerate(self._filas):
+            t = threading.Thread(target=self._worker, args=(fila,), name=f"{nome}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _fila_da_chave(self, chave):
+        indice = zlib.crc32(str(chave).encode("utf-8")) % len(self._filas)
+        return self._filas[indice]
+
+    def enfileirar(self, chave, evento):
+        """Enfileira o evento sem bloquear. Retorna False se a fila estiver cheia."""
+        fila = self._fila_da_chave(chave)
+        try:
+            fila.put_nowait((time.monotonic(), evento))
+        except queue.Full:
+            with self._lock:
+                self.rejeitados += 1
+            return False
+
+        with self._lock:
+            self.recebidos += 1
+            profundidade = self.profundidade()
+            if profundidade > self.pico:
+                self.pico = profundidade
+        return True
+
+    def profundidade(self):
+        return sum(f.qsize() for f in self._filas)
+
+    def _worker(self, fila):
+        while True:
+            item = fila.get()
+            if item is _PARAR:
+                fila.task_done()
+                break
+
+            enfileirado_em, evento = item
+            inicio = time.monotonic()
+            try:
+                self.processador(evento)
+            except Exception:
+                with self._lock:
+                    self.erros += 1
+                log.exception("⚠️ [%s] Erro ao processar evento", self.nome)
+            finally:
+                fim = time.monotonic()
+                with self._lock:
+                    self.processados += 1
+                    self.espera_total += inicio - enfileirado_em
+                    self.processamento_total += fim - inicio
+                fila.task_done()
+
+    def estatisticas(self):
+        """Retorna as métricas de backpressure da fila"""
+        with self._lock:
+            processados = self.processados
+            return {
+                "workers": len(self._filas),
+                "capacidade": self.capacidade,
+                "profundidade": self.profundidade(),
+                "pico": self.pico,
+                "recebidos": self.recebidos,
+                "rejeitados": self.rejeitados,
+                "processados": processados,
+                "erros": self.erros,
+                "espera_media_ms": round(self.espera_total / processados * 1000, 2) if processados else 0.0,
+                "processamento_medio_ms": round(self.processamento_total / processados * 1000, 2) if processados else 0.0,
+            }
+
+    def encerrar(self, timeout=None):
+        """Drena os eventos pendentes e finaliza os workers; `timeout` vale para todos juntos"""
+        prazo = None if timeout is None else time.monotonic() + timeout
+
+        def restante():
+            return None if prazo is None else max(0.0, prazo - time.monotonic())
+
+        for fila in self._filas:
+            try:
+                fila.put(_PARAR, timeout=restante())
+            except queue.Full:
+                log.warning("⚠️ [%s] Fila ainda cheia no encerramento", self.nome)
+        for t in self._threads:
+            t.join(restante())
+
+
+class DespachantePorChave:
+    """
+    Raias sequenciais por chave (chat_id) sobre um executor compartilhado.
+
+    Tarefas da mesma chave rodam uma de cada vez, na ordem de chegada; chaves
+    diferentes seguem em paralelo no pool. Cada raia ocupa no máximo uma thread e
+    devolve a vez ao pool depois de cada tarefa, então um chat com muitas mensagens
+    não segura um worker enquanto os outros esperam. Raias vazias são descartadas.
+    """
+
+    def __init__(self, executor, nome="despachante"):
+        self.executor = executor
+        self.nome = nome
+        self._raias = {}  # chave -> deque de (funcao, args, kwargs, futuro)
+        self._pendentes = 0  # soma das raias, sem percorrê-las a cada consulta
+        self._cond = threading.Condition()
+
+        # Métricas
+        self.submetidos = 0
+        self.processados = 0
+        self.erros = 0
+        self.maior_raia = 0
+
+    def submeter(self, chave, funcao, *args, **kwargs):
+        """Enfileira funcao(*args, **kwargs) na raia da chave e retorna um Future"""
+        futuro = Future()
+        with self._cond:
+            raia = self._raias.get(chave)
+            nova = raia is None
+            if nova:
+                raia = self._raias[chave] = deque()
+            raia.append((funcao, args, kwargs, futuro))
+            self._pendentes += 1
+            self.submetidos += 1
+            self.maior_raia = max(self.maior_raia, len(raia))
+        if nova:
+            self._agendar(chave)
+        return futuro
+
+    def _agendar(self, chave):
+        try:
+            self.executor.submit(self._rodar, chave)
+        except RuntimeError as e:  # executor encerrado
+            with self._cond:
+                raia = self._raias.pop(chave, deque())
+                self._pendentes -= len(raia)
+                self._cond.notify_all()
+            for _, _, _, futuro in raia:
+                futuro.set_exception(e)
+
+    def _rodar(self, chave):
+        with self._cond:
+            funcao, args, kwargs, futuro = self._raias[chave][0]
+        if futuro.set_running_or_notify_cancel():
+            try:
+                futuro.set_result(funcao(*args, **kwargs))
+            except Exception as e:
+                with self._cond:
+                    self.erros += 1
+                log.exception("⚠️ [%s] Erro na raia %s", self.nome, chave)
+                futuro.set_exception(e)
+
+        with self._cond:
+            raia = self._raias[chave]
+            raia.popleft()
+            self._pendentes -= 1
+            self.processados += 1
+            if not raia:
+                del self._raias[chave]
+                self._cond.notify_all()
+                return
+        self._agendar(chave)  # volta para o fim da fila do pool
+
+    def pendentes(self):
+        with self._cond:
+            return self._pendentes
+
+    def aguardar(self, timeout=None):
+        """Espera todas as raias esvaziarem. Retorna False se o timeout estourar."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._raias, timeout)
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                "raias_ativas": len(self._raias),
+                "pendentes": self._pendentes,
+                "maior_raia": self.maior_raia,
+                "submetidos": self.submetidos,
+                "processados": self.processados,
+                "erros": self.erros,
+            }
+
+
+class AgrupadorPorChave:
+    """
+    Debounce por chave: junta os itens que chegam em sequência para a mesma chave.
+
+    O grupo é liberado quando passa `janela` segundos sem item novo, ou `espera_max`
+    segundos depois do primeiro (rajadas longas não atrasam a resposta sem limite).
+    ao_liberar(chave, itens) roda na thread do agrupador e deve ser rápido (ex.:
+    entregar a um DespachantePorChave). Com janela <= 0 cada item é liberado na hora.
+    """
+
+    def __init__(self, ao_liberar, janela=2.0, espera_max=8.0, nome="agrupador"):
+        self.ao_liberar = ao_liberar
+        self.janela = janela
+        self.espera_max = max(janela, espera_max)
+        self.nome = nome
+        self._grupos = {}  # chave -> [inicio, ultimo, itens]
+        self._heap = []    # (prazo, chave); entradas antigas são ignoradas ao sair
+        self._retidos = 0  # itens nos grupos abertos
+        self._cond = threading.Condition()
+
+        # Métricas
+        self.itens = 0
+        self.liberados = 0
+        self.por_espera_max = 0
+
+        self._thread = threading.Thread(target=self._loop, name=nome, daemon=True)
+        self._thread.start()
+
+    def _prazo(self, grupo):
+        return min(grupo[1] + self.janela, grupo[0] + self.espera_max)
+
+    def adicionar(self, chave, item):
+        if self.janela <= 0:
+            with self._cond:
+                self.itens += 1
+                self.liberados += 1
+            self._liberar(chave, [item])
+            return
+        agora = time.monotonic()
+        with self._cond:
+            self.itens += 1
+            grupo = self._grupos.get(chave)
+            if grupo is None:
+                grupo = self._grupos[chave] = [agora, agora, []]
+            grupo[1] = agora
+            grupo[2].append(item)
+            self._retidos += 1
+            heapq.heappush(self._heap, (self._prazo(grupo), chave))
+            self._cond.notify()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    prazo, chave = self._heap[0]
+                    agora = time.monotonic()
+                    if prazo > agora:
+                        self._cond.wait(prazo - agora)
+                        continue
+                    heapq.heappop(self._heap)
+                    grupo = self._grupos.get(chave)
+                    if grupo is None or self._prazo(grupo) > agora:
+                        continue  # já liberado, ou chegou item depois desta entrada
+                    del self._grupos[chave]
+                    self._retidos -= len(grupo[2])
+                    self.liberados += 1
+                    if grupo[0] + self.espera_max <= agora:
+                        self.por_espera_max += 1
+                    break
+            self._liberar(chave, grupo[2])
+
+    def _liberar(self, chave, itens):
+        try:
+            self.ao_liberar(chave, itens)
+        except Exception:
+            log.exception("⚠️ [%s] Erro ao liberar %s", self.nome, chave)
+
+    def liberar_tudo(self):
+        """Libera na hora todos os grupos pendentes (usado no encerramento)"""
+        with self._cond:
+            grupos, self._grupos = self._grupos, {}
+            self._heap.clear()
+            self._retidos = 0
+            self.liberados += len(grupos)
+        for chave, grupo in grupos.items():
+            self._liberar(chave, grupo[2])
+
+    def pendentes(self):
+        """Itens retidos em grupos ainda não liberados"""
+        with self._cond:
+            return self._retidos
+
+    def estatisticas(self):
+        with self._cond:
+            return {
+                "janela_seg": self.janela,
+                "espera_max_seg": self.espera_max,
+                "grupos_abertos": len(self._grupos),
+                "retidos": self._retidos,
+                "itens": self.itens,
+                "liberados": self.liberados,
+                "por_espera_max": self.por_espera_max,
+                "itens_por_grupo": round(self.itens / self.liberados, 2) if self.liberados else 0.0,
+            }
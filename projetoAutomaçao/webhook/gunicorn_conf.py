@@ -0,0 +1,32 @@
+# gunicorn -c webhook/gunicorn_conf.py webhook.webhook_receiver:app   (somente Linux)
+import os
+
+bind = f"{os.getenv('WEBHOOK_HOST', '0.0.0.0')}:{os.getenv('WEBHOOK_PORTA', '5000')}"
+
+# Cada processo tem seu cache de histórico, fila por chat e limitador de envio.
+# Com mais de um processo, mensagens do mesmo chat podem cair em workers diferentes;
+# suba processos extras só com HISTORICO_BACKEND=sqlite e afinidade por chat na frente.
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("WEBHOOK_THREADS", "16"))
+
+# Importar o app não cria threads, arquivos nem conexões: tudo sobe em post_worker_init,
+# já no processo do worker (threads não sobrevivem ao fork)
+preload_app = False
+
+# graceful_timeout é a janela SIGTERM -> SIGKILL do arbiter e já corre enquanto as
+# requisições em andamento terminam; a drenagem (worker_exit) recebe só
+# WEBHOOK_ENCERRAR_SEG, e a janela tem uma margem a mais para ela nunca ser cortada
+encerrar_seg = int(os.getenv("WEBHOOK_ENCERRAR_SEG", "30"))
+graceful_timeout = encerrar_seg + int(os.getenv("GUNICORN_MARGEM_SEG", "15"))
+timeout = 120
+
+
+def post_worker_init(worker):
+    from webhook.webhook_receiver import iniciar_servicos
+    iniciar_servicos()
+
+
+def worker_exit(server, worker):
+    from webhook.webhook_receiver import encerrar_servicos
+    encerrar_servicos(encerrar_seg)
@@ -5,7 +5,7 @@ from conectar_instancia import *
 
 
 def bt_verificar_instancia(inst):
-    conectar_instancia.MonitorThread.check_status(inst)
+    conectar_instancia.check_status(inst)
 
 
 
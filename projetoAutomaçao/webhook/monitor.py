@@ -3,10 +3,16 @@ from dotenv import load_dotenv
 import os
 import threading
 import time
-import requests
+from banco.estado_agentes import EstadoAgentes
+from banco.serie_status import SerieStatus, janela_em_segundos
+from integration.instancias import INSTANCIAS_ATUALIZAR_SEG, criar_registro, descrever_instancia
+from until.metricas import RegistroMetricas, instrumentar_flask
+from webhook.monitor_instancias import MonitorInstancias, NotificadorAlertas
 
 # ----------------- FLASK -----------------
 app = Flask(__name__)
+estado_agentes = EstadoAgentes()
+serie_status = SerieStatus()  # cada consulta do monitor, em períodos contínuos (SQLite)
 
 @app.route('/', methods=['GET'])
 def index():
@@ -18,98 +24,143 @@ def webhook_receiver():
     print("📩 Webhook recebido:", data)
     return jsonify({"status": "sucesso", "mensagem": "Webhook recebido com sucesso!"}), 200
 
+@app.route('/agentes', methods=['GET'])
+def agentes_estado():
+    """Estado das instâncias GTI publicado pelo webhook de conexão"""
+    agentes = estado_agentes.todos()
+    return jsonify({
+        "total": len(agentes),
+        "conectados": sum(1 for a in agentes if a["conectado"]),
+        "agentes": agentes
+    }), 200
+
+
+@app.route('/monitor', methods=['GET'])
+def monitor_estado():
+    """Último status lido e intervalo atual de cada instância monitorada"""
+    return jsonify({"instancias": monitor.estado(), "alertas": notificador.estatisticas()}), 200
+
+def ler_limite(texto, padrao=100):
+    """?limite= das listagens: inteiro positivo (ausente = padrão)"""
+    if not texto:
+        return padrao
+    try:
+        limite = int(texto)
+    except ValueError:
+        raise ValueError(f"limite inválido: {texto}") from None
+    if limite <= 0:
+        raise ValueError(f"limite inválido: {texto}")
+    return limite
+
+@app.route('/monitor/uptime', methods=['GET'])
+def monitor_uptime():
+    """Uptime, quedas e desconexões de todas as instâncias (?janela=30m|24h|7d|<segundos>)"""
+    try:
+        janela = janela_em_segundos(request.args.get("janela"))
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    return jsonify({"janela_seg": janela, "instancias": serie_status.resumo(janela)}), 200
+
+@app.route('/monitor/uptime/<nome>', methods=['GET'])
+def monitor_uptime_instancia(nome):
+    """Resumo da instância na janela e a lista das desconexões"""
+    try:
+        janela = janela_em_segundos(request.args.get("janela"))
+        limite = ler_limite(request.args.get("limite"))
+    except ValueError as e:
+        return jsonify({"erro": str(e)}), 400
+    resumo = serie_status.resumo(janela, instancia=nome).get(nome)
+    if resumo is None:
+        return jsonify({"erro": "sem amostras na janela"}), 404
+    return jsonify({
+        "janela_seg": janela,
+        "instancia": nome,
+        **resumo,
+        "desconexoes": serie_status.desconexoes(nome, janela, limite=limite)
+    }), 200
+
 
 # ----------------- MONITORAMENTO -----------------
 load_dotenv()
 
-BASE_URL = "https://api.z-api.io"
-client_token = os.getenv("CLIENT_TOKEN")
-
 # URL do webhook para onde enviar os alertas
 WEBHOOK_ALERT_URL = os.getenv("WEBHOOK_ALERT_URL", "http://localhost:4040/webhook")
 
-# Carrega todas as instâncias do .env
-instances = []
-for i in range(40, 49):
-    instance_id = os.getenv(f"ZAPI_LENTO_{i}_ID")
-    instance_token = os.getenv(f"ZAPI_LENTO_{i}_TOKEN")
-    instance_name = f'ZAPI_LENTO_{i}'
-    if instance_id and instance_token:
-        instances.append({"id": instance_id, "token": instance_token, "name": instance_name})
-    else:
-        print(f"Instância {i} não configurada no .env")
+# Por quanto tempo o estado GTI da tabela (eventos de conexão + consultas) dispensa consultar a instância
+MONITOR_ESTADO_VALIDADE = float(os.getenv("MONITOR_ESTADO_VALIDADE", os.getenv("RECONCILIAR_SEG", "1800")))
+
+# Instâncias Z-API do .env + GTI da tabela ROTA, redescobertas periodicamente
+registro_instancias = criar_registro()
+
+notificador = NotificadorAlertas(WEBHOOK_ALERT_URL)
 
-# Função para enviar alertas
-#funcao de enviar alerta desligada
 def send_alert(inst_name, status):
-    """Envia alerta via webhook"""
-    payload = {
-        "instance": inst_name,
-        "status": "conectada" if status else "desconectada"
-    }
-    try:
-        r = requests.post(WEBHOOK_ALERT_URL, json=payload, timeout=5)
-        r.raise_for_status()
-        print(f"📤 Alerta enviado para {WEBHOOK_ALERT_URL}: {payload}")
-    except Exception as e:
-        pass
-        #print(f"❌ Erro ao enviar alerta da {inst_name}: {e}")
-
-# Classe para monitorar cada instância em thread separada
-class MonitorThread(threading.Thread):
-    def __init__(self, inst, interval=5):
-        super().__init__(daemon=True)
-        self.inst = inst
-        self.interval = interval
-        self._stop_event = threading.Event()
-        self.prev_status = None
-
-    def run(self):
-        print(f"Iniciando monitoramento da instância {self.inst['name']}")
-        while not self._stop_event.is_set():
-            status = self.check_status()
-            if self.prev_status is not None:
-                if self.prev_status and not status:
-                    print(f"⚠️ Instância {self.inst['name']} desconectou!")
-                    send_alert(self.inst['name'], status)
-                elif not self.prev_status and status:
-                    print(f"✅ Instância {self.inst['name']} reconectou!")
-                    send_alert(self.inst['name'], status)
-            else:
-                print(f"Status inicial da instância {self.inst['name']}: {'Conectada' if status else 'Desconectada'}")
-                send_alert(self.inst['name'], status)
-
-            self.prev_status = status
-            time.sleep(self.interval)
-
-    def check_status(self):
-        url = f"{BASE_URL}/instances/{self.inst['id']}/token/{self.inst['token']}/status"
-        headers = {"Client-Token": client_token}
-        try:
-            r = requests.get(url, headers=headers, timeout=10)
-            r.raise_for_status()
-            data = r.json()
-            return data.get("connected", False)
-        except Exception as e:
-            print(f"Erro ao consultar {self.inst['name']}: {e}")
-            return False
-
-    def stop(self):
-        self._stop_event.set()
+    """Enfileira o alerta; o notificador envia em lote sem bloquear o monitor"""
+    notificador.enviar(inst_name, status)
+
+def ao_mudar_status(inst, status, anterior):
+    if anterior is None:
+        print(f"Status inicial da instância {inst['name']}: {'Conectada' if status else 'Desconectada'}")
+    elif anterior and not status:
+        print(f"⚠️ Instância {inst['name']} desconectou!")
+    else:
+        print(f"✅ Instância {inst['name']} reconectou!")
+    send_alert(inst['name'], status)
+    registro_instancias.evento_conexao(status, token=inst['token'])
+
+def ao_verificar_status(inst, status):
+    serie_status.registrar(inst['name'], status)
+
+def ler_estado_agente(inst):
+    """Status GTI da tabela compartilhada, se recente; None faz o monitor consultar a instância"""
+    if inst.get("tipo") != "gti":
+        return None
+    estado = estado_agentes.obter(inst['token'])
+    if estado is None or time.time() - estado["visto_em"] > MONITOR_ESTADO_VALIDADE:
+        return None
+    return bool(estado["conectado"])
+
+def gravar_estado_agente(inst, status):
+    """Resultado das consultas HTTP do monitor vale para o webhook (reconciliação) também"""
+    estado_agentes.registrar(inst['token'], status, nome=inst['name'], origem="monitor")
+
+monitor = MonitorInstancias(
+    ao_mudar=ao_mudar_status, ao_verificar=ao_verificar_status,
+    ler_estado=ler_estado_agente, gravar_estado=gravar_estado_agente
+)
+
+def sincronizar_monitor(novos=None, removidos=None):
+    """Instâncias novas entram no monitor e removidas saem, sem reiniciar o processo"""
+    monitor.definir_instancias([descrever_instancia(ag) for ag in registro_instancias.todos()])
+
+registro_instancias.ao_atualizar(sincronizar_monitor)
+
+# ----------------- MÉTRICAS (/metrics) -----------------
+metricas = instrumentar_flask(app, RegistroMetricas())
+metricas.coletor("monitor_instancias", "gauge", "Instâncias monitoradas", lambda: len(monitor.estado()))
+metricas.coletor("agentes_conectados", "gauge", "Instâncias conectadas na última consulta",
+                 lambda: sum(1 for e in monitor.estado().values() if e["conectado"]))
+metricas.coletor("monitor_consulta_seconds", "histogram", "Duração das consultas de status",
+                 lambda: monitor.latencia_consulta)
+metricas.coletor(
+    "monitor_alertas_total", "counter", "Alertas de conexão por resultado",
+    lambda: {(campo,): valor for campo, valor in notificador.estatisticas().items() if campo != "pendentes"},
+    rotulos=("resultado",)
+)
+metricas.coletor("monitor_alertas_pendentes", "gauge", "Alertas aguardando envio",
+                 lambda: notificador.estatisticas()["pendentes"])
 
 def start_monitoring():
-    threads = []
-    for inst in instances:
-        t = MonitorThread(inst)
-        t.start()
-        threads.append(t)
-    return threads
+    registro_instancias.recarregar()
+    sincronizar_monitor()
+    registro_instancias.iniciar_atualizacao(INSTANCIAS_ATUALIZAR_SEG)
+    return monitor.iniciar()
 
 
 # ----------------- MAIN -----------------
 if __name__ == "__main__":
     # inicia monitoramento
-    threads = start_monitoring()
+    start_monitoring()
 
     # inicia flask em outra thread
     flask_thread = threading.Thread(
@@ -123,9 +174,8 @@ if __name__ == "__main__":
         cmd = input()
         if cmd.strip().lower() == "sair":
             print("Encerrando...")
-            for t in threads:
-                t.stop()
             break
 
-    for t in threads:
-        t.join()
+    registro_instancias.parar()
+    monitor.parar()
+    serie_status.fechar()
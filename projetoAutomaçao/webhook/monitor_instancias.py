@@ -0,0 +1,341 @@
+import asyncio
+import heapq
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+
+import httpx
+import requests
+from dotenv import load_dotenv
+
+from integration.cliente_gti import BASE_URL as GTI_BASE_URL
+from until.metricas import Histograma
+
+load_dotenv()
+
+BASE_URL = "https://api.z-api.io"
+client_token = os.getenv("CLIENT_TOKEN")
+
+MONITOR_INTERVALO = float(os.getenv("MONITOR_INTERVALO", "5"))          # intervalo base entre consultas
+MONITOR_INTERVALO_MAX = float(os.getenv("MONITOR_INTERVALO_MAX", "60"))  # teto para instâncias estáveis
+MONITOR_CONCORRENCIA = int(os.getenv("MONITOR_CONCORRENCIA", "50"))
+ALERTA_LOTE_MAX = int(os.getenv("ALERTA_LOTE_MAX", "100"))
+# 1 = um POST {"alertas": [...]} por lote; 0 (padrão) = um POST por alerta, no formato de sempre
+ALERTA_EM_LOTE = os.getenv("ALERTA_EM_LOTE", "0") == "1"
+
+
+def url_status(inst):
+    return f"{BASE_URL}/instances/{inst['id']}/token/{inst['token']}/status"
+
+
+def requisicao_status(inst):
+    """(url, headers) da consulta de status; inst["tipo"] é "zapi" (padrão) ou "gti"."""
+    if inst.get("tipo") == "gti":
+        return f"{GTI_BASE_URL}/instance/status", {"token": inst["token"]}
+    return url_status(inst), {"Client-Token": client_token or ""}
+
+
+def ler_status(inst, data):
+    if inst.get("tipo") == "gti":
+        return bool(data.get("status", {}).get("connected", False))
+    return bool(data.get("connected", False))
+
+
+def check_status(inst, timeout=10):
+    """Consulta avulsa (bloqueante) do status de uma instância"""
+    url, headers = requisicao_status(inst)
+    try:
+        r = requests.get(url, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        return ler_status(inst, r.json())
+    except Exception as e:
+        print(f"Erro ao consultar {inst['name']}: {e}")
+        return False
+
+
+class NotificadorAlertas:
+    """
+    Envia alertas de conexão para um webhook sem bloquear quem chama.
+
+    enviar() só coloca o alerta em uma fila; uma thread junta o que chegou em até
+    `intervalo` segundos e envia pela mesma sessão HTTP. Por padrão cada alerta vai
+    em um POST próprio ({"instance", "status", "em"}), como os receptores já esperam;
+    com em_lote=True (ALERTA_EM_LOTE=1) o lote vai em um único POST {"alertas": [...]}.
+    Se a fila encher, o alerta é descartado e contado.
+    """
+
+    def __init__(self, url, intervalo=1.0, lote_max=ALERTA_LOTE_MAX, capacidade=10000, em_lote=ALERTA_EM_LOTE):
+        self.url = url
+        self.intervalo = intervalo
+        self.lote_max = lote_max
+        self.em_lote = em_lote
+        self._fila = queue.Queue(maxsize=capacidade)
+        self._sessao = requests.Session()
+        self.enviados = 0
+        self.descartados = 0
+        self.falhas = 0
+        self._thread = threading.Thread(target=self._loop, name="alertas", daemon=True)
+        self._thread.start()
+
+    def enviar(self, inst_name, status):
+        payload = {
+            "instance": inst_name,
+            "status": "conectada" if status else "desconectada",
+            "em": time.time()
+        }
+        try:
+            self._fila.put_nowait(payload)
+        except queue.Full:
+            self.descartados += 1
+
+    def _loop(self):
+        while True:
+            lote = [self._fila.get()]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.lote_max:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+            if self.em_lote:
+                self._postar({"alertas": lote}, len(lote))
+            else:
+                for payload in lote:
+                    self._postar(payload, 1)
+
+    def _postar(self, corpo, quantidade):
+        try:
+            r = self._sessao.post(self.url, json=corpo, timeout=5)
+            r.raise_for_status()
+            self.enviados += quantidade
+        except Exception:
+            self.falhas += quantidade
+
+    def estatisticas(self):
+        return {
+            "pendentes": self._fila.qsize(),
+            "enviados": self.enviados,
+            "descartados": self.descartados,
+            "falhas": self.falhas,
+        }
+
+
+class _EstadoInstancia:
+    def __init__(self, inst, intervalo):
+        self.inst = inst
+        self.status = None
+        self.intervalo = intervalo
+        self.verificado_em = None
+        self.mudancas = 0
+        self.erros = 0
+
+
+class MonitorInstancias:
+    """
+    Monitor único (asyncio) do status de todas as instâncias (Z-API e GTI).
+
+    Um event loop em uma thread consulta as instâncias por um pool HTTP compartilhado,
+    com no máximo `concorrencia` consultas ao mesmo tempo. Cada instância tem seu
+    próprio horário (com jitter, para não consultar tudo junto); enquanto o status não
+    muda o intervalo cresce até `intervalo_max`, e volta ao base na primeira mudança
+    ou erro. ao_mudar(inst, status, anterior) é chamado na 1ª leitura e em cada mudança;
+    ao_verificar(inst, status) em toda consulta (ex.: para gravar a série histórica).
+
+    Com ler_estado(inst) -> bool | None, o status vem de um estado compartilhado (ex.:
+    EstadoAgentes) e só há consulta HTTP quando ele devolve None (sem estado recente);
+    o resultado dessas consultas vai para gravar_estado(inst, status). ao_verificar,
+    ler_estado e gravar_estado costumam gravar/ler SQLite, então rodam no executor
+    padrão, fora do loop.
+    """
+
+    def __init__(self, instancias=(), ao_mudar=None, intervalo=MONITOR_INTERVALO,
+                 intervalo_max=MONITOR_INTERVALO_MAX, concorrencia=MONITOR_CONCORRENCIA, timeout=10,
+                 ao_verificar=None, ler_estado=None, gravar_estado=None):
+        self.ao_mudar = ao_mudar
+        self.ao_verificar = ao_verificar
+        self.ler_estado = ler_estado
+        self.gravar_estado = gravar_estado
+        self.intervalo = intervalo
+        self.intervalo_max = intervalo_max
+        self.concorrencia = concorrencia
+        self.timeout = timeout
+        self._estados = {inst["name"]: _EstadoInstancia(inst, intervalo) for inst in instancias}
+        self.latencia_consulta = Histograma()
+        self._heap = []
+        self._seq = itertools.count()
+        self._loop = None
+        self._acordar = None
+        self._parar = False
+        self._thread = None
+
+    # -------------------- CONTROLE --------------------
+
+    def iniciar(self):
+        pronto = threading.Event()
+
+        def rodar():
+            self._loop = asyncio.new_event_loop()
+            self._acordar = asyncio.Event()
+            self._loop.call_soon(pronto.set)
+            self._loop.run_until_complete(self._rodar())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=rodar, name="monitor-instancias", daemon=True)
+        self._thread.start()
+        pronto.wait()
+        print(f"Monitorando {len(self._estados)} instância(s)")
+        return self._thread
+
+    def parar(self, timeout=None):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._sinalizar_parada)
+        self._thread.join(timeout)
+
+    def _sinalizar_parada(self):
+        self._parar = True
+        self._acordar.set()
+
+    def definir_instancias(self, instancias):
+        """Troca o conjunto monitorado (instâncias novas entram, removidas saem)"""
+        novas = {inst["name"]: inst for inst in instancias}
+        if self._loop is None:
+            self._estados = {nome: _EstadoInstancia(inst, self.intervalo) for nome, inst in novas.items()}
+        else:
+            self._loop.call_soon_threadsafe(self._aplicar_instancias, novas)
+
+    def _aplicar_instancias(self, novas):
+        for nome in list(self._estados):
+            if nome not in novas:
+                del self._estados[nome]
+        for nome, inst in novas.items():
+            estado = self._estados.get(nome)
+            if estado is None:
+                self._estados[nome] = _EstadoInstancia(inst, self.intervalo)
+                self._agendar(nome, random.uniform(0, self.intervalo))
+            else:
+                estado.inst = inst
+        self._acordar.set()
+
+    # -------------------- LOOP --------------------
+
+    def _agendar(self, nome, atraso):
+        item = (self._loop.time() + atraso, next(self._seq), nome)
+        heapq.heappush(self._heap, item)
+        if self._heap[0] is item:
+            self._acordar.set()  # novo primeiro da fila: o agendador recalcula a espera
+
+    async def _rodar(self):
+        limites = httpx.Limits(max_connections=self.concorrencia, max_keepalive_connections=self.concorrencia)
+        semaforo = asyncio.Semaphore(self.concorrencia)
+        tarefas = set()
+
+        for nome in self._estados:
+            self._agendar(nome, random.uniform(0, self.intervalo))
+
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limites) as cliente:
+            while not self._parar:
+                if not self._heap:
+                    espera = None
+                else:
+                    espera = self._heap[0][0] - self._loop.time()
+                if espera is None or espera > 0:
+                    self._acordar.clear()
+                    try:
+                        await asyncio.wait_for(self._acordar.wait(), espera)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                _, _, nome = heapq.heappop(self._heap)
+                if nome not in self._estados:
+                    continue  # instância removida
+                await semaforo.acquire()
+                tarefa = asyncio.create_task(self._verificar(cliente, nome))
+                tarefas.add(tarefa)
+                tarefa.add_done_callback(lambda t: (tarefas.discard(t), semaforo.release()))
+
+            for tarefa in list(tarefas):
+                tarefa.cancel()
+            await asyncio.gather(*tarefas, return_exceptions=True)
+
+    async def _verificar(self, cliente, nome):
+        estado = self._estados.get(nome)
+        if estado is None:
+            return
+        inst = estado.inst
+        erro = False
+        status = None
+        if self.ler_estado:
+            try:
+                status = await self._loop.run_in_executor(None, self.ler_estado, inst)
+            except Exception as e:
+                print(f"Erro ao ler estado de {inst['name']}: {e}")
+        if status is None:
+            status, erro = await self._consultar(cliente, inst)
+            if self.gravar_estado and not erro:
+                try:
+                    await self._loop.run_in_executor(None, self.gravar_estado, inst, status)
+                except Exception as e:
+                    print(f"Erro ao gravar estado de {inst['name']}: {e}")
+
+        anterior = estado.status
+        estado.status = status
+        estado.verificado_em = time.time()
+        if erro:
+            estado.erros += 1
+        if erro or status != anterior:
+            estado.intervalo = self.intervalo
+        else:
+            # Estável: consulta cada vez menos, até o teto
+            estado.intervalo = min(self.intervalo_max, estado.intervalo * 1.5)
+        if self.ao_verificar:
+            try:
+                await self._loop.run_in_executor(None, self.ao_verificar, inst, status)
+            except Exception as e:
+                print(f"Erro ao registrar status de {inst['name']}: {e}")
+        if anterior != status:
+            if anterior is not None:
+                estado.mudancas += 1
+            if self.ao_mudar:
+                try:
+                    self.ao_mudar(inst, status, anterior)
+                except Exception as e:
+                    print(f"Erro no callback de {inst['name']}: {e}")
+
+        if nome in self._estados:
+            self._agendar(nome, estado.intervalo * random.uniform(0.8, 1.2))
+
+    async def _consultar(self, cliente, inst):
+        """(status, erro) lido direto da API da instância"""
+        inicio = time.perf_counter()
+        try:
+            url, headers = requisicao_status(inst)
+            r = await cliente.get(url, headers=headers)
+            r.raise_for_status()
+            return ler_status(inst, r.json()), False
+        except Exception as e:
+            print(f"Erro ao consultar {inst['name']}: {e}")
+            return False, True
+        finally:
+            self.latencia_consulta.observar(time.perf_counter() - inicio)
+
+    # -------------------- CONSULTA --------------------
+
+    def estado(self):
+        return {
+            nome: {
+                "conectado": e.status,
+                "intervalo_seg": round(e.intervalo, 1),
+                "verificado_em": e.verificado_em,
+                "mudancas": e.mudancas,
+                "erros": e.erros,
+            }
+            for nome, e in list(self._estados.items())
+        }
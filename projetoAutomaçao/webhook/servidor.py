@@ -0,0 +1,69 @@
+"""
+Entrada de produção do webhook (waitress: funciona no Windows e no Linux).
+
+    python -m webhook.servidor
+
+Os agentes são carregados uma vez, antes de abrir a porta. SIGINT/SIGTERM param de
+aceitar conexões, esperam as requisições em andamento e depois drenam a fila de
+eventos, o executor de respostas, os envios agendados e o histórico pendente.
+No Linux também dá para usar gunicorn: webhook/gunicorn_conf.py.
+"""
+import logging
+import os
+import signal
+import threading
+import time
+
+from webhook.webhook_receiver import app, encerrar_servicos, iniciar_servicos
+
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORTA = int(os.getenv("WEBHOOK_PORTA", "5000"))
+WEBHOOK_THREADS = int(os.getenv("WEBHOOK_THREADS", "16"))
+WEBHOOK_ENCERRAR_SEG = int(os.getenv("WEBHOOK_ENCERRAR_SEG", "30"))
+
+log = logging.getLogger("webhook.servidor")
+
+
+def main():
+    from waitress import create_server
+
+    iniciar_servicos()
+    servidor = create_server(app, host=WEBHOOK_HOST, port=WEBHOOK_PORTA, threads=WEBHOOK_THREADS)
+    # Um prazo só para o encerramento inteiro (requisições, fila, respostas, envios e histórico)
+    encerramento = {"prazo": None}
+
+    def restante():
+        prazo = encerramento["prazo"] or time.monotonic() + WEBHOOK_ENCERRAR_SEG
+        return max(0.0, prazo - time.monotonic())
+
+    def drenar():
+        # Espera as requisições em andamento terminarem (e as respostas saírem) antes de fechar
+        despachante = servidor.task_dispatcher
+        while (despachante.active_count or despachante.queue) and restante() > 0:
+            time.sleep(0.1)
+        time.sleep(0.5)
+        servidor.close()
+
+    def parar(signum, frame):
+        if not servidor.accepting:
+            return
+        log.info("Sinal %s recebido, encerrando...", signum)
+        encerramento["prazo"] = time.monotonic() + WEBHOOK_ENCERRAR_SEG
+        servidor.accepting = False  # para de aceitar conexões novas
+        threading.Thread(target=drenar, name="drenar-webhook", daemon=True).start()
+
+    signal.signal(signal.SIGINT, parar)
+    signal.signal(signal.SIGTERM, parar)
+
+    log.info("Webhook em http://%s:%d (%d threads)", WEBHOOK_HOST, WEBHOOK_PORTA, WEBHOOK_THREADS)
+    try:
+        servidor.run()
+    except OSError:
+        pass  # select() no socket fechado durante o encerramento
+    finally:
+        servidor.task_dispatcher.shutdown(cancel_pending=False, timeout=restante())
+        encerrar_servicos(restante())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,170 +1,394 @@
 import time
 import os
-import json
-import itertools
-from random import random, randrange
-import re
+import logging
+import threading
 from flask import Flask, request, jsonify, render_template
 from concurrent.futures import ThreadPoolExecutor
-from banco.dbo import carregar_agentes_do_banco, DB
-from integration.IA import get_ia_response_ollama
+from banco.estado_agentes import EstadoAgentes
+from banco.historico import criar_historico
+from banco.historico_cache import HistoricoCache
+from integration.IA import (
+    get_ia_response_ollama, get_ia_response_ollama_stream, estatisticas_inferencia,
+    resumir_incremental, JANELA_IA, inferencia_gemini, inferencia_ollama, latencias_stream
+)
+from integration.agendador_agentes import AgendadorAgentes
 from integration.api_GTI import atualizar_status_parallel
+from integration.envio import pipeline_envio
+from integration.fila_envio import fila_envio
+from integration.instancias import INSTANCIAS_ATUALIZAR_SEG, criar_registro
+from until.log import configurar_logging, json_bonito, logger_amostrado
+from until.metricas import RegistroMetricas, instrumentar_flask
+from webhook.deduplicacao import JanelaVistos
+from webhook.eventos import CHAT_DESCONHECIDO, mesclar_eventos, normalizar
+from webhook.fila_eventos import AgrupadorPorChave, DespachantePorChave, FilaEventos
 
 # -------------------- CONFIGURAÇÃO --------------------
 app = Flask(__name__)
-executor = ThreadPoolExecutor(max_workers=5)
 
-HISTORICO_DIR = "historicos"
-os.makedirs(HISTORICO_DIR, exist_ok=True)
+# Logging assíncrono (QueueHandler + listener, ligado em iniciar_servicos): a rota só
+# enfileira o registro. As rotas de mensagem logam por amostragem (1 a cada
+# LOG_AMOSTRA_MENSAGENS) no INFO
+log = logging.getLogger("webhook")
+log_mensagens = logger_amostrado("webhook.mensagens", int(os.getenv("LOG_AMOSTRA_MENSAGENS", "20")))
+log_payload = logging.getLogger("webhook.payload")  # payload completo, só em DEBUG
+
+# Ingestão assíncrona: o webhook só enfileira e responde, os workers tratam a mensagem
+WEBHOOK_ASSINCRONO = os.getenv("WEBHOOK_ASSINCRONO", "1") == "1"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_FILA_MAX = int(os.getenv("WEBHOOK_FILA_MAX", "1000"))
+# Teto de mensagens aceitas e ainda sem resposta (fila + agrupamento + raias por chat);
+# com agrupamento a fila esvazia na hora, então é este limite que devolve 503
+WEBHOOK_PENDENTES_MAX = int(os.getenv("WEBHOOK_PENDENTES_MAX", str(WEBHOOK_FILA_MAX)))
+
+# Mensagens seguidas do mesmo chat viram uma resposta só: libera após AGRUPAR_SEG sem
+# mensagem nova, ou AGRUPAR_MAX_SEG depois da primeira (0 desliga)
+WEBHOOK_AGRUPAR_SEG = float(os.getenv("WEBHOOK_AGRUPAR_SEG", "2"))
+WEBHOOK_AGRUPAR_MAX_SEG = float(os.getenv("WEBHOOK_AGRUPAR_MAX_SEG", "8"))
+
+# Streaming: a resposta é enviada assim que fecha uma frase ou atinge o limite de tamanho
+IA_STREAM = os.getenv("IA_STREAM", "1") == "1"
+gerar_resposta = get_ia_response_ollama_stream if IA_STREAM else get_ia_response_ollama
 
 # -------------------- VARIÁVEIS GLOBAIS --------------------
-agentes_gti = []
-agentes_conectados = []
+# Registro unificado (Z-API do .env + GTI da ROTA): índice O(1) dos conectados por número/nome
+registro_agentes = criar_registro()
+agendador = AgendadorAgentes(os.getenv("AGENDADOR_ESTRATEGIA", "menos_carga"))
+
+# Serviços com threads, arquivos ou conexões: criados por iniciar_servicos() no processo
+# que vai atender (depois do fork do gunicorn), nunca na importação
+executor = None             # pool das respostas
+respostas_por_chat = None   # DespachantePorChave: uma raia sequencial por chat sobre o executor
+historico_store = None      # HistoricoCache sobre o backend de histórico
+estado_agentes = None       # EstadoAgentes: estado de conexão compartilhado, alimentado pelo /webhook/connection
+agrupador_mensagens = None  # AgrupadorPorChave das rajadas de mensagens
+fila_eventos = None         # FilaEventos da ingestão assíncrona
+
+# Intervalo da reconciliação com os eventos; estado mais antigo que isso é consultado em /instance/status
+RECONCILIAR_SEG = int(os.getenv("RECONCILIAR_SEG", "1800"))
 
 # -------------------- FUNÇÕES RESPONDER GRUPO --------------------
 
 def responde_aleatorio(numero, resposta):
-    global agentes_conectados
+    """
+    Agenda o envio pelo agente conectado com menos carga (respeitando limite e pausas
+    por falha) sem esperar o envio; falhas são registradas e repassadas pelo agendador.
+    """
+    agentes_conectados = registro_agentes.conectados()
     if not agentes_conectados:
         return None
-    ag = randrange(len(agentes_conectados))
-    agentes_conectados[ag].enviar_mensagem(numero, resposta)
-    return agentes_conectados[ag]
+    return agendador.enviar(agentes_conectados, numero, resposta)
 
 # -------------------- INICIALIZAÇÃO DE AGENTES --------------------
 
+def descobrir_agentes():
+    """Relê as fontes de instâncias; só as novas consultam status (e só sem estado recente)"""
+    novos, _ = registro_agentes.recarregar()
+    sem_estado = estado_agentes.aplicar(novos, validade=RECONCILIAR_SEG)
+    if sem_estado:
+        atualizar_status_parallel(sem_estado, max_workers=5)
+        estado_agentes.registrar_agentes(sem_estado)
+    if novos:
+        registro_agentes.reindexar()
+    return novos
+
 def inicializar_agentes():
-    global agentes_gti, agentes_conectados
-    agentes_gti = carregar_agentes_do_banco(DB)
-    atualizar_status_parallel(agentes_gti, max_workers=5)
-    agentes_conectados = [ag for ag in agentes_gti if ag.conectado]
-    return agentes_conectados
+    descobrir_agentes()
+    return registro_agentes.conectados()
+
+def reconciliar_agentes():
+    """
+    Corrige eventos de conexão perdidos: aplica o estado compartilhado (eventos e
+    consultas do monitor) e só consulta /instance/status de quem não tem estado recente.
+    """
+    agentes = registro_agentes.todos()
+    if not agentes:
+        return inicializar_agentes()
+    sem_estado = estado_agentes.aplicar(agentes, validade=RECONCILIAR_SEG)
+    if sem_estado:
+        atualizar_status_parallel(sem_estado, max_workers=5)
+        estado_agentes.registrar_agentes(sem_estado)
+    registro_agentes.reindexar()
+    log.info("🔄 Reconciliação: %d/%d agentes conectados (%d consultados)",
+             len(registro_agentes), len(agentes), len(sem_estado))
+    return registro_agentes.conectados()
+
+_parar_reconciliacao = threading.Event()
+
+def loop_reconciliacao():
+    """Redescobre instâncias a cada INSTANCIAS_ATUALIZAR_SEG e reconcilia o status a cada RECONCILIAR_SEG"""
+    ultima_reconciliacao = time.monotonic()
+    while not _parar_reconciliacao.wait(min(INSTANCIAS_ATUALIZAR_SEG, RECONCILIAR_SEG)):
+        try:
+            if time.monotonic() - ultima_reconciliacao >= RECONCILIAR_SEG:
+                ultima_reconciliacao = time.monotonic()
+                descobrir_agentes()
+                reconciliar_agentes()
+            else:
+                descobrir_agentes()
+        except Exception as e:
+            log.exception("⚠️ Erro na reconciliação de agentes: %s", e)
+
+# -------------------- CICLO DE VIDA DO PROCESSO --------------------
+# Nada de rede na importação: o servidor (webhook/servidor.py, gunicorn_conf.py) chama
+# iniciar_servicos() uma vez por worker; o before_request cobre quem sobe o app direto.
+
+_servicos_iniciados = False
+_servicos_lock = threading.Lock()
+
+def _criar_servicos():
+    global executor, respostas_por_chat, historico_store, estado_agentes, agrupador_mensagens, fila_eventos
+    configurar_logging()
+
+    executor = ThreadPoolExecutor(max_workers=max(5, WEBHOOK_WORKERS))
+    respostas_por_chat = DespachantePorChave(executor, nome="respostas")
+
+    # Histórico append-only (HISTORICO_BACKEND=sqlite|json), lido só pela janela usada pela IA.
+    # As conversas ativas ficam em um cache LRU e são gravadas em lote (write-behind); o cache
+    # guarda por chat só as JANELA_IA falas que a IA lê (o resto do contexto vem do resumo).
+    historico_store = HistoricoCache(
+        criar_historico(),
+        janela=JANELA_IA,
+        capacidade=int(os.getenv("HISTORICO_CACHE_CHATS", "1000")),
+        intervalo=float(os.getenv("HISTORICO_FLUSH_SEG", "2"))
+    )
+    historico_store.iniciar_compactacao(int(os.getenv("HISTORICO_COMPACTAR_SEG", "3600")))
+    estado_agentes = EstadoAgentes()
+
+    agrupador_mensagens = AgrupadorPorChave(
+        liberar_grupo, janela=WEBHOOK_AGRUPAR_SEG, espera_max=WEBHOOK_AGRUPAR_MAX_SEG, nome="agrupador-webhook"
+    )
+    # Sem agrupamento os workers da fila tratam a mensagem direto (ordem por chat garantida pela fila)
+    fila_eventos = FilaEventos(
+        agrupar_evento if WEBHOOK_AGRUPAR_SEG > 0 else tratar_mensagem,
+        workers=WEBHOOK_WORKERS, capacidade=WEBHOOK_FILA_MAX, nome="webhook"
+    )
 
-# Inicializa agentes ao iniciar o app
+def iniciar_servicos():
+    """Cria filas, pools e histórico, carrega os agentes e liga a reconciliação, uma única vez por processo"""
+    global _servicos_iniciados
+    with _servicos_lock:
+        if _servicos_iniciados:
+            return
+        _criar_servicos()
+        _servicos_iniciados = True
+        inicializar_agentes()
+        threading.Thread(target=loop_reconciliacao, name="reconciliacao-agentes", daemon=True).start()
+        log.info("Serviços do webhook iniciados (pid %d)", os.getpid())
+
+def encerrar_servicos(timeout=30):
+    """
+    Encerramento gracioso: drena a fila de eventos, as respostas, os envios e o
+    histórico. `timeout` vale para tudo junto; cada etapa usa o que sobrou dele.
+    """
+    if not _servicos_iniciados:
+        return
+    prazo = time.monotonic() + timeout
+
+    def restante():
+        return max(0.0, prazo - time.monotonic())
 
-inicializar_agentes()
+    _parar_reconciliacao.set()
+    fila_eventos.encerrar(restante())
+    agrupador_mensagens.liberar_tudo()
+    if respostas_por_chat.aguardar(restante()):
+        executor.shutdown(wait=True)
+    else:
+        log.warning("⚠️ Encerrando com %d resposta(s) ainda na fila", respostas_por_chat.pendentes())
+        executor.shutdown(wait=False, cancel_futures=True)
+    if not fila_envio.aguardar(restante()):
+        log.warning("⚠️ Encerrando com %d envio(s) ainda na fila", fila_envio.pendentes())
+    historico_store.fechar()
+    log.info("Webhook encerrado (pid %d)", os.getpid())
+
+@app.before_request
+def garantir_servicos():
+    if not _servicos_iniciados:
+        iniciar_servicos()
 
 # -------------------- HISTÓRICO --------------------
 
-def carregar_historico(chat_id: str):
-    caminho = os.path.join(HISTORICO_DIR, f"{chat_id}.json")
-    if os.path.exists(caminho):
-        try:
-            with open(caminho, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"⚠️ Erro ao ler histórico de {chat_id}: {e}")
-    return []
+def carregar_historico(chat_id: str, limite=JANELA_IA):
+    """Janela recente do chat e o resumo do que já saiu dela"""
+    try:
+        return historico_store.ultimos(chat_id, limite), historico_store.obter_resumo(chat_id)
+    except Exception as e:
+        log.warning("⚠️ Erro ao ler histórico de %s: %s", chat_id, e)
+        return [], ""
 
-def salvar_historico(chat_id: str, historico: list):
-    caminho = os.path.join(HISTORICO_DIR, f"{chat_id}.json")
+def registrar_historico(chat_id: str, mensagem: dict):
+    """Anexa a mensagem; a fala que sai da janela da IA é somada ao resumo (custo constante)"""
     try:
-        with open(caminho, "w", encoding="utf-8") as f:
-            json.dump(historico, f, ensure_ascii=False, indent=2)
+        with historico_store.trava(chat_id):
+            janela = historico_store.ultimos(chat_id, JANELA_IA)
+            if len(janela) >= JANELA_IA:
+                resumo = resumir_incremental(historico_store.obter_resumo(chat_id), janela[0]["content"])
+                historico_store.salvar_resumo(chat_id, resumo)
+            historico_store.anexar(chat_id, mensagem)
     except Exception as e:
-        print(f"⚠️ Erro ao salvar histórico de {chat_id}: {e}")
+        log.warning("⚠️ Erro ao salvar histórico de %s: %s", chat_id, e)
 
 # -------------------- PROCESSAR MENSAGEM --------------------
 
-def tratar_mensagem(data):
-    chat_id = extrair_chat_id(data)
-    mensagem = extrair_mensagem(data)
-    is_group = data.get("isGroup", False)
+def tratar_mensagem(evento):
+    chat_id = evento.chat_id
+    mensagem = evento.texto
+    is_group = evento.grupo
 
-    if chat_id == "desconhecido" or not mensagem:
+    if chat_id == CHAT_DESCONHECIDO or not mensagem:
         return None  # ignora
 
     # 1. Carregar histórico
-    historico = carregar_historico(chat_id)
+    historico, resumo = carregar_historico(chat_id)
 
     # 2. Gerar resposta
-    resposta = get_ia_response_ollama(mensagem, historico, "Converse de forma casual no WhatsApp")
+    resposta = gerar_resposta(mensagem, historico, "Converse de forma casual no WhatsApp", resumo=resumo)
 
-    # 3. Escolher agente
+    # 3. Escolher agente e 4. Enviar resposta
     agente = None
     if is_group:
         agente = responde_aleatorio(chat_id, resposta)
     else:
-        sender = data.get("message", {}).get("sender", "")
-        match = re.search(r'(\d+)@', sender)
-        numero = match.group(1) if match else None
-        agente = next((ag for ag in agentes_conectados if ag.numero == numero), None)
+        agente = registro_agentes.por_numero(evento.numero)
+        if agente:
+            # Entra na fila de saída da instância; o ritmo fica por conta do limitador
+            futuro = agente.agendar_mensagem(chat_id, resposta)
+            if futuro is None:
+                agente = None
+            else:
+                futuro.add_done_callback(lambda f, ag=agente: avisar_falha_envio(f, ag, chat_id))
 
-    # 4. Enviar resposta
     if agente:
-        agente.enviar_mensagem(chat_id, resposta)
-        print(f"✏️{agente.numero}: {resposta}📝")
+        log_mensagens.info("✏️ resposta agendada", extra={"campos": {"agente": agente.nome, "chat": chat_id, "tamanho": len(resposta)}})
+        log_mensagens.debug("✏️%s: %s📝", agente.numero, resposta)
 
         # 5. Atualizar histórico
-        historico.append({
+        registrar_historico(chat_id, {
             "role": "assistant",
             "content": resposta,
             "group": is_group,
             "timestamp": int(time.time() * 1000)
         })
-        salvar_historico(chat_id, historico)
         return resposta
 
     return None
 
-def processar_mensagem(chat_id, mensagem, from_me=False):
-    if not mensagem:
-        return
+def avisar_falha_envio(futuro, agente, chat_id):
+    """Callback do envio agendado: loga quando a resposta não saiu"""
+    erro = futuro.exception() if not futuro.cancelled() else "cancelado"
+    if erro or not futuro.result():
+        log.warning("⚠️ Falha ao enviar resposta", extra={"campos": {"agente": agente.nome, "chat": chat_id, "erro": erro}})
+
+def liberar_grupo(chat_id, eventos):
+    respostas_por_chat.submeter(chat_id, tratar_mensagem, mesclar_eventos(eventos))
+
+def agrupar_evento(evento):
+    agrupador_mensagens.adicionar(evento.chat_id, evento)
+
+def pendentes_ingestao():
+    """Mensagens aceitas que ainda não viraram resposta, em qualquer etapa"""
+    return fila_eventos.profundidade() + agrupador_mensagens.pendentes() + respostas_por_chat.pendentes()
+
+# O provedor reentrega webhooks; o mesmo ID de mensagem é descartado antes de fila, disco ou IA
+mensagens_vistas = JanelaVistos()
+
+# -------------------- MÉTRICAS (/metrics) --------------------
+# Coletores só leem contadores que já existem; o custo fica na hora do scrape (os serviços
+# são buscados no módulo a cada leitura, porque só existem depois de iniciar_servicos)
+metricas = instrumentar_flask(app, RegistroMetricas())
+metricas.coletor("webhook_fila_eventos", "gauge", "Eventos aguardando na fila de ingestão",
+                 lambda: fila_eventos.profundidade())
+metricas.coletor("webhook_respostas_pendentes", "gauge", "Respostas aguardando nas raias por chat",
+                 lambda: respostas_por_chat.pendentes())
+metricas.coletor("webhook_pendentes", "gauge", "Mensagens aceitas ainda sem resposta (limite do 503)",
+                 lambda: pendentes_ingestao())
+metricas.coletor("webhook_respostas_raias", "gauge", "Chats com respostas em andamento",
+                 lambda: respostas_por_chat.estatisticas()["raias_ativas"])
+metricas.coletor("envio_fila", "gauge", "Mensagens aguardando na fila de saída", fila_envio.pendentes)
+metricas.coletor("webhook_duplicados_total", "counter", "Entregas repetidas descartadas",
+                 lambda: mensagens_vistas.duplicados)
+metricas.coletor("webhook_dedup_consultas_total", "counter", "Mensagens verificadas na deduplicação",
+                 lambda: mensagens_vistas.consultas)
+metricas.coletor("webhook_agrupamento_mensagens_total", "counter", "Mensagens que entraram no agrupamento por chat",
+                 lambda: agrupador_mensagens.itens)
+metricas.coletor("webhook_agrupamento_grupos_total", "counter", "Grupos liberados para resposta (uma chamada à IA cada)",
+                 lambda: agrupador_mensagens.liberados)
+metricas.coletor("agentes_conectados", "gauge", "Agentes conectados no registro", lambda: len(registro_agentes))
+metricas.coletor(
+    "envios_total", "counter", "Resultado dos envios por agente", lambda: {
+        (chave, campo): valor
+        for chave, contadores in pipeline_envio.estatisticas().items()
+        for campo, valor in contadores.items()
+        if campo in ("sucessos", "falhas", "retentativas", "bloqueados")
+    }, rotulos=("agente", "resultado")
+)
+metricas.coletor(
+    "ia_geracao_seconds", "histogram", "Duração das chamadas ao modelo",
+    lambda: {("ollama",): inferencia_ollama.latencia_geracao, ("gemini",): inferencia_gemini.latencia_geracao},
+    rotulos=("backend",)
+)
+metricas.coletor(
+    "ia_espera_seconds", "histogram", "Espera por vaga no limite de concorrência do modelo",
+    lambda: {("ollama",): inferencia_ollama.latencia_espera, ("gemini",): inferencia_gemini.latencia_espera},
+    rotulos=("backend",)
+)
+metricas.coletor(
+    "ia_stream_seconds", "histogram", "Streaming: primeiro token (ttft) e resposta completa (total)",
+    lambda: {(backend, fase): hist for backend, hists in latencias_stream.items() for fase, hist in hists.items()},
+    rotulos=("backend", "fase")
+)
+metricas.coletor("historico_leitura_seconds", "histogram", "Leituras do histórico no backend (cache miss)",
+                 lambda: historico_store.latencia_leitura)
+metricas.coletor("historico_flush_seconds", "histogram", "Gravação em lote do histórico",
+                 lambda: historico_store.latencia_flush)
+metricas.coletor("historico_cache_hits_total", "counter", "Leituras atendidas pelo cache", lambda: historico_store.hits)
+metricas.coletor("historico_cache_misses_total", "counter", "Leituras que foram ao backend", lambda: historico_store.misses)
+
+def responder_chat(chat_id, mensagem):
+    """
+    Registra a mensagem do usuário, gera e envia a resposta. Roda na raia do chat,
+    então o histórico é lido aqui, já com as respostas anteriores do mesmo chat.
+    """
+    registrar_historico(chat_id, {
+        "role": "user",
+        "content": mensagem,
+        "timestamp": int(time.time() * 1000)
+    })
+    historico, resumo = carregar_historico(chat_id)
+    resposta = gerar_resposta(mensagem, historico, "responda de forma educada e curta", resumo=resumo)
+    if not resposta:
+        return None
 
-    historico = carregar_historico(chat_id)
+    if not registro_agentes.conectados():
+        inicializar_agentes()
+    agente = responde_aleatorio(chat_id, resposta)
+    if not agente:
+        log.warning("⚠️ Nenhum agente disponível para enviar mensagem para %s", chat_id)
+        return None
 
-    if not from_me:
-        # Salva mensagem do usuário
-        historico.append({
-            "role": "user",
-            "content": mensagem,
-            "timestamp": int(time.time() * 1000)
-        })
-        salvar_historico(chat_id, historico)
-
-        def responder():
-            resposta = get_ia_response_ollama(mensagem, historico, "responda de forma educada e curta")
-            if resposta:
-                if not agentes_conectados:
-                    inicializar_agentes()
-                agente = responde_aleatorio(chat_id, resposta)
-                if agente:
-                    historico.append({
-                        "role": "assistant",
-                        "content": resposta,
-                        "timestamp": int(time.time() * 1000)
-                    })
-                    salvar_historico(chat_id, historico)
-                    print(f"[Responder] {agente.nome} enviou mensagem para {chat_id}: {resposta}")
-                else:
-                    print(f"⚠️ Nenhum agente disponível para enviar mensagem para {chat_id}")
-
-        executor.submit(responder)
-    else:
-        print(f"Mensagem do agente ({chat_id}): {mensagem}")
+    registrar_historico(chat_id, {
+        "role": "assistant",
+        "content": resposta,
+        "timestamp": int(time.time() * 1000)
+    })
+    log_mensagens.info("[Responder] %s agendou mensagem para %s", agente.nome, chat_id)
+    log_mensagens.debug("[Responder] %s -> %s: %s", agente.nome, chat_id, resposta)
+    return resposta
+
+def processar_mensagem(evento):
+    """Entrega a mensagem à raia do chat; retorna o Future da resposta (None se ignorada)"""
+    if not evento.texto:
+        return None
 
-# -------------------- FUNÇÕES AUXILIARES --------------------
+    if evento.de_mim:
+        log_mensagens.debug("Mensagem do agente (%s): %s", evento.chat_id, evento.texto)
+        return None
+    return respostas_por_chat.submeter(evento.chat_id, responder_chat, evento.chat_id, evento.texto)
 
-def extrair_chat_id(data):
-    return str(
-        data.get("message", {}).get("chatid")
-        or data.get("message", {}).get("chatName")
-        or data.get("chatid")
-        or data.get("chatName")
-        or data.get("phone")
-        or "desconhecido"
-    )
+# -------------------- FUNÇÕES AUXILIARES --------------------
 
-def extrair_mensagem(data):
-    if "message" in data and isinstance(data["message"], dict) and "text" in data["message"]:
-        return str(data["message"]["text"])
-    if "text" in data:
-        if isinstance(data["text"], dict):
-            return data["text"].get("message", "")
-        return str(data["text"])
-    if "mensagem" in data:
-        return str(data["mensagem"])
-    return ""
+def ler_evento(tipo):
+    """JSON da requisição normalizado uma vez no Evento do tipo (erro de JSON propaga)"""
+    return normalizar(request.get_json(force=True), tipo)
 
 # -------------------- ROTAS --------------------
 @app.route('/', methods=['GET'])
@@ -175,10 +399,11 @@ def index():
 @app.route('/webhook', methods=['POST'])
 def webhook_receiver():
     try:
-        data = request.get_json(force=True)
-        print("[Webhook] Recebido:", json.dumps(data, indent=2, ensure_ascii=False))
+        evento = ler_evento("webhook")
+        # json.dumps(indent=2) só é montado se DEBUG estiver ligado, e na thread do listener
+        log_payload.debug("[Webhook] Recebido: %s", json_bonito(evento.dados))
     except Exception as e:
-        print(f"⚠️ Erro ao ler JSON do webhook: {e}")
+        log.warning("⚠️ Erro ao ler JSON do webhook: %s", e)
         return jsonify({"status": "erro", "mensagem": "JSON inválido"}), 400
 
 
@@ -187,81 +412,147 @@ def webhook_receiver():
 @app.route('/webhook/messages/text', methods=['POST'])
 def webhook_messages_text():
     try:
-        data = request.get_json(force=True)
-        print(f"📩[webhook_messages_text]: {data.get('message', {}).get("sender", "")}: {data.get("message", {}).get("text", "")}📩")
-        tratar_mensagem(data)
+        evento = ler_evento("mensagem")
+        log_mensagens.info("📩 mensagem recebida", extra={"campos": {"remetente": evento.remetente}})
+        log_payload.debug("📩[webhook_messages_text]: %s: %s📩", evento.remetente, evento.texto)
+        id_mensagem = evento.id_mensagem
+        if id_mensagem and mensagens_vistas.visto(id_mensagem):
+            log_mensagens.debug("Entrega repetida de %s descartada", id_mensagem)
+            return jsonify({"status": "duplicado"}), 200  # 200 para o provedor parar de reenviar
+        if evento.de_mim:
+            # Eco do que a própria instância enviou: responder criaria um loop entre os agentes
+            log_mensagens.debug("Mensagem do agente (%s) ignorada", evento.chat_id)
+            return jsonify({"status": "ignorado"}), 200
+        if not WEBHOOK_ASSINCRONO:
+            try:
+                tratar_mensagem(evento)
+            except Exception:
+                if id_mensagem:
+                    mensagens_vistas.esquecer(id_mensagem)  # falhou: a retentativa do provedor precisa passar
+                raise
+        elif pendentes_ingestao() >= WEBHOOK_PENDENTES_MAX or not fila_eventos.enfileirar(evento.chat_id, evento):
+            if id_mensagem:
+                mensagens_vistas.esquecer(id_mensagem)  # a retentativa do provedor precisa passar
+            log.warning("⚠️ Fila do webhook cheia, evento recusado")
+            return jsonify({"status": "ocupado"}), 503
 
     except Exception as e:
-        print(f"⚠️ Erro ao processar messages/text: {e}")
+        log.warning("⚠️ Erro ao processar messages/text: %s", e)
         return jsonify({"status": "erro"}), 400
 
     return jsonify({"status": "sucesso"}), 200
 
+@app.route('/webhook/fila', methods=['GET'])
+def webhook_fila():
+    return jsonify({
+        **fila_eventos.estatisticas(),
+        "respostas": respostas_por_chat.estatisticas(),
+        "agrupamento": agrupador_mensagens.estatisticas(),
+        "deduplicacao": mensagens_vistas.estatisticas(),
+    }), 200
+
+@app.route('/webhook/historico', methods=['GET'])
+def webhook_historico_cache():
+    return jsonify(historico_store.estatisticas()), 200
+
+@app.route('/agentes/carga', methods=['GET'])
+def agentes_carga():
+    return jsonify(agendador.estatisticas()), 200
+
+@app.route('/agentes/envio', methods=['GET'])
+def agentes_envio():
+    """Estado dos circuit breakers e contadores de retentativa por instância"""
+    return jsonify(pipeline_envio.estatisticas()), 200
+
+@app.route('/agentes/fila', methods=['GET'])
+def agentes_fila():
+    """Fila de saída e tokens do limitador por instância"""
+    return jsonify(fila_envio.estatisticas()), 200
+
+@app.route('/ia', methods=['GET'])
+def ia_estatisticas():
+    return jsonify(estatisticas_inferencia()), 200
+
 @app.route('/webhook/presence', methods=['POST'])
 def webhook_presence():
     try:
-        data = request.get_json(force=True)
+        ler_evento("presenca")
     except Exception as e:
-        print(f"⚠️ Erro ao processar presence: {e}")
+        log.warning("⚠️ Erro ao processar presence: %s", e)
         return jsonify({"status": "erro"}), 400
     return jsonify({"status": "sucesso"}), 200
 
 @app.route('/webhook/chats', methods=['POST'])
 def webhook_chats():
     try:
-        data = request.get_json(force=True)
+        ler_evento("chats")
     except Exception as e:
-        print(f"⚠️ Erro ao processar chats: {e}")
+        log.warning("⚠️ Erro ao processar chats: %s", e)
         return jsonify({"status": "erro"}), 400
     return jsonify({"status": "sucesso"}), 200
 
 @app.route('/webhook/messages_update', methods=['POST'])
 def webhook_messages_update():
     try:
-        data = request.get_json(force=True)
+        ler_evento("mensagem_atualizada")
     except Exception as e:
-        print(f"⚠️ Erro ao processar messages_update: {e}")
+        log.warning("⚠️ Erro ao processar %s: %s", request.path, e)
         return jsonify({"status": "erro"}), 400
     return jsonify({"status": "sucesso"}), 200
 
 @app.route('/webhook/history', methods=['POST'])
 def webhook_history():
-    data = request.get_json(force=True)
+    ler_evento("historico")
     return jsonify({"status": "ok", "mensagem": "Histórico processado com sucesso!"}), 200
 
 @app.route('/webhook/connection', methods=['POST'])
 def webhook_connection():
-    data = request.json
-    print("🔌 Evento de conexão recebido:", data)
-    # Exemplo: tratar status
-    status = data.get("status")
+    evento = ler_evento("conexao")
+    log_payload.debug("🔌 Evento de conexão recebido: %s", json_bonito(evento.dados))
+    status, token, nome, numero = evento.status, evento.token, evento.instancia, evento.dono
+    if status in ("CONNECTED", "DISCONNECTED"):
+        conectado = status == "CONNECTED"
+        agente = registro_agentes.evento_conexao(conectado, token=token, nome=nome, numero=numero)
+        if agente is None:
+            log.warning("⚠️ Evento de conexão de instância desconhecida (%s)", nome or token)
+        estado_agentes.registrar(
+            agente.token if agente else token, conectado,
+            nome=agente.nome if agente else nome, numero=numero
+        )
+
     if status == "CONNECTED":
-        print("✅ Instância conectada com sucesso")
+        log.info("✅ Instância conectada", extra={"campos": {"instancia": nome}})
     elif status == "DISCONNECTED":
-        print("⚠️ Instância desconectada")
+        log.warning("⚠️ Instância desconectada", extra={"campos": {"instancia": nome}})
 
     return jsonify({"status": "sucesso", "mensagem": "Webhook de conexão recebido"}), 200
 
 @app.route('/webhook/contacts', methods=['POST'])
 def webhook_contacts():
     try:
-        data = request.get_json(force=True)
+        ler_evento("contatos")
     except Exception as e:
-        print(f"⚠️ Erro ao processar messages_update: {e}")
+        log.warning("⚠️ Erro ao processar %s: %s", request.path, e)
         return jsonify({"status": "erro"}), 400
     return jsonify({"status": "sucesso"}), 200
 
 @app.route('/webhook/messages/error', methods=['POST'])
 def webhook_messages_error():
     try:
-        data = request.get_json(force=True)
+        ler_evento("erro_mensagem")
     except Exception as e:
-        print(f"⚠️ Erro ao processar messages_update: {e}")
+        log.warning("⚠️ Erro ao processar %s: %s", request.path, e)
         return jsonify({"status": "erro"}), 400
     return jsonify({"status": "sucesso"}), 200
 
 
 
 # -------------------- RODAR APP --------------------
+# Desenvolvimento. Em produção: python -m webhook.servidor (waitress) ou
+# gunicorn -c webhook/gunicorn_conf.py webhook.webhook_receiver:app
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    iniciar_servicos()
+    try:
+        app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
+    finally:
+        encerrar_servicos()